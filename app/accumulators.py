@@ -0,0 +1,162 @@
+"""
+Streaming metric accumulators for equity curves.
+
+Each accumulator updates in O(1) per new period and round-trips through
+to_dict() / from_dict() as plain JSON, so a stored backtest or track record
+can be extended month by month without reloading its history.
+
+EquityMetrics exposes the same summary attributes as
+app.backtest_engine.BacktestResult, and its definitions match
+run_backtest_arrays:
+  - volatility / Sharpe use the sample std (ddof=1), annualized
+  - drawdown is measured on the compounded curve from 1.0, with the peak
+    starting at the first period's value (like kernels.running_drawdown)
+  - a hit is a period where the call (bullish) matched the move (went_up)
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+
+@dataclass
+class RunningMoments:
+    """Welford mean / variance."""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self, ddof: int = 1) -> float:
+        return self.m2 / (self.count - ddof) if self.count > ddof else 0.0
+
+    def std(self, ddof: int = 1) -> float:
+        return float(np.sqrt(self.variance(ddof)))
+
+
+@dataclass
+class RunningDrawdown:
+    """Compounded value, running peak and the worst drawdown so far."""
+    value: float = 1.0
+    peak: float = 0.0
+    max_drawdown: float = 0.0
+    periods: int = 0
+
+    def update(self, period_return: float) -> float:
+        """Compound one return; returns the current drawdown."""
+        self.value = self.value * (1 + period_return)
+        self.peak = self.value if self.periods == 0 else max(self.peak, self.value)
+        self.periods += 1
+        drawdown = (self.value - self.peak) / self.peak
+        self.max_drawdown = min(self.max_drawdown, drawdown)
+        return drawdown
+
+
+@dataclass
+class HitCounter:
+    """Periods where the call matched the outcome."""
+    hits: int = 0
+    total: int = 0
+
+    def update(self, predicted: bool, actual: bool) -> None:
+        self.total += 1
+        self.hits += int(bool(predicted) == bool(actual))
+
+    @property
+    def rate(self) -> float:
+        return self.hits / self.total if self.total > 0 else 0.0
+
+
+@dataclass
+class EquityMetrics:
+    """
+    Running backtest summary: capital, buy & hold, return moments,
+    drawdown and hit rate.
+    """
+    periods_per_year: int = 12
+    initial_capital: float = 1.0
+    capital: float = 1.0
+    buy_hold_capital: float = 1.0
+    returns: RunningMoments = field(default_factory=RunningMoments)
+    drawdown: RunningDrawdown = field(default_factory=RunningDrawdown)
+    hits: HitCounter = field(default_factory=HitCounter)
+
+    @classmethod
+    def start(cls, initial_capital: float = 1.0, periods_per_year: int = 12) -> "EquityMetrics":
+        return cls(periods_per_year, initial_capital, initial_capital, initial_capital)
+
+    def update(self, portfolio_return: float, asset_return: float, bullish: bool, went_up: bool) -> None:
+        portfolio_return = float(portfolio_return)
+        self.capital = self.capital * (1 + portfolio_return)
+        self.buy_hold_capital = self.buy_hold_capital * (1 + float(asset_return))
+        self.returns.update(portfolio_return)
+        self.drawdown.update(portfolio_return)
+        self.hits.update(bullish, went_up)
+
+    def update_many(
+        self,
+        portfolio_return: Iterable[float],
+        asset_return: Iterable[float],
+        bullish: Iterable[bool],
+        went_up: Iterable[bool]
+    ) -> None:
+        for values in zip(portfolio_return, asset_return, bullish, went_up):
+            self.update(*values)
+
+    # ------------------------------------------------------------ metrics
+    @property
+    def periods(self) -> int:
+        return self.returns.count
+
+    @property
+    def final_capital(self) -> float:
+        return self.capital
+
+    @property
+    def wins(self) -> int:
+        return self.hits.hits
+
+    @property
+    def total_return(self) -> float:
+        return self.capital / self.initial_capital - 1
+
+    @property
+    def buy_hold_return(self) -> float:
+        return self.buy_hold_capital / self.initial_capital - 1
+
+    @property
+    def volatility(self) -> float:
+        return self.returns.std() * float(np.sqrt(self.periods_per_year))
+
+    @property
+    def sharpe_ratio(self) -> float:
+        std = self.returns.std()
+        return self.returns.mean / std * float(np.sqrt(self.periods_per_year)) if std > 0 else 0.0
+
+    @property
+    def max_drawdown(self) -> float:
+        return self.drawdown.max_drawdown
+
+    @property
+    def win_rate(self) -> float:
+        return self.hits.rate
+
+    # -------------------------------------------------------------- JSON
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EquityMetrics":
+        data = dict(data)
+        return cls(
+            returns=RunningMoments(**data.pop("returns")),
+            drawdown=RunningDrawdown(**data.pop("drawdown")),
+            hits=HitCounter(**data.pop("hits")),
+            **data
+        )
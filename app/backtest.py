@@ -6,6 +6,7 @@ from typing import Dict, Any, List, Optional
 from xgboost import XGBClassifier
 from sklearn.preprocessing import StandardScaler
 
+from app.backtest_engine import run_backtest_arrays
 from app.config import (
     FEATURE_COLUMNS, 
     HIGH_CONFIDENCE_THRESHOLD,
@@ -78,52 +79,36 @@ def run_backtest(
     # Get probability of predicted class for each row
     backtest_df["Probability"] = [float(prob[int(pred)]) for pred, prob in zip(predictions, probabilities)]
     
-    # Calculate allocations - use scalar values
-    allocations = []
-    for i in range(len(predictions)):
-        pred = int(predictions[i])
-        prob = float(probabilities[i][pred])
-        allocations.append(calculate_allocation(pred, prob) / 100)
-    backtest_df["Allocation"] = allocations
+    # Calculate allocations (same ladder as calculate_allocation, vectorized)
+    pred = np.asarray(predictions).astype(int)
+    prob = backtest_df["Probability"].to_numpy()
+    safe_allocation = np.select(
+        [prob >= HIGH_CONFIDENCE_THRESHOLD, prob >= MEDIUM_CONFIDENCE_THRESHOLD],
+        [HIGH_CONFIDENCE_SAFE_ALLOCATION, MEDIUM_CONFIDENCE_SAFE_ALLOCATION],
+        default=LOW_CONFIDENCE_ALLOCATION
+    )
+    backtest_df["Allocation"] = np.where(pred == 1, safe_allocation, DANGER_ALLOCATION) / 100
     
-    # Strategy returns (allocation * equity return, rest in fixed income ~0%)
-    backtest_df["Strategy_Return"] = backtest_df["Allocation"].shift(1) * backtest_df["Daily_Return"]
+    # Allocation held over each day = previous day's (rest in fixed income ~0%)
+    backtest_df["Held_Allocation"] = backtest_df["Allocation"].shift(1)
     
     # Remove first row (NaN from pct_change)
     backtest_df = backtest_df.dropna()
     
-    # Calculate cumulative returns
-    backtest_df["Cumulative_BuyHold"] = (1 + backtest_df["Daily_Return"]).cumprod()
-    backtest_df["Cumulative_Strategy"] = (1 + backtest_df["Strategy_Return"]).cumprod()
+    # Win rate - Safe (1) and market went up, or Danger (0) and market did not
+    daily_return = backtest_df["Daily_Return"].to_numpy()
+    result = run_backtest_arrays(
+        backtest_df["Held_Allocation"].to_numpy(), daily_return, periods_per_year=252,
+        bullish=backtest_df["Prediction"].to_numpy() == 1, went_up=daily_return > 0
+    )
     
     # Calculate metrics
-    total_days = len(backtest_df)
-    buy_hold_return = (backtest_df["Cumulative_BuyHold"].iloc[-1] - 1) * 100
-    strategy_return = (backtest_df["Cumulative_Strategy"].iloc[-1] - 1) * 100
-    
-    # Win rate - count days where prediction helped
-    pred_array = backtest_df["Prediction"].values
-    return_array = backtest_df["Daily_Return"].values
-    
-    correct_predictions = 0
-    for i in range(len(pred_array)):
-        # Safe prediction (1) and market went up = correct
-        # Danger prediction (0) and market went down = correct (we avoided loss)
-        if (pred_array[i] == 1 and return_array[i] > 0) or (pred_array[i] == 0 and return_array[i] <= 0):
-            correct_predictions += 1
-    
-    win_rate = correct_predictions / total_days * 100
-    
-    # Sharpe ratio (annualized, assuming 252 trading days)
-    strategy_std = backtest_df["Strategy_Return"].std()
-    strategy_mean = backtest_df["Strategy_Return"].mean()
-    sharpe_ratio = (strategy_mean / strategy_std) * np.sqrt(252) if strategy_std > 0 else 0
-    
-    # Max drawdown
-    cumulative = backtest_df["Cumulative_Strategy"]
-    rolling_max = cumulative.expanding().max()
-    drawdown = (cumulative - rolling_max) / rolling_max
-    max_drawdown = drawdown.min() * 100
+    total_days = result.periods
+    buy_hold_return = (result.buy_hold_equity[-1] - 1) * 100
+    strategy_return = (result.equity[-1] - 1) * 100
+    win_rate = result.win_rate * 100
+    sharpe_ratio = result.sharpe_ratio
+    max_drawdown = result.max_drawdown * 100
     
     # Count safe vs danger predictions
     safe_days = int((backtest_df["Prediction"] == 1).sum())
@@ -0,0 +1,207 @@
+"""
+Vectorized allocation backtest engine shared by every backtest entry point.
+
+Inputs are aligned per period:
+    allocation[t]   equity fraction held over period t (decided at t-1)
+    asset_return[t] equity return over period t
+    bond_return     return of the non-equity part (scalar or per period)
+
+portfolio_return = asset_return * allocation + bond_return * (1 - allocation)
+
+Win rate is defined differently by each caller (previous allocation vs
+return, prediction vs target, ...), so the caller passes the two boolean
+arrays to compare.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from app.kernels import compound, max_drawdown
+
+
+ArrayLike = Union[np.ndarray, float]
+
+
+@dataclass
+class BacktestResult:
+    """Per-period arrays plus summary metrics (fractions, not %)."""
+    allocation: np.ndarray
+    asset_return: np.ndarray
+    portfolio_return: np.ndarray
+    equity: np.ndarray            # capital after each period, starting from initial_capital
+    buy_hold_equity: np.ndarray
+    initial_capital: float
+    total_return: float
+    buy_hold_return: float
+    sharpe_ratio: float
+    max_drawdown: float
+    volatility: float             # annualized std of portfolio_return
+    win_rate: float
+    wins: int
+    win_periods: int
+
+    @property
+    def periods(self) -> int:
+        return len(self.portfolio_return)
+
+    @property
+    def final_capital(self) -> float:
+        return float(self.equity[-1]) if self.periods else self.initial_capital
+
+    @property
+    def excess_return(self) -> float:
+        return self.total_return - self.buy_hold_return
+
+    @property
+    def avg_allocation(self) -> float:
+        return float(np.mean(self.allocation)) if self.periods else 0.0
+
+
+def win_rate(bullish: np.ndarray, went_up: np.ndarray) -> tuple:
+    """(wins, periods, rate): a period is a win when the call matched the move."""
+    bullish = np.asarray(bullish, dtype=bool)
+    went_up = np.asarray(went_up, dtype=bool)
+    periods = len(bullish)
+    wins = int((bullish == went_up).sum())
+    return wins, periods, (wins / periods if periods > 0 else 0.0)
+
+
+def run_backtest_arrays(
+    allocation: ArrayLike,
+    asset_return: np.ndarray,
+    bond_return: Optional[ArrayLike] = None,
+    periods_per_year: int = 12,
+    initial_capital: float = 1.0,
+    bullish: Optional[np.ndarray] = None,
+    went_up: Optional[np.ndarray] = None
+) -> BacktestResult:
+    """
+    Backtest an allocation series against asset returns.
+
+    Args:
+        allocation: equity fraction held over each period (0-1)
+        asset_return: equity return of each period
+        bond_return: return of the rest (None = cash at 0%)
+        periods_per_year: 252 for daily, 12 for monthly (Sharpe / volatility)
+        initial_capital: start of the equity curve
+        bullish, went_up: win-rate inputs (default: allocation > 0.5 vs return > 0)
+    """
+    asset_return = np.asarray(asset_return, dtype=float)
+    allocation = np.broadcast_to(np.asarray(allocation, dtype=float), asset_return.shape)
+
+    portfolio_return = allocation * asset_return if bond_return is None else \
+        asset_return * allocation + bond_return * (1 - allocation)
+
+    n = len(portfolio_return)
+    equity = compound(portfolio_return, initial_capital)
+    buy_hold_equity = compound(asset_return, initial_capital)
+
+    total_return = float(np.prod(1 + portfolio_return) - 1)
+    buy_hold_return = float(np.prod(1 + asset_return) - 1)
+
+    std = float(portfolio_return.std(ddof=1)) if n > 1 else 0.0
+    sharpe = float(portfolio_return.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0
+    volatility = float(std * np.sqrt(periods_per_year))
+    max_dd = float(max_drawdown(compound(portfolio_return))) if n > 0 else 0.0
+
+    if bullish is None:
+        bullish = allocation > 0.5
+    if went_up is None:
+        went_up = asset_return > 0
+    wins, win_periods, rate = win_rate(bullish, went_up)
+
+    return BacktestResult(
+        allocation=allocation,
+        asset_return=asset_return,
+        portfolio_return=portfolio_return,
+        equity=equity,
+        buy_hold_equity=buy_hold_equity,
+        initial_capital=initial_capital,
+        total_return=total_return,
+        buy_hold_return=buy_hold_return,
+        sharpe_ratio=sharpe,
+        max_drawdown=max_dd,
+        volatility=volatility,
+        win_rate=rate,
+        wins=wins,
+        win_periods=win_periods,
+    )
+
+
+# ------------------------------------------------------------- Monte Carlo
+def block_bootstrap_indices(
+    n_periods: int,
+    n_paths: int,
+    block_size: int = 6,
+    seed: Optional[int] = 42
+) -> np.ndarray:
+    """
+    Circular moving-block bootstrap: (n_periods x n_paths) row indices.
+    Consecutive blocks keep short-range autocorrelation (momentum, volatility
+    clusters) that an i.i.d. resample would destroy.
+    """
+    if n_periods <= 0:
+        return np.zeros((0, n_paths), dtype=int)
+    block_size = max(1, min(block_size, n_periods))
+    n_blocks = -(-n_periods // block_size)  # ceil
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, n_periods, size=(n_blocks, 1, n_paths))
+    offsets = np.arange(block_size)[None, :, None]
+    idx = (starts + offsets) % n_periods          # (blocks x block_size x paths)
+    return idx.reshape(n_blocks * block_size, n_paths)[:n_periods]
+
+
+def _percentile_band(values: np.ndarray, percentiles: Sequence[float], scale: float = 1.0, digits: int = 2) -> Dict[str, float]:
+    points = np.percentile(values, percentiles)
+    return {f"p{p:g}": round(float(v) * scale, digits) for p, v in zip(percentiles, points)}
+
+
+def monte_carlo_backtest(
+    allocation: ArrayLike,
+    asset_return: np.ndarray,
+    bond_return: Optional[float] = None,
+    periods_per_year: int = 12,
+    n_paths: int = 10000,
+    block_size: int = 6,
+    seed: Optional[int] = 42,
+    percentiles: Sequence[float] = (5, 25, 50, 75, 95)
+) -> Dict[str, Any]:
+    """
+    Resample (allocation, asset return) pairs with a block bootstrap and
+    evaluate all paths in one batched (periods x paths) computation.
+    Returns percentile bands for total return, Sharpe and max drawdown.
+    """
+    asset_return = np.asarray(asset_return, dtype=float)
+    allocation = np.broadcast_to(np.asarray(allocation, dtype=float), asset_return.shape)
+    n = len(asset_return)
+    if n < 2:
+        raise ValueError("Need at least 2 periods for Monte Carlo")
+
+    idx = block_bootstrap_indices(n, n_paths, block_size, seed)
+    R = asset_return[idx]                         # (periods x paths)
+    A = allocation[idx]
+    P = A * R if bond_return is None else R * A + bond_return * (1 - A)
+
+    total_return = np.prod(1 + P, axis=0) - 1
+    buy_hold_return = np.prod(1 + R, axis=0) - 1
+
+    std = P.std(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, P.mean(axis=0) / std * np.sqrt(periods_per_year), 0.0)
+
+    max_dd = max_drawdown(np.cumprod(1 + P, axis=0))
+
+    return {
+        "paths": n_paths,
+        "periods": n,
+        "block_size": block_size,
+        "seed": seed,
+        "total_return_pct": _percentile_band(total_return, percentiles, 100),
+        "buy_hold_return_pct": _percentile_band(buy_hold_return, percentiles, 100),
+        "sharpe_ratio": _percentile_band(sharpe, percentiles),
+        "max_drawdown_pct": _percentile_band(max_dd, percentiles, 100),
+        "prob_loss_pct": round(float((total_return < 0).mean()) * 100, 1),
+        "prob_beat_buy_hold_pct": round(float((total_return > buy_hold_return).mean()) * 100, 1),
+    }
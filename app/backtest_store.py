@@ -0,0 +1,205 @@
+"""
+Persisted incremental backtest for MonthlyMLPredictor.
+
+The monthly backtest is stored with the model version, a fingerprint of
+every month it covers, the chart history and streaming metric accumulators
+(app.accumulators). A daily run then only predicts the months that have
+closed since the last run and folds them into the stored metrics, without
+recomputing the earlier months. A full recompute happens when:
+  - the model was retrained (model version changed), or
+  - any stored month's inputs changed (features, close or next close), or
+  - the stored window no longer lines up with the data.
+
+Only closed months are stored: a month is used once the following month has
+also closed, so its return is final. The window start is anchored at the
+first full recompute (70% of the data, as in backtest), so appended months
+extend the same track record instead of sliding it.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.accumulators import EquityMetrics
+from app.config import settings
+from app.kernels import compound
+
+
+STATE_VERSION = 2
+
+
+def _row_fingerprints(df_clean: pd.DataFrame, feature_columns: List[str]) -> List[str]:
+    """Hash of each month's inputs: features, close and the next month's close."""
+    values = df_clean[feature_columns + ["Close"]].to_numpy(dtype=float)
+    next_close = np.append(df_clean["Close"].to_numpy(dtype=float)[1:], np.nan)
+    rows = np.column_stack([values, next_close])
+    return [hashlib.sha1(row.tobytes()).hexdigest()[:16] for row in rows]
+
+
+def _closed_month_mask(dates: pd.Series, today: Optional[pd.Timestamp] = None) -> np.ndarray:
+    """True for months that ended before the current calendar month."""
+    if today is None:
+        today = pd.Timestamp.now(tz=settings.TIMEZONE).tz_localize(None)
+    current = pd.Timestamp(today).to_period("M")
+    return (pd.to_datetime(dates).dt.to_period("M") < current).to_numpy()
+
+
+class IncrementalBacktest:
+    """
+    ทำ backtest แบบต่อยอด: บันทึกผลไว้ แล้วเพิ่มเฉพาะเดือนที่ปิดใหม่
+    """
+
+    def __init__(self, predictor, state_file: str = "models/backtest_state.json"):
+        self.predictor = predictor
+        self.state_file = Path(state_file)
+
+    # ---------------------------------------------------------------- state
+    def model_version(self) -> str:
+        """Identifies the trained model; changes on every /train."""
+        return self.predictor.fingerprint()
+
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        if not self.state_file.exists():
+            return None
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state if state.get("version") == STATE_VERSION else None
+        except (OSError, ValueError):
+            return None
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        tmp.replace(self.state_file)
+
+    # ------------------------------------------------------------------ run
+    def _reusable_months(self, state: Optional[Dict[str, Any]], dates: List[str], fingerprints: List[str]) -> Optional[int]:
+        """
+        Position of the anchored window start if the stored months are still
+        valid for this model and data, else None (full recompute).
+        """
+        if not state or state.get("model_version") != self.model_version():
+            return None
+        months = state.get("months", [])
+        if not months or state.get("start_date") not in dates:
+            return None
+        start = dates.index(state["start_date"])
+        if start + len(months) > len(dates):
+            return None
+        for offset, month in enumerate(months):
+            if dates[start + offset] != month["date"] or fingerprints[start + offset] != month["fingerprint"]:
+                return None
+        return start
+
+    def run(
+        self,
+        monthly: pd.DataFrame,
+        initial_capital: float = 100000,
+        today: Optional[pd.Timestamp] = None,
+        force_full: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Backtest with the same output as MonthlyMLPredictor.backtest, plus an
+        "incremental" section describing what was recomputed.
+        """
+        predictor = self.predictor
+        if predictor.model is None:
+            raise ValueError("Model not trained")
+
+        df = predictor.create_features(monthly)
+        df_clean = df.dropna(subset=predictor.feature_columns + ["Target"])
+        if len(df_clean) < 30:
+            raise ValueError("Not enough data for backtest")
+
+        date_col = df_clean["Date"] if "Date" in df_clean.columns else pd.Series(df_clean.index, index=df_clean.index)
+        dates = list(pd.to_datetime(date_col).dt.strftime("%Y-%m"))
+        fingerprints = _row_fingerprints(df_clean, predictor.feature_columns)
+
+        # Month i is usable when month i+1 has closed (its return is final)
+        closed = _closed_month_mask(date_col, today)
+        usable_end = int(np.flatnonzero(closed[1:])[-1]) + 1 if closed[1:].any() else 0  # exclusive
+
+        state = None if force_full else self.load_state()
+        if state and state.get("initial_capital") != initial_capital:
+            state = None
+        start = self._reusable_months(state, dates, fingerprints)
+
+        if start is None:
+            mode = "full"
+            start = int(len(df_clean) * 0.7)
+            months, history = [], []
+            metrics = EquityMetrics.start(initial_capital, periods_per_year=12)
+            chart = [100.0, 100.0, 100.0]
+        else:
+            mode = "append"
+            months, history = state["months"], state["history"]
+            metrics = EquityMetrics.from_dict(state["metrics"])
+            chart = state["chart"]
+
+        first_new = start + len(months)
+        new_months = max(0, usable_end - first_new)
+        if new_months:
+            window = df_clean.iloc[:usable_end + 1]
+            predictions, confidences = predictor._predict_window(window.iloc[first_new:usable_end])
+            _, frame = predictor._backtest_frame(window, first_new, predictions, confidences, 1.0)
+
+            # O(1) per month: metrics and chart values continue from the stored state
+            metrics.update_many(
+                frame["portfolio_return"], frame["actual_return"],
+                frame["prediction"] == 1, frame["actual"] == 1
+            )
+            history += predictor._format_history(frame, window, first_new, initial_values=tuple(chart))
+            chart = [
+                float(compound(frame["portfolio_return"].to_numpy(), chart[0])[-1]),
+                float(compound(frame["actual_return"].to_numpy(), chart[1])[-1]),
+                float(compound(np.full(new_months, 0.003), chart[2])[-1]),
+            ]
+            for offset, (pred, conf) in enumerate(zip(predictions, confidences)):
+                i = first_new + offset
+                months.append({
+                    "date": dates[i],
+                    "prediction": int(pred),
+                    "confidence": float(conf),
+                    "fingerprint": fingerprints[i],
+                })
+        elif mode == "append":
+            mode = "cached"
+
+        if not months:
+            raise ValueError("No closed months in the backtest window")
+
+        end = start + len(months)  # month after the last prediction
+        close = df_clean["Close"]
+        buy_hold_return = (close.iloc[end] - close.iloc[start]) / close.iloc[start] * 100
+        result = predictor._backtest_summary(
+            metrics, buy_hold_return, dates[start], dates[end], initial_capital, history
+        )
+
+        self.save_state({
+            "version": STATE_VERSION,
+            "model_version": self.model_version(),
+            "start_date": dates[start],
+            "initial_capital": initial_capital,
+            "months": months,
+            "metrics": metrics.to_dict(),
+            "chart": chart,
+            "history": history,
+            "updated_at": datetime.now().isoformat(),
+        })
+
+        result["incremental"] = {
+            "mode": mode,
+            "new_months": new_months,
+            "stored_months": len(months),
+            "start_date": dates[start],
+            "model_version": self.model_version(),
+        }
+        return result
@@ -0,0 +1,156 @@
+"""
+Debug mode: find redundant work inside one request or one daily run.
+
+Key functions are decorated with @audited("name"). Inside a call_audit()
+scope every call is counted per input fingerprint, and the report lists
+functions that ran more than once on identical input:
+
+    create_features called 4x on identical input (3 wasted, 12.4 ms)
+
+Enable with PEA_DEBUG_CALLS=1: the API then audits each request (log line
+plus an X-Duplicate-Calls header) and scripts/daily_update.py audits the
+run. Outside a scope, or with the flag off, @audited costs one ContextVar
+lookup per call.
+"""
+
+import functools
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+_current: ContextVar[Optional["CallAudit"]] = ContextVar("call_audit", default=None)
+
+
+def fingerprint(value: Any) -> str:
+    """Content hash of a call argument (frames and arrays by value, other objects by identity)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        try:
+            hashed = pd.util.hash_pandas_object(value, index=True).values
+        except TypeError:  # unhashable cells (lists, dicts)
+            return f"{type(value).__name__}@{id(value):x}"
+        columns = repr(list(value.columns)) if isinstance(value, pd.DataFrame) else repr(value.name)
+        return hashlib.sha1(hashed.tobytes() + columns.encode("utf-8")).hexdigest()[:12]
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value).tobytes() + str(value.dtype).encode("ascii")).hexdigest()[:12]
+    if value is None or isinstance(value, (str, int, float, bool, tuple)):
+        return repr(value)
+    return f"{type(value).__name__}@{id(value):x}"
+
+
+class CallAudit:
+    """Calls recorded in one scope: {name: {fingerprint: [count, seconds]}}."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.calls: Dict[str, Dict[str, List[float]]] = {}
+
+    def record(self, name: str, key: str, seconds: float) -> None:
+        entry = self.calls.setdefault(name, {}).setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def duplicates(self) -> List[Dict[str, Any]]:
+        """(function, input) pairs seen more than once, most wasted time first."""
+        rows = []
+        for name, by_key in self.calls.items():
+            for key, (count, seconds) in by_key.items():
+                if count > 1:
+                    rows.append({
+                        "function": name,
+                        "calls": int(count),
+                        "fingerprint": key,
+                        "wasted_ms": round(seconds / count * (count - 1) * 1000, 3),
+                    })
+        return sorted(rows, key=lambda row: row["wasted_ms"], reverse=True)
+
+    def summary(self) -> Dict[str, Tuple[int, int]]:
+        """{function: (calls, distinct inputs)}"""
+        return {
+            name: (int(sum(entry[0] for entry in by_key.values())), len(by_key))
+            for name, by_key in self.calls.items()
+        }
+
+    def report(self) -> str:
+        lines = [f"Call audit [{self.label}]"]
+        for name, (calls, distinct) in sorted(self.summary().items()):
+            lines.append(f"  {name:28s} {calls:4d} calls, {distinct:3d} distinct inputs")
+        duplicates = self.duplicates()
+        for row in duplicates:
+            key = row["fingerprint"] if len(row["fingerprint"]) <= 60 else row["fingerprint"][:57] + "..."
+            lines.append(
+                f"  ! {row['function']} called {row['calls']}x on identical input "
+                f"({row['calls'] - 1} wasted, {row['wasted_ms']:.1f} ms) [{key}]"
+            )
+        if not duplicates:
+            lines.append("  no redundant calls")
+        return "\n".join(lines)
+
+
+def audited(name: str):
+    """Count calls of the decorated function per input fingerprint while a call_audit() is active."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            audit = _current.get()
+            if audit is None:
+                return func(*args, **kwargs)
+            key = ",".join([fingerprint(a) for a in args] + [f"{k}={fingerprint(v)}" for k, v in sorted(kwargs.items())])
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                audit.record(name, key, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def call_audit(label: str, enabled: Optional[bool] = None, verbose: bool = True):
+    """
+    Audit scope (one request / one run). Yields the CallAudit, or None when
+    disabled (enabled defaults to settings.DEBUG_CALLS). Prints the report
+    on exit when verbose.
+    """
+    if not (settings.DEBUG_CALLS if enabled is None else enabled):
+        yield None
+        return
+    audit = CallAudit(label)
+    token = _current.set(audit)
+    try:
+        yield audit
+    finally:
+        _current.reset(token)
+        if verbose:
+            print(audit.report())
+
+
+class CallAuditMiddleware:
+    """ASGI middleware: one audit scope per request (PEA_DEBUG_CALLS=1)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.DEBUG_CALLS:
+            await self.app(scope, receive, send)
+            return
+
+        with call_audit(f"{scope['method']} {scope['path']}", enabled=True, verbose=False) as audit:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    # Handlers have finished by the time the response starts
+                    count = sum(row["calls"] - 1 for row in audit.duplicates())
+                    headers = list(message.get("headers", [])) + [(b"x-duplicate-calls", str(count).encode("ascii"))]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        if audit.calls:
+            print(audit.report())
@@ -1,5 +1,6 @@
 """Configuration settings for the Stock Market Prediction API."""
 
+import os
 from dataclasses import dataclass
 
 @dataclass
@@ -64,6 +65,38 @@ class Settings:
     # Model parameters
     TEST_SIZE: float = 0.2
     RANDOM_STATE: int = 42
+    
+    # Data source: "yfinance" or "synthetic" (offline, app/synthetic_data.py)
+    DATA_SOURCE: str = os.environ.get("PEA_DATA_SOURCE", "yfinance")
+    SYNTHETIC_YEARS: int = int(os.environ.get("PEA_SYNTHETIC_YEARS", "40"))
+    SYNTHETIC_MODEL: str = os.environ.get("PEA_SYNTHETIC_MODEL", "regime")
+    SYNTHETIC_SEED: int = int(os.environ.get("PEA_SYNTHETIC_SEED", "0"))
+    
+    # API caches: backtest responses (memory + optional disk dir) and data fetches
+    BACKTEST_CACHE_DIR: str = os.environ.get("PEA_BACKTEST_CACHE_DIR", "")
+    BACKTEST_CACHE_ENTRIES: int = 64
+    DATA_CACHE_TTL: int = int(os.environ.get("PEA_DATA_CACHE_TTL", "300"))  # seconds, 0 = off
+    
+    # Prometheus metrics at /metrics (spans are no-ops when off)
+    METRICS_ENABLED: bool = os.environ.get("PEA_METRICS", "1").lower() not in ("0", "false", "no")
+    
+    # ?profile=1 on any endpoint (app/profiling.py); disabled while the token is empty
+    ADMIN_TOKEN: str = os.environ.get("PEA_ADMIN_TOKEN", "")
+    PROFILE_MAX_EVENTS: int = 200_000  # speedscope call/return events per request
+    
+    # Debug: count repeated calls on identical input per request / run (app/call_audit.py)
+    DEBUG_CALLS: bool = os.environ.get("PEA_DEBUG_CALLS", "0").lower() in ("1", "true", "yes")
+    
+    # tracemalloc peak / net allocation per API request at /metrics (slows requests)
+    TRACE_MEMORY: bool = os.environ.get("PEA_TRACE_MEMORY", "0").lower() in ("1", "true", "yes")
+    MEMORY_BUDGET_MB: float = float(os.environ.get("PEA_MEMORY_BUDGET_MB", "0"))  # per request, 0 = off
+    
+    # SQLite ledger of daily_update runs (app/run_ledger.py, scripts/run_ledger.py)
+    RUN_LEDGER_PATH: str = os.environ.get("PEA_RUN_LEDGER", "models/run_ledger.sqlite")
+    
+    # daily_update DAG (app/pipeline.py): concurrent stages and stage output cache ("" = off)
+    PIPELINE_WORKERS: int = int(os.environ.get("PEA_PIPELINE_WORKERS", "4"))
+    PIPELINE_CACHE_DIR: str = os.environ.get("PEA_PIPELINE_CACHE_DIR", "models/pipeline_cache")
 
 settings = Settings()
 
@@ -1,4 +1,7 @@
-"""Module for fetching stock data from yfinance."""
+"""
+Module for fetching stock data from yfinance.
+Set PEA_DATA_SOURCE=synthetic to run offline on generated data instead.
+"""
 
 import yfinance as yf
 import pandas as pd
@@ -6,7 +9,9 @@ from typing import Optional
 from datetime import datetime
 import pytz
 
-from app.config import TIMEZONE
+from app.config import TIMEZONE, settings
+from app.metrics import FETCH_FAILURES, span
+from app.call_audit import audited
 
 
 def get_thai_time() -> datetime:
@@ -51,6 +56,20 @@ def get_market_status() -> dict:
     }
 
 
+def _synthetic_data(ticker: str, period: str) -> pd.DataFrame:
+    """Offline data (PEA_DATA_SOURCE=synthetic), ending today in Thai time."""
+    from app.synthetic_data import synthetic_stock_data
+    
+    return synthetic_stock_data(
+        ticker, period,
+        years=settings.SYNTHETIC_YEARS,
+        model=settings.SYNTHETIC_MODEL,
+        seed=settings.SYNTHETIC_SEED,
+        end=get_thai_time().date()
+    )
+
+
+@audited("fetch_stock_data")
 def fetch_stock_data(ticker: str, period: str = "max") -> pd.DataFrame:
     """
     Fetch historical stock data from yfinance.
@@ -65,26 +84,32 @@ def fetch_stock_data(ticker: str, period: str = "max") -> pd.DataFrame:
     Raises:
         ValueError: If no data is returned
     """
-    try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period=period)
-        
-        if df.empty:
-            raise ValueError(f"No data returned for ticker: {ticker}")
+    with span("fetch"):
+        if settings.DATA_SOURCE == "synthetic":
+            return _synthetic_data(ticker, period)
         
-        df = df.reset_index()
-        df.columns = [col if col != "Date" else "Date" for col in df.columns]
+        try:
+            stock = yf.Ticker(ticker)
+            df = stock.history(period=period)
+            
+            if df.empty:
+                raise ValueError(f"No data returned for ticker: {ticker}")
+            
+            df = df.reset_index()
+            df.columns = [col if col != "Date" else "Date" for col in df.columns]
+            
+            # Ensure Date column is datetime
+            if "Date" in df.columns:
+                df["Date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None)
+            
+            return df
         
-        # Ensure Date column is datetime
-        if "Date" in df.columns:
-            df["Date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None)
-        
-        return df
-    
-    except Exception as e:
-        raise ValueError(f"Error fetching data for {ticker}: {str(e)}")
+        except Exception as e:
+            FETCH_FAILURES.inc("fetch_stock_data")
+            raise ValueError(f"Error fetching data for {ticker}: {str(e)}")
 
 
+@audited("fetch_latest_data")
 def fetch_latest_data(ticker: str, days: int = 250) -> pd.DataFrame:
     """
     Fetch recent stock data for prediction.
@@ -96,18 +121,23 @@ def fetch_latest_data(ticker: str, days: int = 250) -> pd.DataFrame:
     Returns:
         DataFrame with recent OHLCV data
     """
-    try:
-        stock = yf.Ticker(ticker)
-        df = stock.history(period=f"{days}d")
+    with span("fetch"):
+        if settings.DATA_SOURCE == "synthetic":
+            return _synthetic_data(ticker, f"{days}d")
         
-        if df.empty:
-            raise ValueError(f"No recent data for ticker: {ticker}")
+        try:
+            stock = yf.Ticker(ticker)
+            df = stock.history(period=f"{days}d")
+            
+            if df.empty:
+                raise ValueError(f"No recent data for ticker: {ticker}")
+            
+            df = df.reset_index()
+            if "Date" in df.columns:
+                df["Date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None)
+            
+            return df
         
-        df = df.reset_index()
-        if "Date" in df.columns:
-            df["Date"] = pd.to_datetime(df["Date"]).dt.tz_localize(None)
-        
-        return df
-    
-    except Exception as e:
-        raise ValueError(f"Error fetching latest data: {str(e)}")
+        except Exception as e:
+            FETCH_FAILURES.inc("fetch_latest_data")
+            raise ValueError(f"Error fetching latest data: {str(e)}")
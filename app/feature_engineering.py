@@ -4,6 +4,9 @@ import pandas as pd
 import numpy as np
 from typing import Tuple
 
+from app.kernels import forward_max_drop
+from app.call_audit import audited
+
 
 def calculate_rsi(close: pd.Series, period: int = 14) -> pd.Series:
     """Calculate Relative Strength Index."""
@@ -91,6 +94,7 @@ def calculate_volume_ratio(volume: pd.Series, period: int = 20) -> pd.Series:
     return volume / vol_ma
 
 
+@audited("add_technical_indicators")
 def add_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add all technical indicators to the dataframe.
@@ -172,18 +176,7 @@ def create_target(df: pd.DataFrame, threshold: float = -2.0, lookahead: int = 5)
     df = df.copy()
     
     # Calculate max drawdown in next N days
-    future_returns = []
-    for i in range(len(df)):
-        if i + lookahead < len(df):
-            future_prices = df["Close"].iloc[i+1:i+lookahead+1]
-            current_price = df["Close"].iloc[i]
-            min_future = future_prices.min()
-            max_drop = (min_future - current_price) / current_price * 100
-            future_returns.append(max_drop)
-        else:
-            future_returns.append(np.nan)
-    
-    df["Future_MaxDrop"] = future_returns
+    df["Future_MaxDrop"] = forward_max_drop(df["Close"].to_numpy(dtype=float), lookahead)
     
     # Target: 1 = Safe (no big drop), 0 = Danger (big drop coming)
     df["Target"] = (df["Future_MaxDrop"] > threshold).astype(int)
@@ -0,0 +1,153 @@
+"""
+Stage timing for batch jobs (daily_update) and baseline comparison for the
+benchmark scripts.
+
+    with StageTimer(track_memory=True) as timer:
+        with timer.stage("fetch"):
+            df = fetch_stock_data(...)
+    print(timer.table())
+    print(check_memory_budget(timer.stages, budget_mb=512))
+"""
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """
+    Wall time per named stage. With track_memory (tracemalloc, opt-in because
+    it slows allocation-heavy code) also the peak and net traced allocation
+    of each stage: peak_kb is the high-water mark above the stage's starting
+    point, net_kb what the stage left allocated when it finished.
+
+    Used as a context manager, tracing runs for the whole block so net_kb
+    also counts memory freed that earlier stages allocated; otherwise it is
+    started and stopped around each stage.
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._started_tracing = False
+
+    def __enter__(self) -> "StageTimer":
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {"ms": 0.0, "peak_kb": 0.0, "net_kb": 0.0, "calls": 0})
+            record["ms"] += (time.perf_counter() - start) * 1000
+            record["calls"] += 1
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_kb"] = max(record["peak_kb"], (peak - base) / 1024)
+                record["net_kb"] += (current - base) / 1024
+                if started_tracing:
+                    tracemalloc.stop()
+
+    @property
+    def total_ms(self) -> float:
+        return sum(record["ms"] for record in self.stages.values())
+
+    @property
+    def peak_kb(self) -> float:
+        """Largest per-stage traced peak."""
+        return max((record["peak_kb"] for record in self.stages.values()), default=0.0)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "ms": round(record["ms"], 3),
+                "peak_kb": round(record["peak_kb"], 1),
+                "net_kb": round(record["net_kb"], 1),
+            }
+            for name, record in self.stages.items()
+        }
+
+    def table(self) -> str:
+        lines = [f"{'stage':24s} {'ms':>10s} {'%':>6s} {'peak KB':>12s} {'net KB':>12s}"]
+        total = self.total_ms or 1.0
+        for name, record in self.stages.items():
+            lines.append(
+                f"{name:24s} {record['ms']:10.2f} {record['ms'] / total * 100:5.1f}% "
+                f"{record['peak_kb']:12.0f} {record['net_kb']:12.0f}"
+            )
+        lines.append(f"{'total':24s} {self.total_ms:10.2f}")
+        return "\n".join(lines)
+
+
+def check_memory_budget(
+    stages: Dict[str, Dict[str, float]],
+    budget_mb: float,
+    stage_budgets_mb: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """
+    Stages whose traced peak exceeds their budget (stage_budgets_mb[name],
+    else budget_mb). An empty list means the run fits.
+    """
+    stage_budgets_mb = stage_budgets_mb or {}
+    violations = []
+    for name, record in stages.items():
+        limit = stage_budgets_mb.get(name, budget_mb)
+        if limit and record["peak_kb"] > limit * 1024:
+            violations.append(f"{name}: peak {record['peak_kb'] / 1024:.1f} MB > budget {limit:.1f} MB")
+    return violations
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    time_key: str,
+    time_tolerance: float,
+    memory_tolerance: float,
+    min_delta_ms: float = 2.0
+) -> List[str]:
+    """
+    Regressions of {name: {time_key, "peak_kb"}} against a baseline of the
+    same shape. Slowdowns smaller than min_delta_ms are timer jitter.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = current[time_key] - base[time_key]
+        if slower > min_delta_ms and current[time_key] > base[time_key] * (1 + time_tolerance):
+            regressions.append(f"{name}: {base[time_key]:.2f} → {current[time_key]:.2f} ms")
+        if base.get("peak_kb") and current["peak_kb"] > base["peak_kb"] * (1 + memory_tolerance):
+            regressions.append(f"{name}: {base['peak_kb']:.0f} → {current['peak_kb']:.0f} KB peak")
+    return regressions
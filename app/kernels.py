@@ -0,0 +1,189 @@
+"""
+Kernels for the path-dependent loops (compounding, EMA smoothing, running
+drawdown, forward max drop).
+
+Numba is optional. If it is installed, the loops are JIT-compiled on first use.
+Otherwise, or when PEA_DISABLE_NUMBA=1, the pure NumPy versions are used.
+Both backends return the same values; scripts/benchmark_kernels.py checks
+parity and compares timings.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+try:
+    if os.environ.get("PEA_DISABLE_NUMBA", "").lower() in ("1", "true", "yes"):
+        raise ImportError("disabled by PEA_DISABLE_NUMBA")
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    njit = None
+    HAS_NUMBA = False
+
+
+# ------------------------------------------------------------------ NumPy
+def _compound_numpy(returns: np.ndarray, initial: float) -> np.ndarray:
+    return np.cumprod(np.concatenate(([initial], 1 + returns)))[1:]
+
+
+def _ema_smooth_numpy(values: np.ndarray, alpha: float, initial: np.ndarray) -> np.ndarray:
+    # The recursion is sequential in time. With few series a scalar loop on
+    # Python floats beats per-row array ops; with many, vectorize across series.
+    out = np.empty_like(values)
+    if values.shape[1] <= 16:
+        beta = 1 - alpha
+        for j, column in enumerate(values.T.tolist()):
+            prev = float(initial[j])
+            smoothed = []
+            for v in column:
+                prev = alpha * prev + beta * v
+                smoothed.append(prev)
+            out[:, j] = smoothed
+        return out
+    prev = initial
+    for t in range(values.shape[0]):
+        prev = alpha * prev + (1 - alpha) * values[t]
+        out[t] = prev
+    return out
+
+
+def _running_drawdown_numpy(equity: np.ndarray) -> np.ndarray:
+    peak = np.maximum.accumulate(equity, axis=0)
+    return (equity - peak) / peak
+
+
+def _forward_max_drop_numpy(close: np.ndarray, lookahead: int) -> np.ndarray:
+    n = len(close)
+    out = np.full(n, np.nan)
+    if n <= lookahead:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(close[1:], lookahead)[:n - lookahead]
+    # fmin ignores NaN like pandas .min()
+    min_future = np.fmin.reduce(windows, axis=1)
+    current = close[:n - lookahead]
+    out[:n - lookahead] = (min_future - current) / current * 100
+    return out
+
+
+# ------------------------------------------------------------------ Numba
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _compound_numba(returns, initial):
+        out = np.empty(returns.shape[0])
+        capital = initial
+        for i in range(returns.shape[0]):
+            capital = capital * (1 + returns[i])
+            out[i] = capital
+        return out
+
+    @njit(cache=True)
+    def _ema_smooth_numba(values, alpha, initial):
+        out = np.empty_like(values)
+        n, k = values.shape
+        for j in range(k):
+            prev = initial[j]
+            for t in range(n):
+                prev = alpha * prev + (1 - alpha) * values[t, j]
+                out[t, j] = prev
+        return out
+
+    @njit(cache=True)
+    def _running_drawdown_numba(equity):
+        out = np.empty_like(equity)
+        n, k = equity.shape
+        for j in range(k):
+            peak = equity[0, j]
+            for t in range(n):
+                if equity[t, j] > peak:
+                    peak = equity[t, j]
+                out[t, j] = (equity[t, j] - peak) / peak
+        return out
+
+    @njit(cache=True)
+    def _forward_max_drop_numba(close, lookahead):
+        n = close.shape[0]
+        out = np.full(n, np.nan)
+        for i in range(n - lookahead):
+            min_future = np.nan
+            for j in range(i + 1, i + lookahead + 1):
+                if not np.isnan(close[j]) and (np.isnan(min_future) or close[j] < min_future):
+                    min_future = close[j]
+            out[i] = (min_future - close[i]) / close[i] * 100
+        return out
+
+
+def _use_numba(backend: Optional[str]) -> bool:
+    if backend is None:
+        return HAS_NUMBA
+    if backend == "numba" and not HAS_NUMBA:
+        raise RuntimeError("numba backend requested but numba is not installed")
+    return backend == "numba"
+
+
+# ----------------------------------------------------------------- public
+def compound(returns, initial: float = 1.0, backend: Optional[str] = None) -> np.ndarray:
+    """
+    Capital path: initial * (1 + r0) * (1 + r1) * ..., one value per return.
+    """
+    returns = np.ascontiguousarray(returns, dtype=float)
+    if _use_numba(backend):
+        return _compound_numba(returns, float(initial))
+    return _compound_numpy(returns, float(initial))
+
+
+def ema_smooth(values, alpha: float, initial=None, backend: Optional[str] = None) -> np.ndarray:
+    """
+    Recursive smoothing y[t] = alpha * y[t-1] + (1 - alpha) * x[t].
+    alpha is the weight of the previous value (like ALLOCATION_SMOOTHING).
+
+    Args:
+        values: (time,) or (time x series)
+        initial: y[-1] per series (default: first row, i.e. y[0] = x[0])
+    """
+    values = np.asarray(values, dtype=float)
+    one_dim = values.ndim == 1
+    values = np.ascontiguousarray(values.reshape(len(values), -1))
+    if initial is None:
+        initial = values[0] if len(values) else np.zeros(values.shape[1])
+    initial = np.ascontiguousarray(np.broadcast_to(np.asarray(initial, dtype=float), values.shape[1:]))
+
+    if _use_numba(backend):
+        out = _ema_smooth_numba(values, float(alpha), initial)
+    else:
+        out = _ema_smooth_numpy(values, float(alpha), initial)
+    return out[:, 0] if one_dim else out
+
+
+def running_drawdown(equity, backend: Optional[str] = None) -> np.ndarray:
+    """
+    Drawdown from the running peak, (equity - peak) / peak, for each point.
+    equity: (time,) or (time x series)
+    """
+    equity = np.asarray(equity, dtype=float)
+    one_dim = equity.ndim == 1
+    equity = np.ascontiguousarray(equity.reshape(len(equity), -1))
+    if len(equity) == 0:
+        out = equity.copy()
+    elif _use_numba(backend):
+        out = _running_drawdown_numba(equity)
+    else:
+        out = _running_drawdown_numpy(equity)
+    return out[:, 0] if one_dim else out
+
+
+def max_drawdown(equity, backend: Optional[str] = None):
+    """Most negative running drawdown (per series for 2-D input)."""
+    return running_drawdown(equity, backend).min(axis=0)
+
+
+def forward_max_drop(close, lookahead: int, backend: Optional[str] = None) -> np.ndarray:
+    """
+    % change from close[i] to the lowest close in the next `lookahead` bars.
+    The last `lookahead` values are NaN.
+    """
+    close = np.ascontiguousarray(close, dtype=float)
+    if _use_numba(backend):
+        return _forward_max_drop_numba(close, int(lookahead))
+    return _forward_max_drop_numpy(close, int(lookahead))
@@ -1,10 +1,11 @@
 """FastAPI application for Stock Market Prediction API."""
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from datetime import datetime
-import numpy as np
+import time
 
 from app.config import (
     TICKER,
@@ -15,15 +16,25 @@ from app.config import (
     LOW_CONFIDENCE_ALLOCATION,
     DANGER_ALLOCATION,
     DANGER_THRESHOLD,
-    LOOKAHEAD_DAYS
+    LOOKAHEAD_DAYS,
+    settings
 )
 from app.data_fetcher import fetch_stock_data, fetch_latest_data, get_market_status, get_thai_time
 from app.feature_engineering import add_technical_indicators, create_target_mean_reversion
 from app.model import StockPredictor
 from app.backtest import run_backtest
+from app.backtest_engine import run_backtest_arrays
 from app.strategy import get_strategy_signals, backtest_ensemble, calculate_allocation_from_signal
 from app.monthly_strategy import create_monthly_data, get_monthly_prediction, backtest_monthly_strategy
 from app.monthly_ml import MonthlyMLPredictor, create_monthly_data_for_ml
+from app.signal_rules import SignalRule, Ladder, Step, when
+from app.result_cache import ResultCache, TTLCache, make_key
+from app.profiling import ProfilingMiddleware
+from app.call_audit import CallAuditMiddleware
+from app.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, MemoryMetricsMiddleware, RequestMetricsMiddleware,
+    render as render_metrics, span
+)
 from app.schemas import (
     PredictionResponse,
     TrainResponse,
@@ -32,10 +43,62 @@ from app.schemas import (
     ErrorResponse
 )
 
+def _confidence_ladder(name: str, bullish: tuple, bearish: tuple, default: float) -> SignalRule:
+    """(prediction, confidence) -> allocation, thresholds checked from the top down."""
+    steps = [
+        Step((when("prediction", "==", 1), when("confidence", ">=", threshold)), value)
+        for threshold, value in bullish
+    ] + [
+        Step((when("prediction", "==", 0), when("confidence", ">=", threshold)), value)
+        for threshold, value in bearish
+    ]
+    return SignalRule(name=name, ladders=(Ladder("allocation", tuple(steps), default=default),))
+
+
+# PEA-E % for /predict: Bullish favors equity, Bearish favors bond
+PEA_E_ALLOCATION_RULE = _confidence_ladder(
+    "pea_e_allocation",
+    bullish=((0.70, 100), (0.65, 80), (0.60, 70), (0.55, 60), (0.0, 50)),
+    bearish=((0.70, 0), (0.65, 20), (0.60, 30), (0.55, 40), (0.0, 50)),
+    default=50,
+)
+
+# Equity fraction used by the /backtest endpoint
+BACKTEST_ENDPOINT_ALLOCATION_RULE = _confidence_ladder(
+    "backtest_endpoint_allocation",
+    bullish=((0.7, 1.0), (0.6, 0.7), (0.0, 0.5)),
+    bearish=((0.7, 0.0), (0.6, 0.2), (0.0, 0.4)),
+    default=0.4,
+)
+
 # Global instances
 predictor: StockPredictor = None
 monthly_predictor: MonthlyMLPredictor = None
 
+# Backtest responses change at most once a day (new bar) or on /train (new model)
+backtest_cache = ResultCache(settings.BACKTEST_CACHE_ENTRIES, settings.BACKTEST_CACHE_DIR, name="backtest")
+history_cache = TTLCache(settings.DATA_CACHE_TTL, name="history")
+
+
+def fetch_history(ticker: str = TICKER):
+    """Full daily history, memoized for DATA_CACHE_TTL seconds (treat as read-only)."""
+    return history_cache.get_or_compute(ticker, lambda: fetch_stock_data(ticker))
+
+
+def backtest_cache_key(endpoint: str, df, **params) -> str:
+    """
+    (model in memory, last data bar, parameters). Keyed on the loaded model,
+    not the file on disk: daily_update / retrain_model.py may overwrite the
+    artifact while this process still serves the old model.
+    """
+    return make_key(
+        endpoint,
+        model=monthly_predictor.fingerprint(),
+        last_bar=str(df["Date"].iat[-1]),
+        last_close=float(df["Close"].iat[-1]),
+        **params
+    )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -46,13 +109,29 @@ async def lifespan(app: FastAPI):
     yield
 
 
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records body serialization as the "serialize" stage."""
+    
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+
 app = FastAPI(
     title="AI Navigator - PEA PVD Optimization",
     description="ระบบ GPS นำทางอัจฉริยะสำหรับกองทุนสำรองเลี้ยงชีพ",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
 
+app.add_middleware(MemoryMetricsMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+# PEA_DEBUG_CALLS=1: log repeated calls on identical input per request
+app.add_middleware(CallAuditMiddleware)
+# Outermost: ?profile=1 with X-Admin-Token wraps the whole request
+app.add_middleware(ProfilingMiddleware)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -88,6 +167,12 @@ async def health_check():
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage latency, cache hits/misses, fetch failures."""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.post("/train", response_model=TrainResponse, responses={500: {"model": ErrorResponse}})
 async def train_model():
     """
@@ -102,13 +187,20 @@ async def train_model():
         # Train ML model
         metrics = monthly_predictor.train(monthly)
         
+        # Distill a single fast model for high-QPS serving
+        distillation = monthly_predictor.distill(monthly)
+        
+        # New model published: cached backtests are stale
+        backtest_cache.clear()
+        
         return TrainResponse(
             status="success",
             train_accuracy=metrics["train_accuracy"],
             test_accuracy=metrics["test_accuracy"],
             train_samples=metrics["train_samples"],
             test_samples=metrics["test_samples"],
-            features_used=[f"{metrics['features_used']} features"]
+            features_used=[f"{metrics['features_used']} features"],
+            distillation=distillation
         )
     
     except Exception as e:
@@ -116,10 +208,12 @@ async def train_model():
 
 
 @app.get("/predict", response_model=PredictionResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
-async def predict():
+async def predict(fast: bool = False):
     """
     ทำนายรายเดือนด้วย ML Ensemble
     แนะนำสัดส่วน PEA-E (หุ้น) vs PEA-F (ตราสารหนี้) รวมกัน = 100%
+    
+    fast=true ใช้โมเดลเดี่ยวที่ distill จาก ensemble (เร็วกว่า แม่นยำลดลงเล็กน้อย)
     """
     try:
         market = get_market_status()
@@ -128,31 +222,11 @@ async def predict():
         # Try ML prediction first
         if monthly_predictor.is_trained():
             monthly = create_monthly_data_for_ml(df)
-            prediction, confidence, details = monthly_predictor.predict(monthly)
+            use_fast = fast and monthly_predictor.has_fast_model()
+            prediction, confidence, details = monthly_predictor.predict(monthly, fast=use_fast)
             
             # Calculate allocation (must sum to 100%)
-            if prediction == 1:  # Bullish - favor equity
-                if confidence >= 0.70:
-                    pea_e = 100
-                elif confidence >= 0.65:
-                    pea_e = 80
-                elif confidence >= 0.60:
-                    pea_e = 70
-                elif confidence >= 0.55:
-                    pea_e = 60
-                else:
-                    pea_e = 50
-            else:  # Bearish - favor bond
-                if confidence >= 0.70:
-                    pea_e = 0
-                elif confidence >= 0.65:
-                    pea_e = 20
-                elif confidence >= 0.60:
-                    pea_e = 30
-                elif confidence >= 0.55:
-                    pea_e = 40
-                else:
-                    pea_e = 50
+            pea_e = int(PEA_E_ALLOCATION_RULE.evaluate_latest({"prediction": prediction, "confidence": confidence}))
             
             pea_f = 100 - pea_e
             
@@ -180,15 +254,19 @@ async def predict():
             
             # Build reasoning
             ind = details["individual_models"]
-            votes_up = sum(1 for m in ind.values() if m["prediction"] == 1)
-            reasoning = f"ML Vote: {votes_up}/3 ทายขึ้น | ความมั่นใจ {confidence:.0%}"
+            if use_fast:
+                reasoning = f"ML Fast (distilled) | ความมั่นใจ {confidence:.0%}"
+            else:
+                votes_up = sum(1 for m in ind.values() if m["prediction"] == 1)
+                reasoning = f"ML Vote: {votes_up}/3 ทายขึ้น | ความมั่นใจ {confidence:.0%}"
             
             latest_date = monthly["Date"].iloc[-1].strftime("%Y-%m")
             
         else:
             # Fallback to rule-based
-            monthly = create_monthly_data(df)
-            pred = get_monthly_prediction(monthly)
+            with span("rule_fallback"):
+                monthly = create_monthly_data(df)
+                pred = get_monthly_prediction(monthly)
             
             pea_e = pred["allocation"]
             pea_f = 100 - pea_e
@@ -233,98 +311,16 @@ async def predict_monthly_detail():
 async def backtest():
     """
     Backtest ML Monthly Strategy
+    ผลลัพธ์ถูก cache ตาม (model, แท่งข้อมูลล่าสุด) จนกว่าจะมีข้อมูลใหม่หรือ /train
     """
     try:
         if not monthly_predictor.is_trained():
             raise HTTPException(status_code=400, detail="Model not trained. Call /train first.")
         
-        df = fetch_stock_data(TICKER)
-        monthly = create_monthly_data_for_ml(df)
-        
-        # Create features
-        df_feat = monthly_predictor.create_features(monthly)
-        features = monthly_predictor.feature_columns
-        
-        df_clean = df_feat.dropna(subset=features + ["Target"])
-        
-        # Time-series split
-        split = int(len(df_clean) * 0.7)
-        test_df = df_clean.iloc[split:].copy()
-        
-        # Get predictions for test period
-        X_test = test_df[features]
-        X_scaled = monthly_predictor.scaler.transform(X_test)
-        
-        predictions = monthly_predictor.model.predict(X_scaled)
-        probabilities = monthly_predictor.model.predict_proba(X_scaled)
-        
-        test_df["Prediction"] = predictions
-        test_df["Confidence"] = [prob[pred] for pred, prob in zip(predictions, probabilities)]
-        
-        # Calculate allocation based on prediction
-        def get_alloc(row):
-            if row["Prediction"] == 1:
-                if row["Confidence"] >= 0.7:
-                    return 1.0
-                elif row["Confidence"] >= 0.6:
-                    return 0.7
-                else:
-                    return 0.5
-            else:
-                if row["Confidence"] >= 0.7:
-                    return 0.0
-                elif row["Confidence"] >= 0.6:
-                    return 0.2
-                else:
-                    return 0.4
-        
-        test_df["Allocation"] = test_df.apply(get_alloc, axis=1)
-        test_df["Monthly_Return"] = test_df["Close"].pct_change()
-        test_df["Strategy_Return"] = test_df["Allocation"].shift(1) * test_df["Monthly_Return"]
-        
-        test_df = test_df.dropna()
-        
-        # Metrics
-        strat_ret = (1 + test_df["Strategy_Return"]).prod() - 1
-        bh_ret = (1 + test_df["Monthly_Return"]).prod() - 1
-        
-        # Win rate
-        correct = 0
-        for i in range(len(test_df)):
-            pred = test_df["Prediction"].iloc[i]
-            actual = test_df["Target"].iloc[i]
-            if pred == actual:
-                correct += 1
-        win_rate = correct / len(test_df) if len(test_df) > 0 else 0
-        
-        # Sharpe
-        sharpe = test_df["Strategy_Return"].mean() / test_df["Strategy_Return"].std() * np.sqrt(12) if test_df["Strategy_Return"].std() > 0 else 0
-        
-        # Max Drawdown
-        cum = (1 + test_df["Strategy_Return"]).cumprod()
-        max_dd = ((cum - cum.expanding().max()) / cum.expanding().max()).min()
-        
-        return BacktestResponse(
-            period={
-                "start": test_df["Date"].iloc[0].strftime("%Y-%m"),
-                "end": test_df["Date"].iloc[-1].strftime("%Y-%m"),
-                "total_days": len(test_df)
-            },
-            returns={
-                "buy_hold_return_pct": round(bh_ret * 100, 2),
-                "strategy_return_pct": round(strat_ret * 100, 2),
-                "outperformance_pct": round((strat_ret - bh_ret) * 100, 2)
-            },
-            metrics={
-                "win_rate_pct": round(win_rate * 100, 1),
-                "sharpe_ratio": round(sharpe, 2),
-                "max_drawdown_pct": round(max_dd * 100, 2)
-            },
-            allocation_stats={
-                "avg_equity_allocation_pct": round(test_df["Allocation"].mean() * 100, 1),
-                "bullish_days": int((test_df["Prediction"] == 1).sum()),
-                "bearish_days": int((test_df["Prediction"] == 0).sum())
-            }
+        df = fetch_history(TICKER)
+        return backtest_cache.get_or_compute(
+            backtest_cache_key("backtest", df),
+            lambda: _run_endpoint_backtest(df).model_dump()
         )
     
     except HTTPException:
@@ -333,6 +329,116 @@ async def backtest():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _run_endpoint_backtest(df) -> BacktestResponse:
+    """Backtest behind GET /backtest (cached by the endpoint)."""
+    monthly = create_monthly_data_for_ml(df)
+    
+    # Create features
+    df_feat = monthly_predictor.create_features(monthly)
+    features = monthly_predictor.feature_columns
+    
+    df_clean = df_feat.dropna(subset=features + ["Target"])
+    
+    # Time-series split
+    split = int(len(df_clean) * 0.7)
+    test_df = df_clean.iloc[split:].copy()
+    
+    # Get predictions for test period
+    X_test = test_df[features]
+    X_scaled = monthly_predictor.scaler.transform(X_test)
+    
+    predictions = monthly_predictor.model.predict(X_scaled)
+    probabilities = monthly_predictor.model.predict_proba(X_scaled)
+    
+    test_df["Prediction"] = predictions
+    test_df["Confidence"] = [prob[pred] for pred, prob in zip(predictions, probabilities)]
+    
+    # Calculate allocation based on prediction
+    test_df["Allocation"] = BACKTEST_ENDPOINT_ALLOCATION_RULE.evaluate(
+        {"prediction": test_df["Prediction"], "confidence": test_df["Confidence"]}
+    )
+    test_df["Monthly_Return"] = test_df["Close"].pct_change()
+    test_df["Held_Allocation"] = test_df["Allocation"].shift(1)
+    
+    test_df = test_df.dropna()
+    
+    # Metrics (win rate: prediction vs target of the same month)
+    result = run_backtest_arrays(
+        test_df["Held_Allocation"].to_numpy(), test_df["Monthly_Return"].to_numpy(),
+        periods_per_year=12,
+        bullish=test_df["Prediction"].to_numpy() == 1, went_up=test_df["Target"].to_numpy() == 1
+    )
+    strat_ret = result.total_return
+    bh_ret = result.buy_hold_return
+    win_rate = result.win_rate
+    sharpe = result.sharpe_ratio
+    max_dd = result.max_drawdown
+    
+    return BacktestResponse(
+        period={
+            "start": test_df["Date"].iloc[0].strftime("%Y-%m"),
+            "end": test_df["Date"].iloc[-1].strftime("%Y-%m"),
+            "total_days": len(test_df)
+        },
+        returns={
+            "buy_hold_return_pct": round(bh_ret * 100, 2),
+            "strategy_return_pct": round(strat_ret * 100, 2),
+            "outperformance_pct": round((strat_ret - bh_ret) * 100, 2)
+        },
+        metrics={
+            "win_rate_pct": round(win_rate * 100, 1),
+            "sharpe_ratio": round(sharpe, 2),
+            "max_drawdown_pct": round(max_dd * 100, 2)
+        },
+        allocation_stats={
+            "avg_equity_allocation_pct": round(test_df["Allocation"].mean() * 100, 1),
+            "bullish_days": int((test_df["Prediction"] == 1).sum()),
+            "bearish_days": int((test_df["Prediction"] == 0).sum())
+        }
+    )
+
+
+@app.get("/backtest/monte-carlo", responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+async def backtest_monte_carlo(paths: int = 10000, block_size: int = 6, seed: int = 42):
+    """
+    Monte Carlo backtest (block bootstrap of monthly returns)
+
+    ช่วงความเชื่อมั่น (percentile) ของผลตอบแทน, Sharpe และ max drawdown
+    จากการสุ่มเส้นทางผลตอบแทนรายเดือน `paths` เส้นทาง
+    """
+    try:
+        if not monthly_predictor.is_trained():
+            raise HTTPException(status_code=400, detail="Model not trained. Call /train first.")
+        if not 100 <= paths <= 100000 or block_size < 1:
+            raise HTTPException(status_code=400, detail="paths must be 100-100000 and block_size >= 1")
+
+        df = fetch_history(TICKER)
+        computed = []
+
+        def simulate():
+            computed.append(True)
+            return monthly_predictor.backtest_monte_carlo(
+                create_monthly_data_for_ml(df), n_paths=paths, block_size=block_size, seed=seed
+            )
+
+        # Timed here, not inside the cached result, so a cache hit reports its own cost
+        start = time.perf_counter()
+        result = backtest_cache.get_or_compute(
+            backtest_cache_key("backtest/monte-carlo", df, paths=paths, block_size=block_size, seed=seed),
+            simulate
+        )
+        return {
+            **result,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "cached": not computed,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/indicators")
 async def get_current_indicators():
     """Get current technical indicator values for TDEX.BK."""
@@ -0,0 +1,273 @@
+"""
+Prometheus-format metrics for the API (served at GET /metrics).
+
+    with span("fetch"):
+        df = fetch_stock_data(...)
+
+span() records the stage latency into pea_stage_duration_seconds{stage}.
+When metrics are disabled (PEA_METRICS=0) it returns one shared no-op
+context manager, so an instrumented call costs well under a microsecond.
+
+No prometheus_client dependency: histograms and counters are kept in plain
+dicts and rendered in the text exposition format (version 0.0.4).
+"""
+
+import functools
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+from app.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cache hits (~0.1 ms) up to model training
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bytes, 64 KB .. 1 GB
+MEMORY_BUCKETS = tuple(float(2 ** power) for power in range(16, 31, 2))
+
+_enabled = settings.METRICS_ENABLED
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool) -> None:
+    global _enabled
+    _enabled = bool(value)
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        if not _enabled:
+            return
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in sorted(self.values.items()):
+            yield f"{self.name}{_labels_text(self.labels, values)} {_number(total)}"
+
+    def clear(self) -> None:
+        self.values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., +Inf, sum]
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not _enabled:
+            return
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels_text(self.labels, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels_text(self.labels, values)} {series[-1]!r}"
+            yield f"{self.name}_count{_labels_text(self.labels, values)} {cumulative}"
+
+    def clear(self) -> None:
+        self.series.clear()
+
+
+# ------------------------------------------------------------------ metrics
+STAGE_SECONDS = Histogram(
+    "pea_stage_duration_seconds",
+    "Latency of pipeline stages (fetch, monthly_resample, features, scaling, inference, rule_fallback, serialize)",
+    labels=("stage",)
+)
+REQUEST_SECONDS = Histogram(
+    "pea_request_duration_seconds", "HTTP request latency by route", labels=("method", "route", "status")
+)
+CACHE_EVENTS = Counter("pea_cache_events_total", "Cache lookups by cache and result (hit/miss)", labels=("cache", "result"))
+FETCH_FAILURES = Counter("pea_fetch_failures_total", "Upstream data fetch failures", labels=("function",))
+REQUEST_PEAK_BYTES = Histogram(
+    "pea_request_memory_peak_bytes", "Peak traced allocation per request (PEA_TRACE_MEMORY=1)",
+    labels=("route",), buckets=MEMORY_BUCKETS
+)
+REQUEST_NET_BYTES = Histogram(
+    "pea_request_memory_net_bytes", "Traced allocation still held when the request finished",
+    labels=("route",), buckets=MEMORY_BUCKETS
+)
+MEMORY_BUDGET_EXCEEDED = Counter(
+    "pea_memory_budget_exceeded_total", "Requests whose peak exceeded PEA_MEMORY_BUDGET_MB", labels=("route",)
+)
+
+REGISTRY = [
+    STAGE_SECONDS, REQUEST_SECONDS, CACHE_EVENTS, FETCH_FAILURES,
+    REQUEST_PEAK_BYTES, REQUEST_NET_BYTES, MEMORY_BUDGET_EXCEEDED,
+]
+
+
+# -------------------------------------------------------------------- spans
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.stage)
+        return False
+
+
+def span(stage: str):
+    """Time a block into pea_stage_duration_seconds{stage} (no-op when disabled)."""
+    return _Span(stage) if _enabled else _NOOP
+
+
+def timed(stage: str):
+    """Decorator form of span() for functions that are a whole stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: request latency into pea_request_duration_seconds,
+    labelled by route template (/predict, not the raw path) and status.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope["method"], getattr(route, "path", "unmatched"), status[0]
+            )
+
+
+class MemoryMetricsMiddleware:
+    """
+    ASGI middleware (PEA_TRACE_MEMORY=1): tracemalloc peak and net
+    allocation per request by route. tracemalloc is process-wide, so
+    overlapping requests share one measurement window; the numbers are
+    exact when requests run one at a time. A peak above
+    PEA_MEMORY_BUDGET_MB is logged and counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACE_MEMORY:
+            await self.app(scope, receive, send)
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_PEAK_BYTES.observe(peak - base, route)
+            REQUEST_NET_BYTES.observe(max(current - base, 0), route)
+            budget = settings.MEMORY_BUDGET_MB
+            if budget and peak - base > budget * 1024 * 1024:
+                MEMORY_BUDGET_EXCEEDED.inc(route)
+                print(f"Warning: {scope['method']} {route} peak {(peak - base) / 1048576:.1f} MB "
+                      f"exceeds memory budget {budget:.0f} MB")
+
+
+def cache_event(cache: str, hit: bool) -> None:
+    CACHE_EVENTS.inc(cache, "hit" if hit else "miss")
+
+
+def render() -> str:
+    """All metrics in Prometheus text format."""
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        for metric in REGISTRY:
+            metric.clear()
@@ -3,18 +3,54 @@ Monthly ML Model for Provident Fund
 ใช้ XGBoost + LightGBM + Random Forest ensemble
 """
 
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, Tuple, List, Optional
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, GradientBoostingRegressor, VotingClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report
 from xgboost import XGBClassifier
 import joblib
+import time
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from app.backtest_engine import BacktestResult, run_backtest_arrays, monte_carlo_backtest
+from app.kernels import compound
+from app.metrics import span, timed
+from app.call_audit import audited
+from app.signal_rules import SignalRule, Ladder, Step, when, signal
+
+
+# Trend strength 0-100 (price above SMA3/6/12, positive 1m/3m return)
+TREND_SCORE_RULE = SignalRule(
+    name="trend_score",
+    ladders=(
+        signal("above_sma3", when("Price_SMA3_Ratio", ">", 1), 20),
+        signal("above_sma6", when("Price_SMA6_Ratio", ">", 1), 25),
+        signal("above_sma12", when("Price_SMA12_Ratio", ">", 1), 25),
+        signal("return_1m", when("Return_1m", ">", 0), 15),
+        signal("return_3m", when("Return_3m", ">", 0), 15),
+    ),
+)
+
+# Equity allocation used by the backtests: (prediction, confidence) -> 0-1
+BACKTEST_ALLOCATION_RULE = SignalRule(
+    name="backtest_allocation",
+    ladders=(
+        Ladder("allocation", (
+            Step((when("prediction", "==", 1), when("confidence", ">=", 0.7)), 1.0),
+            Step((when("prediction", "==", 1), when("confidence", ">=", 0.6)), 0.7),
+            Step((when("prediction", "==", 1),), 0.5),
+            Step((when("confidence", ">=", 0.7),), 0.0),
+            Step((when("confidence", ">=", 0.6),), 0.3),
+        ), default=0.5),
+    ),
+)
+
 
 class MonthlyMLPredictor:
     """ML-based monthly predictor using ensemble of models."""
@@ -22,7 +58,9 @@ class MonthlyMLPredictor:
     def __init__(self, model_path: str = "models/monthly_ml.joblib"):
         self.model_path = Path(model_path)
         self.scaler_path = Path("models/monthly_scaler.joblib")
+        self.fast_model_path = self.model_path.with_name(self.model_path.stem + "_fast.joblib")
         self.model = None
+        self.fast_model = None
         self.scaler = None
         self.feature_columns = []
         self.last_trained = None
@@ -37,6 +75,11 @@ class MonthlyMLPredictor:
             self.last_trained = saved.get("last_trained")
         if self.scaler_path.exists():
             self.scaler = joblib.load(self.scaler_path)
+        if self.fast_model_path.exists():
+            saved = joblib.load(self.fast_model_path)
+            # Only use the distilled model if it was fitted against the current ensemble
+            if saved.get("teacher_trained") == self.last_trained:
+                self.fast_model = saved.get("model")
     
     def _save_model(self):
         """Save model to disk."""
@@ -51,6 +94,8 @@ class MonthlyMLPredictor:
         if self.scaler:
             joblib.dump(self.scaler, self.scaler_path)
     
+    @timed("features")
+    @audited("create_features")
     def create_features(self, monthly: pd.DataFrame) -> pd.DataFrame:
         """Create ML features from monthly data."""
         df = monthly.copy()
@@ -217,8 +262,9 @@ class MonthlyMLPredictor:
         importance = dict(zip(self.feature_columns, xgb_model.feature_importances_))
         top_features = sorted(importance.items(), key=lambda x: x[1], reverse=True)[:10]
         
-        # Save model
+        # Save model (any distilled model now belongs to the previous ensemble)
         self._save_model()
+        self.fast_model = None
         
         print("\n" + "="*50)
         print("Training Complete!")
@@ -236,13 +282,103 @@ class MonthlyMLPredictor:
             "top_features": top_features
         }
     
-    def predict(self, monthly: pd.DataFrame) -> Tuple[int, float, Dict]:
+    def distill(
+        self,
+        monthly: pd.DataFrame,
+        n_estimators: int = 50,
+        max_depth: int = 3,
+        latency_repeats: int = 200
+    ) -> Dict[str, Any]:
+        """
+        Distill the voting ensemble into one compact gradient-boosted model.
+        
+        The student is a shallow GradientBoostingRegressor fitted on the
+        ensemble's soft-vote "up" probability, so it can be served in place of
+        the three models when latency matters more than the last bit of accuracy.
+        Agreement is measured out of sample first (student fitted on the first
+        70% of months, scored on the last 30%), then the served student is
+        refitted on all months. Returns a report with agreement rate and
+        latency ratio.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        df = self.create_features(monthly)
+        df_clean = df.dropna(subset=self.feature_columns)
+        
+        if len(df_clean) < 30:
+            raise ValueError("Not enough data for distillation")
+        
+        X_scaled = self.scaler.transform(df_clean[self.feature_columns])
+        teacher_up = self.model.predict_proba(X_scaled)[:, 1]
+        
+        def make_student():
+            return GradientBoostingRegressor(
+                n_estimators=n_estimators,
+                max_depth=max_depth,
+                learning_rate=0.1,
+                random_state=42
+            )
+        
+        # Held-out check: fit on the first 70%, score on the last 30%
+        split_idx = int(len(X_scaled) * 0.7)
+        holdout = make_student()
+        holdout.fit(X_scaled[:split_idx], teacher_up[:split_idx])
+        holdout_up = np.clip(holdout.predict(X_scaled[split_idx:]), 0.0, 1.0)
+        test_agree = (holdout_up > 0.5) == (teacher_up[split_idx:] > 0.5)
+        
+        # Served student: refit on every month (in-sample agreement)
+        student = make_student()
+        student.fit(X_scaled, teacher_up)
+        student_up = np.clip(student.predict(X_scaled), 0.0, 1.0)
+        agree = (student_up > 0.5) == (teacher_up > 0.5)
+        
+        # Single-row latency, which is what /predict pays per request
+        row = X_scaled[-1:]
+        start = time.perf_counter()
+        for _ in range(latency_repeats):
+            self.model.predict_proba(row)
+        ensemble_ms = (time.perf_counter() - start) / latency_repeats * 1000
+        start = time.perf_counter()
+        for _ in range(latency_repeats):
+            student.predict(row)
+        fast_ms = (time.perf_counter() - start) / latency_repeats * 1000
+        
+        self.fast_model = student
+        self.fast_model_path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({
+            "model": student,
+            "features": self.feature_columns,
+            "teacher_trained": self.last_trained
+        }, self.fast_model_path)
+        
+        return {
+            "agreement_rate": round(float(agree.mean()), 4),
+            "test_agreement_rate": round(float(test_agree.mean()), 4),
+            "mean_abs_proba_error": round(float(np.abs(student_up - teacher_up).mean()), 4),
+            "test_mean_abs_proba_error": round(float(np.abs(holdout_up - teacher_up[split_idx:]).mean()), 4),
+            "ensemble_latency_ms": round(ensemble_ms, 3),
+            "fast_latency_ms": round(fast_ms, 3),
+            "latency_ratio": round(ensemble_ms / fast_ms, 1) if fast_ms > 0 else None,
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "samples": len(df_clean)
+        }
+    
+    def has_fast_model(self) -> bool:
+        return self.fast_model is not None
+    
+    @audited("predict")
+    def predict(self, monthly: pd.DataFrame, fast: bool = False) -> Tuple[int, float, Dict]:
         """
         Predict next month direction.
+        Set fast=True to use the distilled single model instead of the ensemble.
         Returns: (prediction, confidence, details)
         """
         if self.model is None:
             raise ValueError("Model not trained")
+        if fast and self.fast_model is None:
+            raise ValueError("Fast model not available. Run distill() first.")
         
         df = self.create_features(monthly)
         df_clean = df.dropna(subset=self.feature_columns)
@@ -254,25 +390,44 @@ class MonthlyMLPredictor:
         latest = df_clean[self.feature_columns].iloc[-1:].copy()
         
         # Scale
-        latest_scaled = self.scaler.transform(latest)
+        with span("scaling"):
+            latest_scaled = self.scaler.transform(latest)
+        
+        if fast:
+            with span("inference"):
+                up = float(np.clip(self.fast_model.predict(latest_scaled)[0], 0.0, 1.0))
+            prediction = 1 if up > 0.5 else 0
+            confidence = up if prediction == 1 else 1 - up
+            return prediction, confidence, {
+                "model": "fast",
+                "individual_models": {
+                    "fast": {"prediction": prediction, "confidence": confidence}
+                },
+                "ensemble_proba": {
+                    "down": 1 - up,
+                    "up": up
+                }
+            }
         
         # Predict
-        prediction = self.model.predict(latest_scaled)[0]
-        proba = self.model.predict_proba(latest_scaled)[0]
+        with span("inference"):
+            prediction = self.model.predict(latest_scaled)[0]
+            proba = self.model.predict_proba(latest_scaled)[0]
+            
+            # Get individual model predictions
+            individual_preds = {}
+            for name, model in self.model.named_estimators_.items():
+                pred = model.predict(latest_scaled)[0]
+                prob = model.predict_proba(latest_scaled)[0]
+                individual_preds[name] = {
+                    "prediction": int(pred),
+                    "confidence": float(prob[pred])
+                }
         
         confidence = float(proba[prediction])
         
-        # Get individual model predictions
-        individual_preds = {}
-        for name, model in self.model.named_estimators_.items():
-            pred = model.predict(latest_scaled)[0]
-            prob = model.predict_proba(latest_scaled)[0]
-            individual_preds[name] = {
-                "prediction": int(pred),
-                "confidence": float(prob[pred])
-            }
-        
         return int(prediction), confidence, {
+            "model": "ensemble",
             "individual_models": individual_preds,
             "ensemble_proba": {
                 "down": float(proba[0]),
@@ -283,11 +438,28 @@ class MonthlyMLPredictor:
     def is_trained(self) -> bool:
         return self.model is not None
     
+    def fingerprint(self) -> str:
+        """Identifies the trained model; changes on every train (backtest store, pipeline stage cache)."""
+        key = json.dumps({
+            "model_path": str(self.model_path),
+            "last_trained": self.last_trained,
+            "features": list(self.feature_columns or []),
+        }, sort_keys=True)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    
     def backtest(self, monthly: pd.DataFrame, initial_capital: float = 100000) -> Dict[str, Any]:
         """
         Backtest the ML model on historical data.
-        Uses walk-forward approach: train on past data, predict next month.
+        Scores the whole out-of-sample window (last 30%) in one batched
+        transform + predict_proba, then compounds returns with array operations.
         """
+        df_clean, start_idx, predictions, confidences = self._backtest_predictions(monthly)
+        return self._backtest_from_predictions(
+            df_clean, start_idx, predictions, confidences, initial_capital
+        )
+    
+    def _backtest_predictions(self, monthly: pd.DataFrame) -> Tuple[pd.DataFrame, int, np.ndarray, np.ndarray]:
+        """Batched predictions for the out-of-sample window (rows start_idx..len-2)."""
         if self.model is None:
             raise ValueError("Model not trained")
         
@@ -297,95 +469,141 @@ class MonthlyMLPredictor:
         if len(df_clean) < 30:
             raise ValueError("Not enough data for backtest")
         
-        # Walk-forward backtest
-        results = []
-        capital = initial_capital
-        position = 0  # 0 = bond, 1 = equity
-        
-        # Start from 70% of data (after training period)
+        # Start from 70% of data (after training period); the last month has no next month
         start_idx = int(len(df_clean) * 0.7)
+        predictions, confidences = self._predict_window(df_clean.iloc[start_idx:-1])
+        return df_clean, start_idx, predictions, confidences
+    
+    def _predict_window(self, window: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Ensemble prediction and confidence for every row of window (one batched call)."""
+        if len(window) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        with span("scaling"):
+            X_scaled = self.scaler.transform(window[self.feature_columns])
+        with span("inference"):
+            proba = self.model.predict_proba(X_scaled)
+        predictions = self.model.classes_[proba.argmax(axis=1)]
+        confidences = proba[np.arange(len(proba)), proba.argmax(axis=1)]
+        return predictions, confidences
+    
+    def backtest_monte_carlo(
+        self,
+        monthly: pd.DataFrame,
+        n_paths: int = 10000,
+        block_size: int = 6,
+        seed: Optional[int] = 42
+    ) -> Dict[str, Any]:
+        """
+        Block-bootstrap Monte Carlo of the backtest.
+        Resamples the out-of-sample (allocation, monthly return) pairs into
+        n_paths paths and reports percentile bands next to the historical path.
+        """
+        df_clean, start_idx, predictions, confidences = self._backtest_predictions(monthly)
         
-        for i in range(start_idx, len(df_clean) - 1):
-            current = df_clean.iloc[i]
-            next_row = df_clean.iloc[i + 1]
-            
-            # Get features and predict
-            X = df_clean[self.feature_columns].iloc[i:i+1]
-            X_scaled = self.scaler.transform(X)
-            
-            prediction = self.model.predict(X_scaled)[0]
-            proba = self.model.predict_proba(X_scaled)[0]
-            confidence = float(proba[prediction])
-            
-            # Calculate allocation based on prediction
-            if prediction == 1:  # Bullish
-                if confidence >= 0.7:
-                    allocation = 1.0
-                elif confidence >= 0.6:
-                    allocation = 0.7
-                else:
-                    allocation = 0.5
-            else:  # Bearish
-                if confidence >= 0.7:
-                    allocation = 0.0
-                elif confidence >= 0.6:
-                    allocation = 0.3
-                else:
-                    allocation = 0.5
-            
-            # Calculate actual return
-            actual_return = (next_row["Close"] - current["Close"]) / current["Close"]
-            actual_direction = 1 if actual_return > 0 else 0
-            
-            # Portfolio return (equity * allocation + bond * (1-allocation))
-            bond_return = 0.003  # ~3.6% annual bond return
-            portfolio_return = actual_return * allocation + bond_return * (1 - allocation)
-            
-            capital *= (1 + portfolio_return)
-            
-            results.append({
-                "date": current.name if hasattr(current, 'name') else i,
-                "prediction": int(prediction),
-                "actual": actual_direction,
-                "confidence": confidence,
-                "allocation": allocation,
-                "actual_return": actual_return,
-                "portfolio_return": portfolio_return,
-                "capital": capital,
-                "correct": prediction == actual_direction
-            })
-        
-        # Calculate metrics
-        results_df = pd.DataFrame(results)
-        
-        total_trades = len(results_df)
-        correct_trades = results_df["correct"].sum()
-        win_rate = correct_trades / total_trades if total_trades > 0 else 0
-        
-        # Returns
-        total_return = (capital - initial_capital) / initial_capital * 100
-        buy_hold_return = (df_clean["Close"].iloc[-1] - df_clean["Close"].iloc[start_idx]) / df_clean["Close"].iloc[start_idx] * 100
+        close = df_clean["Close"].to_numpy(dtype=float)
+        current_close = close[start_idx:-1]
+        actual_return = (close[start_idx + 1:] - current_close) / current_close
+        allocation = self._allocation_from_predictions(np.asarray(predictions).astype(int), confidences)
         
-        # Sharpe ratio (annualized)
-        monthly_returns = results_df["portfolio_return"]
-        if len(monthly_returns) > 1 and monthly_returns.std() > 0:
-            sharpe = (monthly_returns.mean() * 12) / (monthly_returns.std() * np.sqrt(12))
-        else:
-            sharpe = 0
+        historical = run_backtest_arrays(allocation, actual_return, bond_return=0.003, periods_per_year=12)
         
-        # Max drawdown
-        cumulative = (1 + results_df["portfolio_return"]).cumprod()
-        peak = cumulative.expanding().max()
-        drawdown = (cumulative - peak) / peak
-        max_drawdown = drawdown.min() * 100
+        result = monte_carlo_backtest(
+            allocation, actual_return, bond_return=0.003, periods_per_year=12,
+            n_paths=n_paths, block_size=block_size, seed=seed
+        )
+        result["historical"] = {
+            "total_return_pct": round(historical.total_return * 100, 2),
+            "buy_hold_return_pct": round(historical.buy_hold_return * 100, 2),
+            "sharpe_ratio": round(historical.sharpe_ratio, 2),
+            "max_drawdown_pct": round(historical.max_drawdown * 100, 2),
+        }
+        return result
+    
+    @staticmethod
+    def _allocation_from_predictions(predictions: np.ndarray, confidences: np.ndarray) -> np.ndarray:
+        """Equity allocation ladder used by the backtests (vectorized)."""
+        return BACKTEST_ALLOCATION_RULE.evaluate({"prediction": predictions, "confidence": confidences})
+    
+    def _backtest_from_predictions(
+        self,
+        df_clean: pd.DataFrame,
+        start_idx: int,
+        predictions: np.ndarray,
+        confidences: np.ndarray,
+        initial_capital: float
+    ) -> Dict[str, Any]:
+        """
+        Turn per-month predictions for rows start_idx..len-2 of df_clean into
+        backtest metrics and chart history.
+        """
+        result, results_df = self._backtest_frame(df_clean, start_idx, predictions, confidences, initial_capital)
         
-        # Volatility (annualized)
-        volatility = monthly_returns.std() * np.sqrt(12) * 100
+        # Buy & hold from the first to the last close of the window
+        buy_hold_return = (df_clean["Close"].iloc[-1] - df_clean["Close"].iloc[start_idx]) / df_clean["Close"].iloc[start_idx] * 100
         
         # Get actual dates
         start_date = df_clean["Date"].iloc[start_idx] if "Date" in df_clean.columns else df_clean.index[start_idx]
         end_date = df_clean["Date"].iloc[-1] if "Date" in df_clean.columns else df_clean.index[-1]
         
+        return self._backtest_summary(
+            result, buy_hold_return, start_date, end_date, initial_capital,
+            self._format_history(results_df, df_clean, start_idx)
+        )
+    
+    def _backtest_frame(
+        self,
+        df_clean: pd.DataFrame,
+        start_idx: int,
+        predictions: np.ndarray,
+        confidences: np.ndarray,
+        initial_capital: float
+    ) -> Tuple[BacktestResult, pd.DataFrame]:
+        """Engine result and per-month frame for rows start_idx..len-2 of df_clean."""
+        close = df_clean["Close"].to_numpy(dtype=float)
+        current_close = close[start_idx:-1]
+        actual_return = (close[start_idx + 1:] - current_close) / current_close
+        actual_direction = (actual_return > 0).astype(int)
+        
+        predictions = np.asarray(predictions).astype(int)
+        confidences = np.asarray(confidences, dtype=float)
+        allocation = self._allocation_from_predictions(predictions, confidences)
+        
+        # Portfolio return (equity * allocation + bond * (1-allocation)), ~3.6% annual bond return
+        result = run_backtest_arrays(
+            allocation, actual_return, bond_return=0.003, periods_per_year=12,
+            initial_capital=initial_capital,
+            bullish=predictions == 1, went_up=actual_direction == 1
+        )
+        
+        results_df = pd.DataFrame({
+            "date": df_clean.index[start_idx:-1],
+            "prediction": predictions,
+            "actual": actual_direction,
+            "confidence": confidences,
+            "allocation": allocation,
+            "actual_return": actual_return,
+            "portfolio_return": result.portfolio_return,
+            "capital": result.equity,
+            "correct": predictions == actual_direction
+        })
+        return result, results_df
+    
+    @staticmethod
+    def _backtest_summary(
+        result,
+        buy_hold_return: float,
+        start_date,
+        end_date,
+        initial_capital: float,
+        history: List[Dict]
+    ) -> Dict[str, Any]:
+        """
+        Backtest response from a BacktestResult or a streaming EquityMetrics
+        (both expose periods, wins, final_capital and the risk metrics).
+        """
+        capital = result.final_capital
+        total_return = (capital - initial_capital) / initial_capital * 100
+        
         start_str = start_date.strftime("%Y-%m") if hasattr(start_date, 'strftime') else str(start_date)[:7]
         end_str = end_date.strftime("%Y-%m") if hasattr(end_date, 'strftime') else str(end_date)[:7]
         
@@ -393,7 +611,7 @@ class MonthlyMLPredictor:
             "period": {
                 "start": start_str,
                 "end": end_str,
-                "months": total_trades
+                "months": result.periods
             },
             "returns": {
                 "strategy_return_pct": round(total_return, 2),
@@ -401,52 +619,72 @@ class MonthlyMLPredictor:
                 "excess_return_pct": round(total_return - buy_hold_return, 2)
             },
             "metrics": {
-                "win_rate_pct": round(win_rate * 100, 1),
-                "total_trades": total_trades,
-                "correct_trades": int(correct_trades),
-                "sharpe_ratio": round(sharpe, 2),
-                "max_drawdown_pct": round(max_drawdown, 2),
-                "volatility_pct": round(volatility, 2)
+                "win_rate_pct": round(result.win_rate * 100, 1),
+                "total_trades": result.periods,
+                "correct_trades": int(result.wins),
+                "sharpe_ratio": round(result.sharpe_ratio, 2),
+                "max_drawdown_pct": round(result.max_drawdown * 100, 2),
+                "volatility_pct": round(result.volatility * 100, 2)
             },
             "final_capital": round(capital, 2),
-            "history": self._format_history(results_df, df_clean)
+            "history": history
         }
     
-    def _format_history(self, results_df: pd.DataFrame, df_clean: pd.DataFrame) -> List[Dict]:
-        """Format backtest history for chart display."""
-        history = []
-        cumulative_strategy = 100
-        cumulative_buyhold = 100
-        cumulative_bond = 100
+    def _format_history(
+        self,
+        results_df: pd.DataFrame,
+        df_clean: pd.DataFrame,
+        start_idx: Optional[int] = None,
+        initial_values: Tuple[float, float, float] = (100, 100, 100)
+    ) -> List[Dict]:
+        """
+        Format backtest history for chart display.
+        initial_values: (strategy, buy & hold, bond) chart values before the
+        first row, for continuing a stored history.
+        """
+        n = len(results_df)
+        if start_idx is None:
+            start_idx = int(len(df_clean) * 0.7)
+        
+        # Get actual dates from df_clean
+        if "Date" in df_clean.columns:
+            dates = pd.to_datetime(df_clean["Date"].iloc[start_idx:start_idx + n])
+            date_strs = list(dates.dt.strftime("%Y-%m"))
+        else:
+            date_strs = []
+        date_strs += [f"M{k + 1}" for k in range(len(date_strs), n)]
         
-        start_idx = int(len(df_clean) * 0.7)
+        # Cumulative values starting at 100 (bond ~3.6% annual)
+        strategy_start, buyhold_start, bond_start = initial_values
+        strategy_values = np.round(compound(results_df["portfolio_return"].to_numpy(), strategy_start), 2)
+        buyhold_values = np.round(compound(results_df["actual_return"].to_numpy(), buyhold_start), 2)
+        bond_values = np.round(compound(np.full(n, 0.003), bond_start), 2)
         
-        for i, row in results_df.iterrows():
-            # Get actual date from df_clean
-            actual_idx = start_idx + len(history)
-            if actual_idx < len(df_clean) and "Date" in df_clean.columns:
-                date = df_clean["Date"].iloc[actual_idx]
-                date_str = date.strftime("%Y-%m") if hasattr(date, 'strftime') else str(date)[:7]
-            else:
-                date_str = f"M{len(history)+1}"
-            
-            # Calculate cumulative returns
-            cumulative_strategy *= (1 + row["portfolio_return"])
-            cumulative_buyhold *= (1 + row["actual_return"])
-            cumulative_bond *= 1.003  # ~3.6% annual
-            
-            history.append({
+        allocations = (results_df["allocation"].to_numpy() * 100).astype(int)
+        up, down = "ขึ้น", "ลง"
+        
+        return [
+            {
                 "date": date_str,
-                "allocation": int(row["allocation"] * 100),
-                "prediction": "ขึ้น" if row["prediction"] == 1 else "ลง",
-                "actual": "ขึ้น" if row["actual"] == 1 else "ลง",
-                "correct": bool(row["correct"]),
-                "strategy_value": round(cumulative_strategy, 2),
-                "buyhold_value": round(cumulative_buyhold, 2),
-                "bond_value": round(cumulative_bond, 2),
-            })
-        
-        return history
+                "allocation": int(alloc),
+                "prediction": up if pred == 1 else down,
+                "actual": up if actual == 1 else down,
+                "correct": bool(correct),
+                "strategy_value": strategy_value,
+                "buyhold_value": buyhold_value,
+                "bond_value": bond_value,
+            }
+            for date_str, alloc, pred, actual, correct, strategy_value, buyhold_value, bond_value in zip(
+                date_strs,
+                allocations,
+                results_df["prediction"].to_numpy(),
+                results_df["actual"].to_numpy(),
+                results_df["correct"].to_numpy(),
+                strategy_values.tolist(),
+                buyhold_values.tolist(),
+                bond_values.tolist(),
+            )
+        ]
     
     def get_top_features(self, n: int = 5) -> List[Tuple[str, float]]:
         """Get top N most important features from the model."""
@@ -508,12 +746,7 @@ class MonthlyMLPredictor:
         return_6m = latest.get("Return_6m", 0) * 100
         
         # Trend strength (0-100)
-        trend_score = 0
-        if price_vs_sma3 > 1: trend_score += 20
-        if price_vs_sma6 > 1: trend_score += 25
-        if price_vs_sma12 > 1: trend_score += 25
-        if return_1m > 0: trend_score += 15
-        if return_3m > 0: trend_score += 15
+        trend_score = int(TREND_SCORE_RULE.evaluate_latest(df_clean))
         
         # Determine trend direction
         if trend_score >= 70:
@@ -572,6 +805,8 @@ class MonthlyMLPredictor:
         }
 
 
+@timed("monthly_resample")
+@audited("create_monthly_data_for_ml")
 def create_monthly_data_for_ml(df: pd.DataFrame) -> pd.DataFrame:
     """Convert daily data to monthly for ML."""
     df = df.copy()
@@ -7,7 +7,37 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, Tuple
 
+from app.backtest_engine import run_backtest_arrays
+from app.signal_rules import SignalRule, Ladder, Step, when, signal
+from app.call_audit import audited
+from app.metrics import timed
 
+
+# Weighted signals: bullish adds the weight, bearish subtracts half of it.
+# Score range: roughly -0.5 to 1.0, mapped to 0-100% and rounded to nearest 10%.
+MONTHLY_ALLOCATION_RULE = SignalRule(
+    name="monthly_allocation",
+    ladders=(
+        signal("trend", when("Close", ">", "SMA_6"), 0.25, -0.25 * 0.5),
+        signal("momentum", when("Return_3m", ">", 0), 0.25, -0.25 * 0.5),
+        Ladder("rsi", (
+            Step((when("RSI", "<", 35),), 0.25),
+            Step((when("RSI", ">", 65),), -0.25 * 0.5),
+        )),
+        signal("volatility", when("Volatility", "<", "Volatility_Median_12", scale=1.2), 0.15, -0.15 * 0.5),
+        signal("drawdown", when("Drawdown", ">", -15), 0.10, -0.10 * 0.5),
+    ),
+    offset=0.3,
+    divide_by=1.3,
+    scale=100,
+    truncate=True,
+    clip=(0, 100),
+    round_to=10,
+)
+
+
+@timed("monthly_resample")
+@audited("create_monthly_data")
 def create_monthly_data(df: pd.DataFrame) -> pd.DataFrame:
     """Convert daily data to monthly with indicators."""
     df = df.copy()
@@ -62,7 +92,7 @@ def get_monthly_allocation(monthly: pd.DataFrame) -> Tuple[float, Dict[str, Any]
     signals = {}
     
     # 1. Trend Signal (Price vs SMA6)
-    above_sma6 = latest["Close"] > latest["SMA_6"]
+    above_sma6 = bool(latest["Close"] > latest["SMA_6"])
     signals["trend"] = {
         "name": "Trend (SMA6)",
         "value": "ขาขึ้น" if above_sma6 else "ขาลง",
@@ -71,7 +101,7 @@ def get_monthly_allocation(monthly: pd.DataFrame) -> Tuple[float, Dict[str, Any]
     }
     
     # 2. Momentum Signal (3-month return)
-    mom_positive = latest["Return_3m"] > 0
+    mom_positive = bool(latest["Return_3m"] > 0)
     signals["momentum"] = {
         "name": "Momentum 3M",
         "value": f"{latest['Return_3m']:.1f}%",
@@ -101,7 +131,7 @@ def get_monthly_allocation(monthly: pd.DataFrame) -> Tuple[float, Dict[str, Any]
     # 4. Volatility Signal
     vol = latest["Volatility"]
     vol_median = monthly["Volatility"].rolling(12).median().iloc[-1]
-    low_vol = vol < vol_median * 1.2
+    low_vol = bool(vol < vol_median * 1.2)
     signals["volatility"] = {
         "name": "Volatility",
         "value": f"{vol:.1f}% ({'ต่ำ' if low_vol else 'สูง'})",
@@ -111,7 +141,7 @@ def get_monthly_allocation(monthly: pd.DataFrame) -> Tuple[float, Dict[str, Any]
     
     # 5. Drawdown Signal
     dd = latest["Drawdown"]
-    safe_dd = dd > -15
+    safe_dd = bool(dd > -15)
     signals["drawdown"] = {
         "name": "Drawdown",
         "value": f"{dd:.1f}%",
@@ -119,25 +149,36 @@ def get_monthly_allocation(monthly: pd.DataFrame) -> Tuple[float, Dict[str, Any]
         "weight": 0.10
     }
     
-    # Calculate weighted score
-    score = 0
-    for sig in signals.values():
-        if sig["bullish"] is True:
-            score += sig["weight"]
-        elif sig["bullish"] is False:
-            score -= sig["weight"] * 0.5  # Bearish signals have less weight
-    
-    # Convert score to allocation
-    # Score range: roughly -0.5 to 1.0
-    # Map to allocation: 0% to 100%
-    allocation = max(0, min(100, int((score + 0.3) / 1.3 * 100)))
-    
-    # Round to nearest 10%
-    allocation = round(allocation / 10) * 10
+    # Weighted score -> allocation (see MONTHLY_ALLOCATION_RULE)
+    inputs = {name: values.iloc[-1] for name, values in monthly_rule_inputs(monthly).items()}
+    allocation = int(MONTHLY_ALLOCATION_RULE.evaluate_latest(inputs))
     
     return allocation, signals
 
 
+def monthly_rule_inputs(monthly: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Columns read by MONTHLY_ALLOCATION_RULE."""
+    return {
+        "Close": monthly["Close"],
+        "SMA_6": monthly["SMA_6"],
+        "Return_3m": monthly["Return_3m"],
+        "RSI": monthly["RSI"],
+        "Volatility": monthly["Volatility"],
+        "Volatility_Median_12": monthly["Volatility"].rolling(12).median(),
+        "Drawdown": monthly["Drawdown"],
+    }
+
+
+def calculate_monthly_allocations(monthly: pd.DataFrame) -> pd.Series:
+    """
+    Columnar version of get_monthly_allocation.
+    Evaluates the five weighted signals for every month in one pass and
+    returns the allocation (0-100) each month would have recommended.
+    """
+    allocation = MONTHLY_ALLOCATION_RULE.evaluate(monthly_rule_inputs(monthly))
+    return pd.Series(allocation.astype(int), index=monthly.index, name="Allocation")
+
+
 def get_monthly_prediction(monthly: pd.DataFrame) -> Dict[str, Any]:
     """Get full monthly prediction with all details."""
     allocation, signals = get_monthly_allocation(monthly)
@@ -202,19 +243,13 @@ def backtest_monthly_strategy(monthly: pd.DataFrame) -> Dict[str, Any]:
     """Backtest the monthly strategy."""
     df = monthly.copy()
     
-    # Calculate allocation for each month
-    allocations = []
-    for i in range(12, len(df)):  # Need 12 months history
-        subset = df.iloc[:i+1]
-        alloc, _ = get_monthly_allocation(subset)
-        allocations.append(alloc / 100)
-    
-    # Pad beginning with 0.5
-    allocations = [0.5] * 12 + allocations
-    df["Allocation"] = allocations[:len(df)]
+    # Calculate allocation for each month (need 12 months history, pad with 0.5)
+    allocations = calculate_monthly_allocations(df) / 100
+    allocations.iloc[:12] = 0.5
+    df["Allocation"] = allocations
     
     df["Monthly_Return"] = df["Close"].pct_change()
-    df["Strategy_Return"] = df["Allocation"].shift(1) * df["Monthly_Return"]
+    df["Held_Allocation"] = df["Allocation"].shift(1)
     
     df = df.dropna()
     
@@ -222,25 +257,13 @@ def backtest_monthly_strategy(monthly: pd.DataFrame) -> Dict[str, Any]:
     split = int(len(df) * 0.5)
     test = df.iloc[split:]
     
-    # Metrics
-    strat_ret = (1 + test["Strategy_Return"]).prod() - 1
-    bh_ret = (1 + test["Monthly_Return"]).prod() - 1
-    
-    # Win rate
-    correct = 0
-    for i in range(1, len(test)):
-        alloc = test["Allocation"].iloc[i-1]
-        ret = test["Monthly_Return"].iloc[i]
-        if (alloc > 0.5 and ret > 0) or (alloc <= 0.5 and ret <= 0):
-            correct += 1
-    win_rate = correct / (len(test) - 1) if len(test) > 1 else 0
-    
-    # Sharpe
-    sharpe = test["Strategy_Return"].mean() / test["Strategy_Return"].std() * np.sqrt(12) if test["Strategy_Return"].std() > 0 else 0
-    
-    # Max Drawdown
-    cum = (1 + test["Strategy_Return"]).cumprod()
-    max_dd = ((cum - cum.expanding().max()) / cum.expanding().max()).min()
+    # Win rate: previous month's allocation vs this month's return
+    allocation = test["Allocation"].to_numpy()
+    returns = test["Monthly_Return"].to_numpy()
+    result = run_backtest_arrays(
+        test["Held_Allocation"].to_numpy(), returns, periods_per_year=12,
+        bullish=allocation[:-1] > 0.5, went_up=returns[1:] > 0
+    )
     
     return {
         "period": {
@@ -249,13 +272,13 @@ def backtest_monthly_strategy(monthly: pd.DataFrame) -> Dict[str, Any]:
             "total_months": len(test)
         },
         "returns": {
-            "strategy_return_pct": round(strat_ret * 100, 2),
-            "buy_hold_return_pct": round(bh_ret * 100, 2),
-            "outperformance_pct": round((strat_ret - bh_ret) * 100, 2)
+            "strategy_return_pct": round(result.total_return * 100, 2),
+            "buy_hold_return_pct": round(result.buy_hold_return * 100, 2),
+            "outperformance_pct": round(result.excess_return * 100, 2)
         },
         "metrics": {
-            "win_rate_pct": round(win_rate * 100, 1),
-            "sharpe_ratio": round(sharpe, 2),
-            "max_drawdown_pct": round(max_dd * 100, 2)
+            "win_rate_pct": round(result.win_rate * 100, 1),
+            "sharpe_ratio": round(result.sharpe_ratio, 2),
+            "max_drawdown_pct": round(result.max_drawdown * 100, 2)
         }
     }
@@ -6,13 +6,105 @@ Multi-Fund Predictor for PEA Provident Fund
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple, List
-import yfinance as yf
+from typing import Dict, Any, Tuple, List, Optional
 from pathlib import Path
 import json
+import warnings
 from datetime import datetime
 
+from app.data_fetcher import fetch_stock_data
 from app.config import settings
+from app.backtest_engine import run_backtest_arrays
+from app.kernels import ema_smooth
+
+
+FUNDS = ["PEA-F", "PEA-E", "PEA-G", "PEA-P"]
+PROFILES = ["conservative", "moderate", "aggressive"]
+
+# PEA-F: Fixed Income (assume stable ~2.5% annual = 0.2% monthly)
+BOND_MARKET_DATA = {"return_1m": 0.2, "return_3m": 0.6, "return_6m": 1.2, "volatility": 1, "trend": 0.2}
+BOND_MONTHLY_RETURN = 0.002
+
+# PEA-P fallback when no REIT data is available
+REITS_FALLBACK = {"return_1m": 0.5, "return_3m": 1.5, "return_6m": 3, "volatility": 8, "trend": 0.5}
+
+
+def fund_scores(return_3m, trend, volatility):
+    """
+    Fund score (0-100) from 3-month return, trend and volatility.
+    Works on scalars or arrays of any shape.
+    """
+    return_score = np.clip((np.asarray(return_3m, dtype=float) + 10) * 5, 0, 100)  # -10% to +10% → 0-100
+    trend_score = np.clip((np.asarray(trend, dtype=float) + 1) * 50, 0, 100)  # -1 to +1 → 0-100
+    vol_score = np.clip(100 - np.asarray(volatility, dtype=float) * 3, 0, 100)  # Lower vol = higher score
+    
+    # Weighted average
+    return return_score * 0.5 + trend_score * 0.3 + vol_score * 0.2
+
+
+def profile_ranges(profiles: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(profiles x funds) arrays of min and max % from settings.RISK_PROFILES."""
+    profiles = PROFILES if profiles is None else profiles
+    ranges = [settings.RISK_PROFILES[p]["ranges"] for p in profiles]
+    low = np.array([[r[f][0] for f in FUNDS] for r in ranges], dtype=float)
+    high = np.array([[r[f][1] for f in FUNDS] for r in ranges], dtype=float)
+    return low, high
+
+
+def allocation_from_scores(scores, low, high) -> np.ndarray:
+    """
+    Map scores (0-100) into each fund's range and normalize to 100%.
+    Broadcasts over leading axes, e.g. (time x 1 x funds) scores with
+    (profiles x funds) ranges → (time x profiles x funds).
+    """
+    raw = low + (np.asarray(scores, dtype=float) / 100) * (high - low)
+    return raw / raw.sum(axis=-1, keepdims=True) * 100
+
+
+def round_allocation(allocation: np.ndarray) -> np.ndarray:
+    """Round to integer % and give the rounding remainder to the largest fund."""
+    rounded = np.round(allocation)
+    diff = 100 - rounded.sum(axis=-1)
+    largest = np.argmax(rounded, axis=-1)
+    np.put_along_axis(rounded, largest[..., None], (np.take_along_axis(rounded, largest[..., None], axis=-1)[..., 0] + diff)[..., None], axis=-1)
+    return rounded
+
+
+def daily_fund_indicators(close: pd.Series) -> pd.DataFrame:
+    """
+    return_3m / volatility / trend for every day, matching _calculate_return(63),
+    _calculate_volatility(63) and _calculate_trend on the history up to that day.
+    """
+    close = close.dropna()
+    returns = close.pct_change()
+    sma_20 = close.rolling(20).mean()
+    sma_50 = close.rolling(50).mean()
+    
+    trend = (
+        (close > sma_20).astype(float) * 0.5 +
+        (close > sma_50).astype(float) * 0.3 +
+        (sma_20 > sma_50).astype(float) * 0.2
+    ) - 0.5
+    trend[sma_50.isna()] = np.nan
+    
+    return pd.DataFrame({
+        "close": close,
+        "return_3m": (close / close.shift(62) - 1) * 100,
+        "volatility": returns.rolling(63).std() * np.sqrt(252) * 100,
+        "trend": trend,
+    })
+
+
+def fetch_history(ticker: str, period: str) -> pd.DataFrame:
+    """Daily OHLCV indexed by date, through fetch_stock_data (honours the offline source)."""
+    return fetch_stock_data(ticker, period).set_index("Date")
+
+
+def _to_month_end(frame: pd.DataFrame) -> pd.DataFrame:
+    """Last trading-day values of each calendar month (timezone dropped)."""
+    if getattr(frame.index, "tz", None) is not None:
+        frame = frame.tz_localize(None)
+    return frame.resample("ME").last()
 
 
 class MultiFundPredictor:
@@ -57,7 +149,7 @@ class MultiFundPredictor:
         
         # 1. PEA-E: Thai Equity (SET Index)
         try:
-            set_data = yf.Ticker(settings.TICKER_SET).history(period="1y")
+            set_data = fetch_history(settings.TICKER_SET, "1y")
             if not set_data.empty:
                 data["PEA-E"] = {
                     "return_1m": self._calculate_return(set_data, 21),
@@ -72,7 +164,7 @@ class MultiFundPredictor:
         
         # 2. PEA-G: Global Equity (S&P 500)
         try:
-            sp500_data = yf.Ticker(settings.TICKER_SP500).history(period="1y")
+            sp500_data = fetch_history(settings.TICKER_SP500, "1y")
             if not sp500_data.empty:
                 data["PEA-G"] = {
                     "return_1m": self._calculate_return(sp500_data, 21),
@@ -89,7 +181,11 @@ class MultiFundPredictor:
         try:
             reits_returns = []
             for ticker in settings.TICKER_REITS:
-                reit_data = yf.Ticker(ticker).history(period="1y")
+                try:
+                    reit_data = fetch_history(ticker, "1y")
+                except ValueError as e:
+                    print(f"Warning: Failed to fetch {ticker}: {e}")
+                    continue
                 if not reit_data.empty:
                     reits_returns.append({
                         "return_1m": self._calculate_return(reit_data, 21),
@@ -106,19 +202,13 @@ class MultiFundPredictor:
                     "trend": np.mean([r["return_3m"] for r in reits_returns]) / 3,
                 }
             else:
-                data["PEA-P"] = {"return_1m": 0.5, "return_3m": 1.5, "return_6m": 3, "volatility": 8, "trend": 0.5}
+                data["PEA-P"] = dict(REITS_FALLBACK)
         except Exception as e:
             print(f"Warning: Failed to fetch REITs data: {e}")
-            data["PEA-P"] = {"return_1m": 0.5, "return_3m": 1.5, "return_6m": 3, "volatility": 8, "trend": 0.5}
+            data["PEA-P"] = dict(REITS_FALLBACK)
         
         # 4. PEA-F: Fixed Income (assume stable ~2.5% annual = 0.2% monthly)
-        data["PEA-F"] = {
-            "return_1m": 0.2,
-            "return_3m": 0.6,
-            "return_6m": 1.2,
-            "volatility": 1,  # Very low volatility
-            "trend": 0.2,
-        }
+        data["PEA-F"] = dict(BOND_MARKET_DATA)
         
         return data
     
@@ -157,7 +247,8 @@ class MultiFundPredictor:
     def predict_allocation(
         self, 
         risk_profile: str = "moderate",
-        use_smoothing: bool = True
+        use_smoothing: bool = True,
+        market_data: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         ทำนายสัดส่วนทั้ง 4 กอง ตามโหมดความเสี่ยง
@@ -165,54 +256,38 @@ class MultiFundPredictor:
         Args:
             risk_profile: "conservative", "moderate", "aggressive"
             use_smoothing: ใช้ EMA smoothing หรือไม่
+            market_data: ผลของ fetch_market_data() (ไม่ส่ง = ดึงใหม่)
         
         Returns:
             Dict with allocations and details
         """
         # Fetch market data
-        market_data = self.fetch_market_data()
+        if market_data is None:
+            market_data = self.fetch_market_data()
         
         # Get risk profile ranges
         profile = settings.RISK_PROFILES.get(risk_profile, settings.RISK_PROFILES["moderate"])
         ranges = profile["ranges"]
         
-        # Calculate scores for each fund (0-100)
-        scores = {}
-        
-        for fund, data in market_data.items():
-            # Score based on return, trend, and inverse volatility
-            return_score = min(100, max(0, (data["return_3m"] + 10) * 5))  # -10% to +10% → 0-100
-            trend_score = min(100, max(0, (data["trend"] + 1) * 50))  # -1 to +1 → 0-100
-            vol_score = min(100, max(0, 100 - data["volatility"] * 3))  # Lower vol = higher score
-            
-            # Weighted average
-            scores[fund] = (
-                return_score * 0.5 +
-                trend_score * 0.3 +
-                vol_score * 0.2
-            )
-        
-        # Normalize scores within ranges
-        raw_allocation = {}
-        for fund in ["PEA-F", "PEA-E", "PEA-G", "PEA-P"]:
-            min_pct, max_pct = ranges[fund]
-            score = scores.get(fund, 50)
-            
-            # Map score (0-100) to range (min-max)
-            raw_allocation[fund] = min_pct + (score / 100) * (max_pct - min_pct)
+        # Calculate scores for each fund (0-100): return, trend, and inverse volatility
+        scores = {
+            fund: float(fund_scores(data["return_3m"], data["trend"], data["volatility"]))
+            for fund, data in market_data.items()
+        }
         
-        # Normalize to 100%
-        total = sum(raw_allocation.values())
-        normalized = {k: (v / total) * 100 for k, v in raw_allocation.items()}
+        # Map score (0-100) to range (min-max), normalize to 100%
+        low = np.array([ranges[f][0] for f in FUNDS], dtype=float)
+        high = np.array([ranges[f][1] for f in FUNDS], dtype=float)
+        normalized_values = allocation_from_scores([scores.get(f, 50) for f in FUNDS], low, high)
+        normalized = {f: float(v) for f, v in zip(FUNDS, normalized_values)}
         
         # Apply smoothing (EMA)
         if use_smoothing and self.last_allocation:
             alpha = settings.ALLOCATION_SMOOTHING
-            smoothed = {}
-            for fund in normalized:
-                old = self.last_allocation.get(fund, normalized[fund])
-                new = normalized[fund]
-                smoothed[fund] = alpha * old + (1 - alpha) * new
+            funds = list(normalized)
+            new = np.array([[normalized[f] for f in funds]])
+            old = np.array([self.last_allocation.get(f, normalized[f]) for f in funds])
+            smoothed = dict(zip(funds, ema_smooth(new, alpha, initial=old)[-1]))
             
             # Re-normalize after smoothing
             total_smoothed = sum(smoothed.values())
@@ -240,14 +315,201 @@ class MultiFundPredictor:
             "smoothing_applied": use_smoothing,
         }
     
-    def get_all_risk_profiles(self) -> Dict[str, Dict]:
+    def get_all_risk_profiles(self, market_data: Optional[Dict[str, Any]] = None) -> Dict[str, Dict]:
         """
-        คำนวณสัดส่วนสำหรับทั้ง 3 โหมด
+        คำนวณสัดส่วนสำหรับทั้ง 3 โหมด (ดึงข้อมูลตลาดครั้งเดียวใช้ร่วมกัน)
         """
+        if market_data is None:
+            market_data = self.fetch_market_data()
         results = {}
         for profile_name in ["conservative", "moderate", "aggressive"]:
             results[profile_name] = self.predict_allocation(
                 risk_profile=profile_name,
-                use_smoothing=True
+                use_smoothing=True,
+                market_data=market_data
             )
         return results
+    
+    # ------------------------------------------------------------------
+    # Historical backtest
+    # ------------------------------------------------------------------
+    def fetch_price_history(self, period: str = "max") -> Dict[str, Any]:
+        """
+        ดึงราคาปิดย้อนหลังของทุกกอง สำหรับ backtest
+        Returns {"PEA-E": Series, "PEA-G": Series, "PEA-P": [Series, ...]}
+        """
+        print(f"Fetching {period} price history for 4 funds...")
+        history = {"PEA-E": None, "PEA-G": None, "PEA-P": []}
+        for fund, ticker in [("PEA-E", settings.TICKER_SET), ("PEA-G", settings.TICKER_SP500)]:
+            history[fund] = fetch_history(ticker, period)["Close"]
+        for ticker in settings.TICKER_REITS:
+            try:
+                history["PEA-P"].append(fetch_history(ticker, period)["Close"])
+            except Exception as e:
+                print(f"Warning: Failed to fetch {ticker}: {e}")
+        return history
+    
+    def compute_monthly_panel(self, history: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Month-end panel of the live inputs: scores (months x funds) computed
+        as predict_allocation would have on that day, plus each fund's
+        return over the following month.
+        """
+        equity = {
+            fund: _to_month_end(daily_fund_indicators(history[fund]))
+            for fund in ["PEA-E", "PEA-G"]
+        }
+        reits = [_to_month_end(daily_fund_indicators(close)) for close in history["PEA-P"]]
+        
+        index = equity["PEA-E"].index.union(equity["PEA-G"].index)
+        for r in reits:
+            index = index.union(r.index)
+        equity = {f: v.reindex(index) for f, v in equity.items()}
+        reits = [r.reindex(index) for r in reits]
+        
+        n = len(index)
+        return_3m = np.empty((n, len(FUNDS)))
+        trend = np.empty((n, len(FUNDS)))
+        volatility = np.empty((n, len(FUNDS)))
+        monthly_return = np.empty((n, len(FUNDS)))
+        col = {fund: i for i, fund in enumerate(FUNDS)}
+        
+        # PEA-F: constant inputs, as in fetch_market_data
+        return_3m[:, col["PEA-F"]] = BOND_MARKET_DATA["return_3m"]
+        trend[:, col["PEA-F"]] = BOND_MARKET_DATA["trend"]
+        volatility[:, col["PEA-F"]] = BOND_MARKET_DATA["volatility"]
+        monthly_return[:, col["PEA-F"]] = BOND_MONTHLY_RETURN
+        
+        for fund in ["PEA-E", "PEA-G"]:
+            return_3m[:, col[fund]] = equity[fund]["return_3m"].to_numpy()
+            trend[:, col[fund]] = equity[fund]["trend"].to_numpy()
+            volatility[:, col[fund]] = equity[fund]["volatility"].to_numpy()
+            monthly_return[:, col[fund]] = equity[fund]["close"].pct_change(fill_method=None).to_numpy()
+        
+        # PEA-P: average of the REITs with data that month
+        if reits:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)  # months before any REIT listed
+                # A listed REIT with < 63 days of data counts as 0% (like _calculate_return)
+                reit_return_3m = np.nanmean(np.column_stack([
+                    r["return_3m"].where(r["close"].isna(), r["return_3m"].fillna(0)).to_numpy() for r in reits
+                ]), axis=1)
+                reit_monthly = np.nanmean(np.column_stack([
+                    r["close"].pct_change(fill_method=None).to_numpy() for r in reits
+                ]), axis=1)
+        else:
+            reit_return_3m = np.full(n, np.nan)
+            reit_monthly = np.full(n, np.nan)
+        has_reits = ~np.isnan(reit_return_3m)
+        return_3m[:, col["PEA-P"]] = np.where(has_reits, reit_return_3m, REITS_FALLBACK["return_3m"])
+        trend[:, col["PEA-P"]] = np.where(has_reits, reit_return_3m / 3, REITS_FALLBACK["trend"])
+        volatility[:, col["PEA-P"]] = 8  # REITs usually less volatile
+        monthly_return[:, col["PEA-P"]] = reit_monthly
+        
+        scores = fund_scores(return_3m, trend, volatility)
+        
+        # Allocation decided at month t earns the return over month t+1
+        next_return = np.vstack([monthly_return[1:], np.full((1, len(FUNDS)), np.nan)])
+        
+        # Months where every input is available
+        valid = ~(np.isnan(scores).any(axis=1) | np.isnan(next_return).any(axis=1))
+        
+        return {
+            "dates": index[valid],
+            "scores": scores[valid],
+            "next_return": next_return[valid],
+        }
+    
+    def smooth_allocations(
+        self,
+        normalized: np.ndarray,
+        alpha: float,
+        initial: np.ndarray = None,
+        round_allocations: bool = True
+    ) -> np.ndarray:
+        """
+        Apply the ALLOCATION_SMOOTHING EMA recursively over time.
+        normalized: (time x profiles x funds) target allocations (%).
+        
+        round_allocations=True follows predict_allocation: each month's
+        rounded, re-normalized result is the next month's starting point.
+        False applies a plain EMA (kernels.ema_smooth) to every
+        profile/fund series at once.
+        """
+        T, P, F = normalized.shape
+        if initial is None:
+            initial = np.full((P, F), 100 / F)  # live default: 25% each
+        initial = np.broadcast_to(np.asarray(initial, dtype=float), (P, F))
+        
+        if not round_allocations:
+            smoothed = ema_smooth(normalized.reshape(T, P * F), alpha, initial=initial.reshape(-1))
+            smoothed = smoothed.reshape(T, P, F)
+            return smoothed / smoothed.sum(axis=-1, keepdims=True) * 100
+        
+        # Sequential in time, vectorized over profiles and funds
+        out = np.empty_like(normalized)
+        prev = initial
+        for t in range(T):
+            smoothed = alpha * prev + (1 - alpha) * normalized[t]
+            prev = round_allocation(smoothed / smoothed.sum(axis=-1, keepdims=True) * 100)
+            out[t] = prev
+        return out
+    
+    def backtest_allocation(
+        self,
+        history: Dict[str, Any] = None,
+        profiles: List[str] = None,
+        alpha: float = None,
+        round_allocations: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Rolling historical backtest of the 4-fund allocation
+        
+        ทุกเดือน: scores → ช่วงสัดส่วนของแต่ละโหมด → EMA smoothing →
+        ผลตอบแทนพอร์ตเดือนถัดไป เทียบแบบมีและไม่มี smoothing
+        """
+        profiles = PROFILES if profiles is None else profiles
+        alpha = settings.ALLOCATION_SMOOTHING if alpha is None else alpha
+        history = self.fetch_price_history() if history is None else history
+        
+        panel = self.compute_monthly_panel(history)
+        if len(panel["dates"]) < 2:
+            raise ValueError("Not enough overlapping history for backtest")
+        
+        low, high = profile_ranges(profiles)
+        target = allocation_from_scores(panel["scores"][:, None, :], low, high)  # (time x profiles x funds)
+        
+        variants = {
+            "smoothed": self.smooth_allocations(target, alpha, round_allocations=round_allocations),
+            "unsmoothed": round_allocation(target) if round_allocations else target,
+        }
+        
+        results = {}
+        for i, name in enumerate(profiles):
+            results[name] = {}
+            for variant, allocation in variants.items():
+                weights = allocation[:, i, :] / 100
+                portfolio_return = (weights * panel["next_return"]).sum(axis=1)
+                bt = run_backtest_arrays(1.0, portfolio_return, periods_per_year=12)
+                turnover = np.abs(np.diff(weights, axis=0)).sum(axis=1) / 2
+                results[name][variant] = {
+                    "total_return_pct": round(bt.total_return * 100, 2),
+                    "annual_return_pct": round(((1 + bt.total_return) ** (12 / bt.periods) - 1) * 100, 2),
+                    "sharpe_ratio": round(bt.sharpe_ratio, 2),
+                    "max_drawdown_pct": round(bt.max_drawdown * 100, 2),
+                    "volatility_pct": round(bt.volatility * 100, 2),
+                    "avg_monthly_turnover_pct": round(float(turnover.mean()) * 100, 2) if len(turnover) else 0.0,
+                    "avg_allocation": {f: round(float(v), 1) for f, v in zip(FUNDS, allocation[:, i, :].mean(axis=0))},
+                    "last_allocation": {f: round(float(v), 1) for f, v in zip(FUNDS, allocation[-1, i, :])},
+                }
+        
+        dates = panel["dates"]
+        return {
+            "period": {
+                "start": dates[0].strftime("%Y-%m"),
+                "end": dates[-1].strftime("%Y-%m"),
+                "months": len(dates),
+            },
+            "smoothing": alpha,
+            "profiles": results,
+        }
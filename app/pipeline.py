@@ -0,0 +1,262 @@
+"""
+Small DAG runner for batch pipelines (scripts/daily_update.py).
+
+    pipeline = Pipeline([
+        Stage("fetch", fetch, outputs=("df",), cache=False),
+        Stage("monthly", resample, inputs=("df",), outputs=("monthly",)),
+        Stage("funds", fetch_funds, outputs=("market_data",), cache=False),
+        ...
+    ])
+    values = pipeline.run(timer=timer, workers=4, cache=StageCache("models/pipeline_cache"))
+
+Each stage is a function whose keyword arguments are its declared inputs
+and whose return value is its outputs (a tuple when there are several).
+A stage starts as soon as its inputs exist, so independent branches run
+concurrently on a thread pool. This helps mostly with network fetches and
+with numpy / sklearn code that releases the GIL.
+
+With a StageCache, a cacheable stage is skipped when the fingerprint of
+its inputs matches the last run, and its stored outputs are reused.
+Stages that read the outside world (fetches, model files) or have side
+effects should set cache=False; their outputs are still fingerprinted, so
+downstream stages rerun only when the data actually changed.
+"""
+
+import contextvars
+import hashlib
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of the DAG. Bump version when the function's logic changes."""
+    name: str
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    cache: bool = True
+    version: str = "1"
+
+
+def fingerprint(value: Any) -> Optional[str]:
+    """
+    Stable content hash (same across processes), or None if the value
+    cannot be fingerprinted. Objects may provide a fingerprint() method.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode("utf-8"))
+        return digest.hexdigest()
+    if isinstance(value, np.ndarray):
+        return hashlib.sha1(np.ascontiguousarray(value).tobytes() + str(value.dtype).encode("ascii")).hexdigest()
+    method = getattr(value, "fingerprint", None)
+    if callable(method):
+        return str(method())
+    if isinstance(value, (list, tuple)):
+        parts = [fingerprint(item) for item in value]
+        return None if None in parts else hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    try:
+        text = json.dumps(value, sort_keys=True, default=_json_default)
+    except TypeError:
+        return None
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"not fingerprintable: {type(value).__name__}")
+
+
+def source_fingerprint(paths: List[Path], extra: str = "") -> str:
+    """Hash of source files (plus e.g. serialized settings), for StageCache(salt=...)."""
+    digest = hashlib.sha1(extra.encode("utf-8"))
+    for path in paths:
+        digest.update(str(Path(path).name).encode("utf-8"))
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Last outputs of each cacheable stage on disk (one joblib file per stage).
+    salt is mixed into every key: pass source_fingerprint(...) so that code
+    or configuration changes invalidate stored outputs.
+    """
+
+    def __init__(self, cache_dir: str = "models/pipeline_cache", salt: str = ""):
+        self.cache_dir = Path(cache_dir)
+        self.salt = salt
+
+    def _path(self, stage: str) -> Path:
+        return self.cache_dir / f"{stage}.joblib"
+
+    def get(self, stage: str, key: str) -> Optional[Tuple[Any, ...]]:
+        path = self._path(stage)
+        if not path.exists():
+            return None
+        try:
+            entry = joblib.load(path)
+        except Exception:
+            return None
+        return entry["outputs"] if entry.get("key") == key else None
+
+    def set(self, stage: str, key: str, outputs: Tuple[Any, ...]) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(stage)
+            tmp = path.with_suffix(".tmp")
+            joblib.dump({"key": key, "outputs": outputs}, tmp)
+            tmp.replace(path)
+        except Exception as e:
+            print(f"Warning: could not cache stage {stage}: {e}")
+
+    def clear(self) -> None:
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.joblib"):
+                path.unlink()
+
+
+class Pipeline:
+    """A validated DAG of stages (see module docstring)."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Duplicate stage names")
+        self.producer: Dict[str, str] = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producer:
+                    raise ValueError(f"'{output}' is produced by both {self.producer[output]} and {stage.name}")
+                self.producer[output] = stage.name
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order, state = [], {}
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle: {' -> '.join(path + (name,))}")
+            state[name] = "visiting"
+            for value in self.stages[name].inputs:
+                if value in self.producer:
+                    visit(self.producer[value], path + (name,))
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    def dependencies(self, name: str) -> List[str]:
+        return sorted({self.producer[value] for value in self.stages[name].inputs if value in self.producer})
+
+    def run(
+        self,
+        initial: Optional[Dict[str, Any]] = None,
+        timer=None,
+        workers: int = 4,
+        cache: Optional[StageCache] = None
+    ) -> Dict[str, Any]:
+        """
+        Run every stage once; returns all values (initial + stage outputs).
+        timer: optional StageTimer (tracking memory forces workers=1, since
+        tracemalloc peaks are process-wide). The first stage error is
+        re-raised after running stages finish; stages not yet started are
+        skipped. self.report maps stage -> "ran" / "cached" / "failed" / "skipped".
+        """
+        values: Dict[str, Any] = dict(initial or {})
+        missing = {
+            value for stage in self.stages.values() for value in stage.inputs
+            if value not in self.producer and value not in values
+        }
+        if missing:
+            raise ValueError(f"Inputs with no producing stage: {sorted(missing)}")
+
+        fingerprints: Dict[str, Optional[str]] = {}
+        self.report: Dict[str, str] = {name: "skipped" for name in self.order}
+        if timer is not None and timer.track_memory:
+            workers = 1
+
+        def execute(name: str) -> Tuple[Any, ...]:
+            stage = self.stages[name]
+            key = None
+            if cache is not None and stage.cache:
+                # Memoized: a value feeding several stages is hashed once
+                for value in stage.inputs:
+                    if value not in fingerprints:
+                        fingerprints[value] = fingerprint(values[value])
+                parts = [fingerprints[value] for value in stage.inputs]
+                if None not in parts:
+                    key = hashlib.sha1(
+                        "|".join([cache.salt, stage.name, stage.version] + parts).encode("utf-8")
+                    ).hexdigest()
+
+            stage_timer = timer.stage(name) if timer is not None else nullcontext()
+            with stage_timer:
+                outputs = cache.get(name, key) if key is not None else None
+                if outputs is not None:
+                    self.report[name] = "cached"
+                    return outputs
+                result = stage.func(**{value: values[value] for value in stage.inputs})
+                if not stage.outputs:
+                    outputs = ()
+                elif len(stage.outputs) == 1:
+                    outputs = (result,)
+                else:
+                    outputs = tuple(result)
+                if len(outputs) != len(stage.outputs):
+                    raise ValueError(f"Stage {name} returned {len(outputs)} values for outputs {stage.outputs}")
+                if key is not None:
+                    cache.set(name, key, tuple(outputs))
+                self.report[name] = "ran"
+                return tuple(outputs)
+
+        pending = list(self.order)
+        running = {}
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or running:
+                if error is None:
+                    for name in list(pending):
+                        if len(running) >= max(1, workers):
+                            break
+                        if all(dep not in pending and dep not in running.values() for dep in self.dependencies(name)):
+                            pending.remove(name)
+                            # copy_context: ContextVars (call audit) follow the stage into the thread
+                            future = pool.submit(contextvars.copy_context().run, execute, name)
+                            running[future] = name
+                else:
+                    pending.clear()
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        outputs = future.result()
+                    except BaseException as e:
+                        self.report[name] = "failed"
+                        error = error or e
+                        continue
+                    stage = self.stages[name]
+                    for value, output in zip(stage.outputs, outputs):
+                        values[value] = output
+
+        if error is not None:
+            raise error
+        return values
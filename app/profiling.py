@@ -0,0 +1,220 @@
+"""
+On-demand request profiling: add ?profile=1 to any endpoint.
+
+    curl -H "X-Admin-Token: $PEA_ADMIN_TOKEN" "http://host/backtest?profile=1"
+
+The handler runs under a profiler and the reply becomes
+{"status_code", "response", "profile"}, where "response" is the normal body.
+
+Query parameters:
+    profile=1                 enable (requires X-Admin-Token == PEA_ADMIN_TOKEN)
+    profile_format=top        cProfile top-N table (default)
+    profile_format=speedscope evented profile for https://www.speedscope.app
+    profile_top=30            rows in the top-N table
+    profile_sort=cumulative   or "tottime"
+
+Disabled unless PEA_ADMIN_TOKEN is set. Endpoints are async and do their
+work on the event loop thread, so the profile covers the handler itself;
+only one request is profiled at a time.
+"""
+
+import cProfile
+import hmac
+import json
+import pstats
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs
+
+from app.config import settings
+
+FORMATS = ("top", "speedscope")
+SORT_KEYS = {"cumulative": 3, "tottime": 2}
+
+_busy = False
+
+
+def _short_path(path: str) -> str:
+    """Repo, site-packages and stdlib paths without their install prefix."""
+    for marker in ("site-packages/", "/app/", "/scripts/"):
+        index = path.rfind(marker)
+        if index >= 0:
+            return path[index + 1:] if marker.startswith("/") else path[index + len(marker):]
+    index = path.find("/lib/python")
+    if index >= 0 and path.find("/", index + 5) >= 0:
+        return path[path.find("/", index + 5) + 1:]
+    return path
+
+
+def top_functions(profiler: cProfile.Profile, limit: int = 30, sort: str = "cumulative") -> List[Dict[str, Any]]:
+    """Hottest functions of a finished cProfile run."""
+    stats = pstats.Stats(profiler).stats
+    key = SORT_KEYS.get(sort, SORT_KEYS["cumulative"])
+    rows = sorted(stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{_short_path(filename)}:{line}({name})",
+            "calls": calls,
+            "primitive_calls": primitive,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (primitive, calls, tottime, cumtime, _) in rows
+    ]
+
+
+class EventRecorder:
+    """
+    Deterministic call/return trace (sys.setprofile) in speedscope's evented
+    format, with the same enable/disable interface as cProfile.Profile.
+    Returns of frames entered before enable() are ignored, so open/close
+    events always nest. New calls stop being recorded after max_events.
+    """
+
+    def __init__(self, max_events: int = 200_000):
+        self.max_events = max_events
+        self.frames: List[Dict[str, Any]] = []
+        self.frame_index: Dict[Tuple[str, int, str], int] = {}
+        self.events: List[Tuple[str, int, float]] = []
+        self.stack: List[Tuple[Any, int]] = []
+        self.truncated = False
+        self.start_time = 0.0
+
+    def _callback(self, frame, event, arg):
+        if event == "call":
+            if len(self.events) >= self.max_events:
+                self.truncated = True
+                return
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            index = self.frame_index.get(key)
+            if index is None:
+                index = self.frame_index[key] = len(self.frames)
+                self.frames.append({"name": code.co_name, "file": _short_path(code.co_filename), "line": code.co_firstlineno})
+            self.stack.append((frame, index))
+            self.events.append(("O", index, time.perf_counter() - self.start_time))
+        elif event == "return" and self.stack and self.stack[-1][0] is frame:
+            _, index = self.stack.pop()
+            self.events.append(("C", index, time.perf_counter() - self.start_time))
+
+    def enable(self) -> None:
+        self.start_time = time.perf_counter()
+        sys.setprofile(self._callback)
+
+    def disable(self) -> None:
+        sys.setprofile(None)
+        end = time.perf_counter() - self.start_time
+        while self.stack:
+            _, index = self.stack.pop()
+            self.events.append(("C", index, end))
+        self.end_time = end
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "evented",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.end_time,
+                "events": [{"type": kind, "frame": index, "at": at} for kind, index, at in self.events],
+            }],
+            "name": name,
+            "exporter": "pea-profiling",
+            "truncated": self.truncated,
+        }
+
+
+async def _json_reply(send, status: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class ProfilingMiddleware:
+    """ASGI middleware implementing ?profile=1 (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or b"profile=" not in scope.get("query_string", b""):
+            await self.app(scope, receive, send)
+            return
+
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        if query.get("profile", ["0"])[0] not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+
+        # Compare raw bytes: compare_digest rejects non-ASCII str input
+        token = dict(scope.get("headers", [])).get(b"x-admin-token", b"")
+        if not settings.ADMIN_TOKEN or not hmac.compare_digest(token, settings.ADMIN_TOKEN.encode("utf-8")):
+            await _json_reply(send, 403, {"detail": "Profiling requires a valid X-Admin-Token"})
+            return
+
+        profile_format = query.get("profile_format", ["top"])[0]
+        if profile_format not in FORMATS:
+            await _json_reply(send, 400, {"detail": f"profile_format must be one of {list(FORMATS)}"})
+            return
+
+        global _busy
+        if _busy:
+            await _json_reply(send, 409, {"detail": "Another request is being profiled"})
+            return
+        _busy = True
+
+        start_message: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start_message.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        if profile_format == "speedscope":
+            profiler = EventRecorder(settings.PROFILE_MAX_EVENTS)
+        else:
+            profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profiler.disable()
+        finally:
+            _busy = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if profile_format == "speedscope":
+            profile = profiler.speedscope(f"{scope['method']} {scope['path']}")
+        else:
+            top = query.get("profile_top", ["30"])[0]
+            limit = int(top) if top.isdigit() else 30
+            sort = query.get("profile_sort", ["cumulative"])[0]
+            sort = sort if sort in SORT_KEYS else "cumulative"
+            profile = {"sort": sort, "functions": top_functions(profiler, limit, sort)}
+
+        body = b"".join(chunks)
+        content_type = dict(start_message.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+        try:
+            response = json.loads(body) if content_type.startswith("application/json") else body.decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            response = body.decode("utf-8", errors="replace")
+
+        await _json_reply(send, 200, {
+            "status_code": start_message.get("status", 500),
+            "elapsed_ms": round(elapsed_ms, 3),
+            "format": profile_format,
+            "response": response,
+            "profile": profile,
+        })
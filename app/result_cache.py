@@ -0,0 +1,141 @@
+"""
+Caches for API responses that change at most once a day.
+
+ResultCache    response cache keyed by (loaded model fingerprint, last data bar,
+               parameters): in memory (LRU) with an optional JSON disk tier
+               that survives restarts. Cleared when /train publishes a model.
+TTLCache       short-lived memo for data fetches, so computing the cache key
+               (which needs the last bar) does not refetch history each call.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app import metrics
+
+
+_MISSING = object()
+
+
+def make_key(namespace: str, **parts: Any) -> str:
+    """Stable cache key from JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:24]}"
+
+
+class ResultCache:
+    """
+    LRU cache of JSON-serializable results with an optional disk tier.
+
+    Args:
+        max_entries: in-memory entries kept (least recently used evicted)
+        cache_dir: directory for the disk tier ("" / None = memory only)
+        name: label for the hit/miss counters at /metrics
+    """
+
+    def __init__(self, max_entries: int = 64, cache_dir: Optional[str] = None, name: str = "result"):
+        self.name = name
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            metrics.cache_event(self.name, True)
+            return value
+
+        if self.cache_dir is not None:
+            try:
+                with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                    value = json.load(f)
+                self._remember(key, value)
+                self.hits += 1
+                metrics.cache_event(self.name, True)
+                return value
+            except (OSError, ValueError):
+                pass
+
+        self.misses += 1
+        metrics.cache_event(self.name, False)
+        return default
+
+    def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        if self.cache_dir is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                path = self._disk_path(key)
+                tmp = path.with_suffix(".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(value, f)
+                tmp.replace(path)
+            except (OSError, TypeError) as e:
+                print(f"Warning: could not write cache entry {key}: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry, in memory and on disk."""
+        self._memory.clear()
+        if self.cache_dir is not None and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk": str(self.cache_dir) if self.cache_dir else None,
+        }
+
+
+class TTLCache:
+    """Memo whose entries expire after ttl seconds (0 disables caching)."""
+
+    def __init__(self, ttl: float = 300, name: str = "ttl"):
+        self.name = name
+        self.ttl = ttl
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            metrics.cache_event(self.name, True)
+            return entry[1]
+        metrics.cache_event(self.name, False)
+        value = compute()
+        if self.ttl > 0:
+            self._entries[key] = (now, value)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Tuple
 
+from app.signal_rules import SignalRule, Ladder, Step, when
+
 
 class RiskManager:
     """
@@ -26,6 +28,26 @@ class RiskManager:
         self.max_allocation = max_allocation
         self.min_confidence = min_confidence
         self.volatility_threshold = volatility_threshold
+        self.base_allocation_rule = self._build_base_allocation_rule(min_confidence)
+    
+    @staticmethod
+    def _build_base_allocation_rule(min_confidence: float) -> SignalRule:
+        """Base allocation from (prediction, confidence), with reason labels."""
+        bullish = when("prediction", "==", 1)
+        return SignalRule(
+            name="risk_base_allocation",
+            ladders=(
+                Ladder("base", (
+                    Step((bullish, when("confidence", "<", min_confidence)), 0.3, "Confidence ต่ำ ({confidence:.1%})"),
+                    Step((bullish, when("confidence", "<", 0.65)), 0.5, "Confidence ปานกลาง ({confidence:.1%})"),
+                    Step((bullish, when("confidence", "<", 0.75)), 0.7, "Confidence ดี ({confidence:.1%})"),
+                    Step((bullish,), 0.85, "Confidence สูง ({confidence:.1%})"),
+                    Step((when("confidence", "<", min_confidence),), 0.5, "Bearish signal ({confidence:.1%})"),
+                    Step((when("confidence", "<", 0.65),), 0.4, "Bearish signal ({confidence:.1%})"),
+                    Step((when("confidence", "<", 0.75),), 0.2, "Bearish signal ({confidence:.1%})"),
+                ), default=0.1, default_label="Bearish signal ({confidence:.1%})"),
+            ),
+        )
     
     def calculate_safe_allocation(
         self,
@@ -41,32 +63,10 @@ class RiskManager:
         Returns:
             (allocation, reason)
         """
-        reasons = []
-        
         # Base allocation from confidence
-        if prediction == 1:  # Bullish
-            if confidence < self.min_confidence:
-                base_alloc = 0.3
-                reasons.append(f"Confidence ต่ำ ({confidence:.1%})")
-            elif confidence < 0.65:
-                base_alloc = 0.5
-                reasons.append(f"Confidence ปานกลาง ({confidence:.1%})")
-            elif confidence < 0.75:
-                base_alloc = 0.7
-                reasons.append(f"Confidence ดี ({confidence:.1%})")
-            else:
-                base_alloc = 0.85
-                reasons.append(f"Confidence สูง ({confidence:.1%})")
-        else:  # Bearish
-            if confidence < self.min_confidence:
-                base_alloc = 0.5
-            elif confidence < 0.65:
-                base_alloc = 0.4
-            elif confidence < 0.75:
-                base_alloc = 0.2
-            else:
-                base_alloc = 0.1
-            reasons.append(f"Bearish signal ({confidence:.1%})")
+        inputs = {"prediction": prediction, "confidence": confidence}
+        base_alloc = self.base_allocation_rule.evaluate_latest(inputs)
+        reasons = self.base_allocation_rule.explain_latest(inputs)
         
         # Adjust for volatility
         if volatility > self.volatility_threshold:
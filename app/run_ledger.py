@@ -0,0 +1,171 @@
+"""
+Run ledger: one structured record per daily_update run in a local SQLite file.
+
+    runs    id, started_at, finished_at, duration_ms, outcome, error,
+            model_version, rows_fetched, months, cache_hits, cache_misses,
+            peak_rss_mb, details (JSON)
+    stages  run_id, stage, ms, peak_kb, net_kb, status
+
+status is the pipeline outcome of the stage ("ran", "cached", ...; NULL
+for steps outside the pipeline). Cached stages only time a cache lookup,
+so they are left out of stage history and trends.
+
+Query it with scripts/run_ledger.py (recent runs, per-stage trends).
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at    TEXT NOT NULL,
+    finished_at   TEXT NOT NULL,
+    duration_ms   REAL NOT NULL,
+    outcome       TEXT NOT NULL,
+    error         TEXT,
+    model_version TEXT,
+    rows_fetched  INTEGER,
+    months        INTEGER,
+    cache_hits    INTEGER,
+    cache_misses  INTEGER,
+    peak_rss_mb   REAL,
+    details       TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id  INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    stage   TEXT NOT NULL,
+    ms      REAL NOT NULL,
+    peak_kb REAL,
+    net_kb  REAL,
+    status  TEXT,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+"""
+
+RUN_COLUMNS = (
+    "started_at", "finished_at", "duration_ms", "outcome", "error", "model_version",
+    "rows_fetched", "months", "cache_hits", "cache_misses", "peak_rss_mb",
+)
+
+
+class RunLedger:
+    """SQLite-backed list of daily runs (created on first use)."""
+
+    def __init__(self, path: str = "models/run_ledger.sqlite"):
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(stages)")}
+        if "status" not in columns:  # ledgers created before stage status was recorded
+            conn.execute("ALTER TABLE stages ADD COLUMN status TEXT")
+        return conn
+
+    def record_run(
+        self,
+        run: Dict[str, Any],
+        stages: Dict[str, Dict[str, float]],
+        stage_status: Optional[Dict[str, str]] = None
+    ) -> int:
+        """
+        Store one run. run holds RUN_COLUMNS (missing ones stored as NULL)
+        plus an optional "details" dict; stages is StageTimer.as_dict() and
+        stage_status the pipeline report (Pipeline.report). Returns the run id.
+        """
+        stage_status = stage_status or {}
+        values = [run.get(column) for column in RUN_COLUMNS]
+        details = json.dumps(run.get("details") or {}, ensure_ascii=False, default=str)
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}, details) "
+                    f"VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 1))})",
+                    values + [details]
+                )
+                run_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO stages (run_id, stage, ms, peak_kb, net_kb, status) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (run_id, name, record["ms"], record.get("peak_kb"), record.get("net_kb"),
+                         stage_status.get(name))
+                        for name, record in stages.items()
+                    ]
+                )
+            return run_id
+        finally:
+            conn.close()
+
+    def recent_runs(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """Latest runs first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["details"] = json.loads(run["details"] or "{}")
+            runs.append(run)
+        return runs
+
+    def stage_history(self, stage: str, limit: int = 30, include_cached: bool = False) -> List[Dict[str, Any]]:
+        """
+        Durations of one stage over the last `limit` runs that computed it,
+        oldest first (include_cached=True also returns stage-cache hits).
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT r.id AS run_id, r.started_at, r.outcome, s.ms, s.peak_kb, s.net_kb, s.status "
+                "FROM stages s JOIN runs r ON r.id = s.run_id "
+                "WHERE s.stage = ? AND (? OR COALESCE(s.status, '') != 'cached') "
+                "ORDER BY r.id DESC LIMIT ?",
+                (stage, include_cached, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in reversed(rows)]
+
+    def stage_names(self) -> List[str]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT stage FROM stages GROUP BY stage ORDER BY MIN(rowid)"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row["stage"] for row in rows]
+
+    def stage_trends(self, limit: int = 30) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Per stage over the last `limit` runs that computed it (cache hits
+        excluded): median of the older and newer half and the change between
+        them (change_pct > 0 means slower).
+        """
+        trends = {}
+        for stage in self.stage_names():
+            times = [row["ms"] for row in self.stage_history(stage, limit)]
+            if not times:
+                continue
+            half = len(times) // 2
+            older = median(times[:half]) if half else None
+            newer = median(times[half:]) if times else None
+            change = (newer - older) / older * 100 if older else None
+            trends[stage] = {
+                "runs": len(times),
+                "older_median_ms": older,
+                "newer_median_ms": newer,
+                "change_pct": change,
+                "last_ms": times[-1] if times else None,
+            }
+        return trends
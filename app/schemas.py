@@ -34,6 +34,7 @@ class TrainResponse(BaseModel):
     train_samples: int
     test_samples: int
     features_used: List[str]
+    distillation: Optional[Dict[str, Any]] = None
 
 
 class BacktestPeriod(BaseModel):
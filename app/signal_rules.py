@@ -0,0 +1,201 @@
+"""
+Declarative signal rules compiled to NumPy expressions.
+
+A rule is a sum of ladders. Each ladder is an ordered list of steps
+(conditions -> value) where the first matching step wins, like an
+if/elif chain. The summed score then passes through an optional affine map,
+truncation, clamp and rounding. The same rule evaluates on one row (a dict of
+scalars or the last row of a frame) or on a full history in one call, and
+many weight sets can be scored at once for optimization (evaluate_batch).
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+_OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+}
+
+
+def _column(frame: Union[pd.DataFrame, Mapping[str, Any]], name: str) -> np.ndarray:
+    return np.atleast_1d(np.asarray(frame[name], dtype=float))
+
+
+@dataclass(frozen=True)
+class Condition:
+    """`column op value`, where value is a number or another column (times scale)."""
+    column: str
+    op: str
+    value: Union[float, str]
+    scale: float = 1.0
+
+    def evaluate(self, frame: Union[pd.DataFrame, Mapping[str, Any]]) -> np.ndarray:
+        lhs = _column(frame, self.column)
+        if isinstance(self.value, str):
+            rhs = _column(frame, self.value) * self.scale
+        else:
+            rhs = self.value * self.scale
+        # NaN compares False, same as the hand-written pandas comparisons
+        return _OPS[self.op](lhs, rhs)
+
+
+@dataclass(frozen=True)
+class Step:
+    """One branch of a ladder: fires when all conditions hold."""
+    when: Tuple[Condition, ...]
+    value: float
+    label: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Ladder:
+    """First-match-wins chain of steps with a default value."""
+    name: str
+    steps: Tuple[Step, ...]
+    default: float = 0.0
+    default_label: Optional[str] = None
+
+    @property
+    def n_parameters(self) -> int:
+        return len(self.steps) + 1
+
+    def parameters(self) -> List[float]:
+        return [step.value for step in self.steps] + [self.default]
+
+    def parameter_names(self) -> List[str]:
+        return [f"{self.name}[{i}]" for i in range(len(self.steps))] + [f"{self.name}.default"]
+
+    def conditions(self, frame: Union[pd.DataFrame, Mapping[str, Any]]) -> List[np.ndarray]:
+        masks = []
+        for step in self.steps:
+            mask = step.when[0].evaluate(frame)
+            for cond in step.when[1:]:
+                mask = mask & cond.evaluate(frame)
+            masks.append(mask)
+        return masks
+
+    def branches(self, frame: Union[pd.DataFrame, Mapping[str, Any]]) -> np.ndarray:
+        """Index of the step that fired for each row (len(steps) = default)."""
+        masks = self.conditions(frame)
+        if not masks:
+            return np.zeros(len(_column(frame, next(iter(frame)))), dtype=int)
+        return np.select(masks, np.arange(len(masks)), default=len(masks))
+
+    def evaluate(self, frame: Union[pd.DataFrame, Mapping[str, Any]], values: Optional[Sequence[float]] = None) -> np.ndarray:
+        values = self.parameters() if values is None else list(values)
+        return np.select(self.conditions(frame), values[:-1], default=values[-1])
+
+
+@dataclass(frozen=True)
+class SignalRule:
+    """
+    score = sum(ladders); output = round_to(clip(trunc((score + offset) / divide_by * scale)))
+    """
+    name: str
+    ladders: Tuple[Ladder, ...]
+    offset: float = 0.0
+    divide_by: float = 1.0
+    scale: float = 1.0
+    truncate: bool = False
+    clip: Optional[Tuple[float, float]] = None
+    round_to: Optional[float] = None
+
+    # ------------------------------------------------------------------ params
+    @property
+    def n_parameters(self) -> int:
+        return sum(ladder.n_parameters for ladder in self.ladders)
+
+    def parameters(self) -> np.ndarray:
+        """Default weight vector (step values + defaults, ladder by ladder)."""
+        return np.array([v for ladder in self.ladders for v in ladder.parameters()], dtype=float)
+
+    def parameter_names(self) -> List[str]:
+        return [n for ladder in self.ladders for n in ladder.parameter_names()]
+
+    def _split(self, weights: Sequence[float]) -> List[Sequence[float]]:
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape[-1] != self.n_parameters:
+            raise ValueError(f"{self.name}: expected {self.n_parameters} weights, got {weights.shape[-1]}")
+        parts, start = [], 0
+        for ladder in self.ladders:
+            parts.append(weights[..., start:start + ladder.n_parameters])
+            start += ladder.n_parameters
+        return parts
+
+    # ------------------------------------------------------------- evaluation
+    def _finish(self, score: np.ndarray) -> np.ndarray:
+        out = (score + self.offset) / self.divide_by * self.scale
+        if self.truncate:
+            out = np.trunc(out)
+        if self.clip is not None:
+            out = np.clip(out, self.clip[0], self.clip[1])
+        if self.round_to is not None:
+            out = np.round(out / self.round_to) * self.round_to
+        return out
+
+    def score(self, frame: Union[pd.DataFrame, Mapping[str, Any]], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Raw summed score before the output mapping."""
+        parts = [None] * len(self.ladders) if weights is None else self._split(weights)
+        total = None
+        for ladder, values in zip(self.ladders, parts):
+            value = ladder.evaluate(frame, values)
+            total = value if total is None else total + value
+        return total
+
+    def evaluate(self, frame: Union[pd.DataFrame, Mapping[str, Any]], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Evaluate on every row of a frame (or on a dict of scalars / arrays)."""
+        return self._finish(self.score(frame, weights))
+
+    def evaluate_latest(self, frame: Union[pd.DataFrame, Mapping[str, Any]], weights: Optional[Sequence[float]] = None) -> float:
+        """Evaluate only the last row."""
+        if isinstance(frame, pd.DataFrame):
+            frame = frame.iloc[-1:]
+        return float(self.evaluate(frame, weights)[-1])
+
+    def evaluate_batch(self, frame: Union[pd.DataFrame, Mapping[str, Any]], weights: np.ndarray) -> np.ndarray:
+        """
+        Evaluate many weight sets at once.
+        weights: (n_sets x n_parameters) -> returns (n_sets x rows).
+        Conditions are evaluated once per ladder; each weight set then costs
+        one gather per ladder. Ladders are summed in the same order as
+        evaluate(), so row i equals evaluate(frame, weights[i]) exactly.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        total = None
+        for ladder, values in zip(self.ladders, self._split(weights)):
+            value = values[:, ladder.branches(frame)]
+            total = value if total is None else total + value
+        return self._finish(total)
+
+    def explain_latest(self, frame: Union[pd.DataFrame, Mapping[str, Any]]) -> List[str]:
+        """Labels of the steps that fired on the last row, formatted with the row values."""
+        if isinstance(frame, pd.DataFrame):
+            row = frame.iloc[-1].to_dict()
+            frame = frame.iloc[-1:]
+        else:
+            row = {k: np.atleast_1d(v)[-1] for k, v in frame.items()}
+        labels = []
+        for ladder in self.ladders:
+            branch = int(ladder.branches(frame)[-1])
+            label = ladder.steps[branch].label if branch < len(ladder.steps) else ladder.default_label
+            if label:
+                labels.append(label.format(**row))
+        return labels
+
+
+def when(column: str, op: str, value: Union[float, str], scale: float = 1.0) -> Condition:
+    """Shorthand for Condition."""
+    return Condition(column, op, value, scale)
+
+
+def signal(name: str, condition: Condition, bullish: float, bearish: float = 0.0) -> Ladder:
+    """Two-way ladder: `bullish` when the condition holds, `bearish` otherwise (incl. NaN)."""
+    return Ladder(name, (Step((condition,), bullish),), default=bearish)
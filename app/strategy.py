@@ -4,9 +4,13 @@ Multiple trading strategies for Thai sideways market.
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Tuple
+from dataclasses import dataclass
+from typing import Dict, Any, Tuple, List, Callable, Optional
 from enum import Enum
 
+from app import kernels
+from app.backtest_engine import run_backtest_arrays
+
 
 class Signal(Enum):
     STRONG_BUY = 2
@@ -16,6 +20,47 @@ class Signal(Enum):
     STRONG_SELL = -2
 
 
+@dataclass(frozen=True)
+class RegisteredStrategy:
+    """
+    A strategy in the registry.
+    kind:
+      - "binary": 0/1 (flat/long); votes as -1/+1 in the ensemble
+      - "direction": -1/0/1 (sell/hold/buy); hold stays invested
+      - "allocation": equity fraction 0-1
+    window: trailing rows needed to compute the latest value
+    (1 for strategies that only read the current bar's indicators)
+    """
+    name: str
+    func: Callable[[pd.DataFrame], pd.Series]
+    kind: str = "direction"
+    ensemble: bool = False
+    window: int = 1
+    
+    def latest(self, df: pd.DataFrame) -> float:
+        """Value on the last row of df, computed from the trailing window only."""
+        return float(self.func(df.iloc[-self.window:]).iloc[-1])
+
+
+STRATEGY_REGISTRY: Dict[str, RegisteredStrategy] = {}
+
+
+def register_strategy(name: str, kind: str = "direction", ensemble: bool = False, window: int = 1):
+    """Decorator that adds a strategy function to STRATEGY_REGISTRY."""
+    if kind not in ("binary", "direction", "allocation"):
+        raise ValueError(f"Unknown strategy kind: {kind}")
+    
+    def decorator(func):
+        STRATEGY_REGISTRY[name] = RegisteredStrategy(name, func, kind, ensemble, window)
+        return func
+    return decorator
+
+
+def get_ensemble_strategies() -> List[RegisteredStrategy]:
+    return [s for s in STRATEGY_REGISTRY.values() if s.ensemble]
+
+
+@register_strategy("sma_crossover", kind="binary", ensemble=True)
 def strategy_sma_crossover(df: pd.DataFrame) -> pd.Series:
     """
     Classic SMA Crossover Strategy.
@@ -26,6 +71,7 @@ def strategy_sma_crossover(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+@register_strategy("rsi_reversion", kind="direction", ensemble=True)
 def strategy_rsi_mean_reversion(df: pd.DataFrame) -> pd.Series:
     """
     RSI Mean Reversion - good for sideways market.
@@ -39,6 +85,7 @@ def strategy_rsi_mean_reversion(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+@register_strategy("bollinger_squeeze", kind="allocation", window=20)
 def strategy_bollinger_squeeze(df: pd.DataFrame) -> pd.Series:
     """
     🏆 BEST STRATEGY for Thai market
@@ -58,31 +105,98 @@ def strategy_bollinger_squeeze(df: pd.DataFrame) -> pd.Series:
     return alloc
 
 
-def strategy_best_combo(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+@register_strategy("bollinger_bounce", kind="direction", ensemble=True)
+def strategy_bollinger_bounce(df: pd.DataFrame) -> pd.Series:
     """
-    Best combination strategy based on backtest results:
-    1. Bollinger Squeeze (primary)
-    2. Price > SMA50 (trend filter)
-    3. RSI filter (avoid overbought)
+    Bollinger Band bounce - mean reversion at the bands.
+    - Buy when price closes below the lower band (BB_Position < 0)
+    - Sell when price closes above the upper band (BB_Position > 1)
+    - Hold otherwise
     """
-    # Base allocation from BB Squeeze
-    bb_width_ma = df["BB_Width"].rolling(20).mean()
-    alloc = pd.Series(index=df.index, data=0.5)
-    alloc[df["BB_Width"] < bb_width_ma * 0.8] = 0.3
-    alloc[df["BB_Width"] > bb_width_ma * 1.2] = 0.7
-    alloc[df["BB_Width"] > bb_width_ma * 1.5] = 1.0
+    signal = pd.Series(index=df.index, data=0)
+    signal[df["BB_Position"] < 0] = 1
+    signal[df["BB_Position"] > 1] = -1
+    return signal
+
+
+BEST_COMBO_DEFAULTS: Dict[str, float] = {
+    "squeeze_mult": 0.8,            # BB_Width < MA * 0.8 → squeeze (30%)
+    "expansion_mult": 1.2,          # BB_Width > MA * 1.2 → expansion (70%)
+    "strong_expansion_mult": 1.5,   # BB_Width > MA * 1.5 → strong expansion (100%)
+    "rsi_overbought": 70.0,
+    "rsi_oversold": 30.0,
+    "trend_factor": 0.5,            # multiplier when Close < SMA50
+    "overbought_factor": 0.5,       # multiplier when RSI > overbought
+    "oversold_boost": 1.5,          # multiplier when RSI < oversold (capped at 100%)
+}
+
+
+def best_combo_allocation_array(
+    bb_width: np.ndarray,
+    bb_width_ma: np.ndarray,
+    close: np.ndarray,
+    sma_50: np.ndarray,
+    rsi: np.ndarray,
+    squeeze_mult: float = 0.8,
+    expansion_mult: float = 1.2,
+    strong_expansion_mult: float = 1.5,
+    rsi_overbought: float = 70.0,
+    rsi_oversold: float = 30.0,
+    trend_factor: float = 0.5,
+    overbought_factor: float = 0.5,
+    oversold_boost: float = 1.5
+) -> np.ndarray:
+    """
+    Allocation of strategy_best_combo on plain arrays.
+    Shared by the strategy and the parameter optimizer.
+    """
+    alloc = np.full(len(bb_width), 0.5)
+    alloc[bb_width < bb_width_ma * squeeze_mult] = 0.3
+    alloc[bb_width > bb_width_ma * expansion_mult] = 0.7
+    alloc[bb_width > bb_width_ma * strong_expansion_mult] = 1.0
     
     # Trend filter: reduce if below SMA50
-    below_sma50 = df["Close"] < df["SMA_50"]
-    alloc[below_sma50] = alloc[below_sma50] * 0.5  # Halve allocation
+    below_sma50 = close < sma_50
+    alloc[below_sma50] = alloc[below_sma50] * trend_factor
     
     # RSI filter: reduce if overbought
-    overbought = df["RSI"] > 70
-    alloc[overbought] = alloc[overbought] * 0.5
+    overbought = rsi > rsi_overbought
+    alloc[overbought] = alloc[overbought] * overbought_factor
     
     # Oversold boost
-    oversold = df["RSI"] < 30
-    alloc[oversold] = np.minimum(alloc[oversold] * 1.5, 1.0)
+    oversold = rsi < rsi_oversold
+    alloc[oversold] = np.minimum(alloc[oversold] * oversold_boost, 1.0)
+    
+    return alloc
+
+
+def strategy_best_combo(df: pd.DataFrame, **params) -> Tuple[pd.Series, pd.Series]:
+    """
+    Best combination strategy based on backtest results:
+    1. Bollinger Squeeze (primary)
+    2. Price > SMA50 (trend filter)
+    3. RSI filter (avoid overbought)
+    
+    Thresholds default to BEST_COMBO_DEFAULTS; any of them can be
+    overridden by keyword (see app.strategy_optimizer).
+    """
+    unknown = set(params) - set(BEST_COMBO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown best_combo parameters: {sorted(unknown)}")
+    
+    # Base allocation from BB Squeeze + trend/RSI filters
+    bb_width_ma = df["BB_Width"].rolling(20).mean()
+    alloc = pd.Series(
+        best_combo_allocation_array(
+            df["BB_Width"].to_numpy(dtype=float),
+            bb_width_ma.to_numpy(dtype=float),
+            df["Close"].to_numpy(dtype=float),
+            df["SMA_50"].to_numpy(dtype=float),
+            df["RSI"].to_numpy(dtype=float),
+            **params
+        ),
+        index=df.index
+    )
     
     # Calculate confidence based on signal alignment
     confidence = pd.Series(index=df.index, data=0.5)
@@ -100,6 +214,13 @@ def strategy_best_combo(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
     return alloc, confidence
 
 
+@register_strategy("best_combo", kind="allocation", window=20)
+def strategy_best_combo_allocation(df: pd.DataFrame) -> pd.Series:
+    """Allocation part of strategy_best_combo."""
+    return strategy_best_combo(df)[0]
+
+
+@register_strategy("macd_crossover", kind="binary", ensemble=True)
 def strategy_macd_crossover(df: pd.DataFrame) -> pd.Series:
     """
     MACD Crossover Strategy.
@@ -110,6 +231,7 @@ def strategy_macd_crossover(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+@register_strategy("momentum", kind="binary")
 def strategy_momentum(df: pd.DataFrame) -> pd.Series:
     """
     Momentum Strategy - follow the trend.
@@ -120,6 +242,7 @@ def strategy_momentum(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+@register_strategy("volatility_filter", kind="binary", window=50)
 def strategy_volatility_filter(df: pd.DataFrame) -> pd.Series:
     """
     Volatility Filter - reduce exposure during high volatility.
@@ -135,6 +258,7 @@ def strategy_volatility_filter(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+@register_strategy("trend_following", kind="direction", ensemble=True)
 def strategy_trend_following(df: pd.DataFrame) -> pd.Series:
     """
     Trend Following with multiple timeframes.
@@ -159,25 +283,21 @@ def strategy_trend_following(df: pd.DataFrame) -> pd.Series:
     return signal
 
 
+def _to_vote(values, kind: str):
+    """Put a strategy output on the ensemble's -1/0/1 scale."""
+    if kind == "binary":
+        return values * 2 - 1  # 0/1 → -1/1
+    return values
+
+
 def ensemble_strategy(df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
     """
     Ensemble of multiple strategies - vote system.
     Returns signal and confidence.
     """
-    strategies = {
-        "sma_cross": strategy_sma_crossover(df),
-        "rsi_reversion": strategy_rsi_mean_reversion(df),
-        "bb_bounce": strategy_bollinger_bounce(df),
-        "macd": strategy_macd_crossover(df),
-        "trend": strategy_trend_following(df),
-    }
-    
-    # Convert all to same scale (-1, 0, 1)
-    votes = pd.DataFrame(strategies)
-    
-    # Normalize SMA and MACD (they return 0/1, convert to -1/1)
-    votes["sma_cross"] = votes["sma_cross"] * 2 - 1
-    votes["macd"] = votes["macd"] * 2 - 1
+    votes = pd.DataFrame({
+        s.name: _to_vote(s.func(df), s.kind) for s in get_ensemble_strategies()
+    })
     
     # Calculate average vote
     avg_vote = votes.mean(axis=1)
@@ -215,64 +335,127 @@ def calculate_allocation_from_signal(signal: int, confidence: float) -> int:
         return 50
 
 
+def _latest_valid_position(df: pd.DataFrame, chunk: int = 64) -> int:
+    """
+    Position of the last row without NaN (same row as df.dropna().index[-1]).
+    Scans backwards from the end, so it usually touches only the last row.
+    """
+    end = len(df)
+    while end > 0:
+        start = max(0, end - chunk)
+        valid = df.iloc[start:end].notna().all(axis=1).to_numpy()
+        if valid.any():
+            return start + int(np.flatnonzero(valid)[-1])
+        end = start
+    raise IndexError("No complete row in DataFrame")
+
+
+def get_latest_signals(df: pd.DataFrame, strategies: Optional[List[RegisteredStrategy]] = None) -> Dict[str, float]:
+    """
+    Latest value of each strategy, evaluated on the trailing window only.
+    """
+    if strategies is None:
+        strategies = list(STRATEGY_REGISTRY.values())
+    
+    pos = _latest_valid_position(df)
+    window = max(s.window for s in strategies)
+    recent = df.iloc[max(0, pos + 1 - window):pos + 1]
+    return {s.name: s.latest(recent) for s in strategies}
+
+
 def get_strategy_signals(df: pd.DataFrame) -> Dict[str, Any]:
     """
     Get all strategy signals for the latest data point.
+    Only the trailing window of each strategy is evaluated.
     """
-    latest_idx = df.dropna().index[-1]
+    strategies = get_ensemble_strategies()
+    latest = get_latest_signals(df, strategies)
     
-    signals = {
-        "sma_crossover": int(strategy_sma_crossover(df).loc[latest_idx]),
-        "rsi_reversion": int(strategy_rsi_mean_reversion(df).loc[latest_idx]),
-        "bollinger_bounce": int(strategy_bollinger_bounce(df).loc[latest_idx]),
-        "macd_crossover": int(strategy_macd_crossover(df).loc[latest_idx]),
-        "trend_following": int(strategy_trend_following(df).loc[latest_idx]),
-    }
+    signals = {name: int(value) for name, value in latest.items()}
     
-    # Ensemble
-    ensemble_sig, ensemble_conf = ensemble_strategy(df)
+    # Ensemble (same vote as ensemble_strategy)
+    avg_vote = float(np.mean([_to_vote(signals[s.name], s.kind) for s in strategies]))
+    ensemble_sig = 1 if avg_vote > 0.2 else -1 if avg_vote < -0.2 else 0
     
     return {
         "individual_signals": signals,
-        "ensemble_signal": int(ensemble_sig.loc[latest_idx]),
-        "ensemble_confidence": float(ensemble_conf.loc[latest_idx]),
+        "ensemble_signal": ensemble_sig,
+        "ensemble_confidence": abs(avg_vote),
     }
 
 
+def strategy_positions(df: pd.DataFrame, strategies: Optional[List[RegisteredStrategy]] = None) -> pd.DataFrame:
+    """
+    Stack every strategy's position into a (time x strategy) frame.
+    Position is the equity fraction held for the next bar.
+    """
+    if strategies is None:
+        strategies = list(STRATEGY_REGISTRY.values())
+    
+    positions = {}
+    for s in strategies:
+        values = s.func(df).astype(float)
+        if s.kind == "direction":
+            values = (values >= 0).astype(float)  # sell = flat, hold/buy = invested
+        positions[s.name] = values
+    return pd.DataFrame(positions, index=df.index)
+
+
+def backtest_all_strategies(
+    df: pd.DataFrame,
+    strategies: Optional[List[RegisteredStrategy]] = None,
+    periods_per_year: int = 252
+) -> pd.DataFrame:
+    """
+    Backtest all strategies in one vectorized pass.
+    Returns one row of metrics per strategy.
+    """
+    positions = strategy_positions(df, strategies)
+    daily_return = df["Close"].pct_change()
+    
+    # Rows where every indicator is available (same rows as df.dropna())
+    valid = (df.notna().all(axis=1) & daily_return.notna()).to_numpy()
+    
+    P = positions.shift(1).to_numpy()[valid]          # position held over each bar
+    R = daily_return.to_numpy()[valid][:, None]       # (time x 1)
+    strat = np.nan_to_num(P) * R                      # (time x strategy)
+    
+    n = len(strat)
+    total_return = np.prod(1 + strat, axis=0) - 1
+    buy_hold_return = np.prod(1 + R[:, 0]) - 1
+    
+    # Win rate: invested and market up, or out and market not up
+    # (the first valid bar has no earlier signal in the window and never counts as a win)
+    wins = ((P[1:] > 0.5) == (R[1:] > 0)).sum(axis=0)
+    win_rate = wins / n if n > 0 else np.zeros(strat.shape[1])
+    
+    std = strat.std(axis=0, ddof=1) if n > 1 else np.zeros(strat.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, strat.mean(axis=0) / std * np.sqrt(periods_per_year), 0.0)
+    
+    max_drawdown = kernels.max_drawdown(np.cumprod(1 + strat, axis=0)) if n > 0 else np.zeros(strat.shape[1])
+    
+    return pd.DataFrame({
+        "total_return_pct": np.round(total_return * 100, 2),
+        "buy_hold_pct": np.round(buy_hold_return * 100, 2),
+        "outperformance_pct": np.round((total_return - buy_hold_return) * 100, 2),
+        "win_rate_pct": np.round(win_rate * 100, 2),
+        "sharpe_ratio": np.round(sharpe, 2),
+        "max_drawdown_pct": np.round(max_drawdown * 100, 2),
+        "avg_position_pct": np.round(np.nanmean(P, axis=0) * 100, 2),
+    }, index=positions.columns)
+
+
 def backtest_strategy(df: pd.DataFrame, strategy_func) -> Dict[str, float]:
     """
     Backtest a single strategy.
+    Position: 1 if signal >= 0, 0 if signal < 0
     """
-    df = df.copy()
-    df["Signal"] = strategy_func(df)
-    df["Daily_Return"] = df["Close"].pct_change()
-    
-    # Position: 1 if signal >= 0, 0 if signal < 0
-    df["Position"] = (df["Signal"] >= 0).astype(int)
-    
-    # Strategy return
-    df["Strategy_Return"] = df["Position"].shift(1) * df["Daily_Return"]
-    
-    df = df.dropna()
-    
-    # Metrics
-    total_return = (1 + df["Strategy_Return"]).prod() - 1
-    buy_hold_return = (1 + df["Daily_Return"]).prod() - 1
-    
-    # Win rate
-    wins = ((df["Signal"].shift(1) >= 0) & (df["Daily_Return"] > 0)).sum()
-    wins += ((df["Signal"].shift(1) < 0) & (df["Daily_Return"] <= 0)).sum()
-    win_rate = wins / len(df)
-    
-    # Sharpe
-    sharpe = df["Strategy_Return"].mean() / df["Strategy_Return"].std() * np.sqrt(252) if df["Strategy_Return"].std() > 0 else 0
-    
+    single = RegisteredStrategy(getattr(strategy_func, "__name__", "strategy"), strategy_func, "direction")
+    row = backtest_all_strategies(df, [single]).iloc[0]
     return {
-        "total_return_pct": round(total_return * 100, 2),
-        "buy_hold_pct": round(buy_hold_return * 100, 2),
-        "outperformance_pct": round((total_return - buy_hold_return) * 100, 2),
-        "win_rate_pct": round(win_rate * 100, 2),
-        "sharpe_ratio": round(sharpe, 2)
+        key: float(row[key])
+        for key in ["total_return_pct", "buy_hold_pct", "outperformance_pct", "win_rate_pct", "sharpe_ratio"]
     }
 
 
@@ -280,51 +463,33 @@ def backtest_best_strategy(df: pd.DataFrame) -> Dict[str, float]:
     """
     Backtest the best combo strategy (Bollinger Squeeze + filters).
     """
-    df = df.copy()
     alloc, confidence = strategy_best_combo(df)
-    df["Allocation"] = alloc
-    df["Confidence"] = confidence
-    df["Daily_Return"] = df["Close"].pct_change()
-    
-    # Strategy return
-    df["Strategy_Return"] = df["Allocation"].shift(1) * df["Daily_Return"]
+    daily_return = df["Close"].pct_change()
     
-    df = df.dropna()
+    # Rows kept by dropna() (indicators, allocation and return all available)
+    valid = (df.notna().all(axis=1) & confidence.notna() & daily_return.notna()).to_numpy()
+    held = alloc.shift(1).to_numpy()[valid]
+    returns = daily_return.to_numpy()[valid]
+    current = alloc.to_numpy()[valid]
     
     # Use last 20% for out-of-sample
-    split_idx = int(len(df) * 0.8)
-    test_df = df.iloc[split_idx:]
-    
-    # Metrics
-    total_return = (1 + test_df["Strategy_Return"]).prod() - 1
-    buy_hold_return = (1 + test_df["Daily_Return"]).prod() - 1
-    
-    # Win rate
-    correct = 0
-    for i in range(1, len(test_df)):
-        alloc_val = test_df["Allocation"].iloc[i-1]
-        ret = test_df["Daily_Return"].iloc[i]
-        if (alloc_val > 0.5 and ret > 0) or (alloc_val <= 0.5 and ret <= 0):
-            correct += 1
-    win_rate = correct / (len(test_df) - 1) if len(test_df) > 1 else 0
-    
-    # Sharpe
-    sharpe = test_df["Strategy_Return"].mean() / test_df["Strategy_Return"].std() * np.sqrt(252) if test_df["Strategy_Return"].std() > 0 else 0
-    
-    # Max drawdown
-    cumulative = (1 + test_df["Strategy_Return"]).cumprod()
-    rolling_max = cumulative.expanding().max()
-    drawdown = (cumulative - rolling_max) / rolling_max
-    max_dd = drawdown.min()
+    split_idx = int(len(returns) * 0.8)
+    held, returns, current = held[split_idx:], returns[split_idx:], current[split_idx:]
+    
+    # Win rate: previous row's allocation vs this row's return
+    result = run_backtest_arrays(
+        held, returns, periods_per_year=252,
+        bullish=current[:-1] > 0.5, went_up=returns[1:] > 0
+    )
     
     return {
-        "total_return_pct": round(total_return * 100, 2),
-        "buy_hold_pct": round(buy_hold_return * 100, 2),
-        "outperformance_pct": round((total_return - buy_hold_return) * 100, 2),
-        "win_rate_pct": round(win_rate * 100, 2),
-        "sharpe_ratio": round(sharpe, 2),
-        "max_drawdown_pct": round(max_dd * 100, 2),
-        "avg_allocation_pct": round(test_df["Allocation"].mean() * 100, 2)
+        "total_return_pct": round(result.total_return * 100, 2),
+        "buy_hold_pct": round(result.buy_hold_return * 100, 2),
+        "outperformance_pct": round(result.excess_return * 100, 2),
+        "win_rate_pct": round(result.win_rate * 100, 2),
+        "sharpe_ratio": round(result.sharpe_ratio, 2),
+        "max_drawdown_pct": round(result.max_drawdown * 100, 2),
+        "avg_allocation_pct": round(float(current.mean()) * 100, 2)
     }
 
 
@@ -0,0 +1,285 @@
+"""
+Parameter search for strategy_best_combo.
+
+Evaluates thousands of parameter sets across a process pool. The price and
+indicator arrays are placed once in shared memory; workers attach to it
+instead of receiving a pickled DataFrame per task. Each parameter set is
+scored on the same 80/20 in-sample / out-of-sample split used by
+backtest_best_strategy, and results are ranked by out-of-sample Sharpe.
+
+optimize_rule_weights searches the weights of MONTHLY_ALLOCATION_RULE
+instead: all weight sets are evaluated in one SignalRule.evaluate_batch call.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.backtest_engine import run_backtest_arrays
+from app.monthly_strategy import MONTHLY_ALLOCATION_RULE, monthly_rule_inputs
+from app.signal_rules import SignalRule
+from app.strategy import BEST_COMBO_DEFAULTS, best_combo_allocation_array
+
+
+DEFAULT_GRID: Dict[str, List[float]] = {
+    "squeeze_mult": [0.7, 0.8, 0.9],
+    "expansion_mult": [1.1, 1.2, 1.3],
+    "strong_expansion_mult": [1.4, 1.5, 1.7],
+    "rsi_overbought": [65.0, 70.0, 75.0],
+    "rsi_oversold": [25.0, 30.0, 35.0],
+    "trend_factor": [0.25, 0.5, 0.75],
+    "overbought_factor": [0.5, 0.75],
+    "oversold_boost": [1.0, 1.5, 2.0],
+}
+
+# (low, high) ranges for random search
+DEFAULT_SPACE: Dict[str, Tuple[float, float]] = {
+    "squeeze_mult": (0.6, 1.0),
+    "expansion_mult": (1.0, 1.4),
+    "strong_expansion_mult": (1.3, 2.0),
+    "rsi_overbought": (60.0, 80.0),
+    "rsi_oversold": (20.0, 40.0),
+    "trend_factor": (0.0, 1.0),
+    "overbought_factor": (0.0, 1.0),
+    "oversold_boost": (1.0, 2.5),
+}
+
+
+# ---------------------------------------------------------------- parameters
+def grid_parameters(grid: Optional[Dict[str, List[float]]] = None) -> List[Dict[str, float]]:
+    """Cartesian product of a parameter grid. Missing keys use the defaults."""
+    grid = DEFAULT_GRID if grid is None else grid
+    names = list(grid)
+    return [
+        {**BEST_COMBO_DEFAULTS, **dict(zip(names, values))}
+        for values in itertools.product(*(grid[n] for n in names))
+    ]
+
+
+def random_parameters(
+    n_samples: int,
+    space: Optional[Dict[str, Tuple[float, float]]] = None,
+    seed: int = 42
+) -> List[Dict[str, float]]:
+    """Uniform random samples from a parameter space."""
+    space = DEFAULT_SPACE if space is None else space
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(n_samples):
+        params = dict(BEST_COMBO_DEFAULTS)
+        for name, (low, high) in space.items():
+            params[name] = round(float(rng.uniform(low, high)), 4)
+        samples.append(params)
+    return samples
+
+
+# ------------------------------------------------------------------- arrays
+def prepare_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, int]:
+    """
+    Stack the inputs of strategy_best_combo into one (fields x time) array:
+    bb_width, bb_width_ma, close, sma_50, rsi, daily_return, valid.
+    `valid` marks the rows kept by backtest_best_strategy (df.dropna()).
+    Returns the array and the out-of-sample split index (over valid rows).
+    """
+    bb_width_ma = df["BB_Width"].rolling(20).mean()
+    daily_return = df["Close"].pct_change()
+    valid = (df.notna().all(axis=1) & daily_return.notna()).to_numpy()
+
+    arrays = np.vstack([
+        df["BB_Width"].to_numpy(dtype=float),
+        bb_width_ma.to_numpy(dtype=float),
+        df["Close"].to_numpy(dtype=float),
+        df["SMA_50"].to_numpy(dtype=float),
+        df["RSI"].to_numpy(dtype=float),
+        daily_return.to_numpy(dtype=float),
+    ])
+    n_valid = int(valid.sum())
+    split_idx = int(n_valid * 0.8)
+
+    # Store the mask as an extra row so workers only need one buffer
+    return np.vstack([arrays, valid.astype(float)]), split_idx
+
+
+def _metrics(alloc_prev: np.ndarray, daily_return: np.ndarray, periods_per_year: int = 252) -> Dict[str, float]:
+    """Metrics of backtest_best_strategy for one segment."""
+    result = run_backtest_arrays(
+        alloc_prev, daily_return, periods_per_year=periods_per_year,
+        bullish=alloc_prev[1:] > 0.5, went_up=daily_return[1:] > 0
+    )
+    return {
+        "total_return_pct": round(result.total_return * 100, 2),
+        "sharpe_ratio": round(result.sharpe_ratio, 2),
+        "max_drawdown_pct": round(result.max_drawdown * 100, 2),
+        "win_rate_pct": round(result.win_rate * 100, 2),
+    }
+
+
+def evaluate_parameters(arrays: np.ndarray, split_idx: int, params: Dict[str, float]) -> Dict[str, Any]:
+    """Score one parameter set on in-sample and out-of-sample segments."""
+    bb_width, bb_width_ma, close, sma_50, rsi, daily_return, valid = arrays
+    alloc = best_combo_allocation_array(bb_width, bb_width_ma, close, sma_50, rsi, **params)
+
+    # Allocation held over each bar = previous bar's allocation (row 0 is never valid)
+    mask = valid > 0.5
+    alloc_prev = np.roll(alloc, 1)[mask]
+    returns = daily_return[mask]
+
+    in_sample = _metrics(alloc_prev[:split_idx], returns[:split_idx])
+    out_sample = _metrics(alloc_prev[split_idx:], returns[split_idx:])
+
+    result = dict(params)
+    result.update({f"is_{k}": v for k, v in in_sample.items()})
+    result.update({f"oos_{k}": v for k, v in out_sample.items()})
+    oos_alloc = alloc[mask][split_idx:]
+    result["oos_avg_allocation_pct"] = round(float(oos_alloc.mean()) * 100, 2) if len(oos_alloc) else 0.0
+    return result
+
+
+# ------------------------------------------------------------- worker side
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_arrays: Optional[np.ndarray] = None
+_worker_split: int = 0
+
+
+def _init_worker(shm_name: str, shape: Tuple[int, int], split_idx: int) -> None:
+    global _worker_shm, _worker_arrays, _worker_split
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_arrays = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    _worker_split = split_idx
+
+
+def _evaluate_chunk(chunk: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+    return [evaluate_parameters(_worker_arrays, _worker_split, params) for params in chunk]
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ----------------------------------------------------------------- search
+def optimize(
+    df: pd.DataFrame,
+    parameter_sets: List[Dict[str, float]],
+    workers: Optional[int] = None,
+    chunk_size: int = 200,
+    top_n: Optional[int] = 20
+) -> pd.DataFrame:
+    """
+    Evaluate parameter sets in parallel and rank by out-of-sample Sharpe.
+
+    Args:
+        df: DataFrame with technical indicators (add_technical_indicators)
+        parameter_sets: from grid_parameters() / random_parameters()
+        workers: process count (default: os.cpu_count()); 1 = run in-process
+        chunk_size: parameter sets per task
+        top_n: rows to return (None = all)
+    """
+    arrays, split_idx = prepare_arrays(df)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    if workers == 1:
+        results = [evaluate_parameters(arrays, split_idx, p) for p in parameter_sets]
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+        try:
+            shared = np.ndarray(arrays.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = arrays
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(shm.name, arrays.shape, split_idx)
+            ) as pool:
+                results = [
+                    row
+                    for rows in pool.map(_evaluate_chunk, _chunks(parameter_sets, chunk_size))
+                    for row in rows
+                ]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(results)} parameter sets in {elapsed:.1f}s ({workers} workers)")
+
+    ranked = pd.DataFrame(results).sort_values(
+        ["oos_sharpe_ratio", "oos_total_return_pct"], ascending=False
+    ).reset_index(drop=True)
+    return ranked if top_n is None else ranked.head(top_n)
+
+
+# ------------------------------------------------------ signal-rule weights
+def rule_weight_sets(
+    rule: SignalRule = MONTHLY_ALLOCATION_RULE,
+    n_samples: int = 1000,
+    spread: float = 0.5,
+    seed: int = 42
+) -> np.ndarray:
+    """
+    Random weight vectors around the rule's defaults: each weight is scaled
+    by uniform(1 - spread, 1 + spread). Row 0 is the default vector.
+    """
+    rng = np.random.default_rng(seed)
+    base = rule.parameters()
+    factors = rng.uniform(1 - spread, 1 + spread, size=(n_samples, len(base)))
+    return np.vstack([base, np.round(base * factors, 4)])
+
+
+def optimize_rule_weights(
+    monthly: pd.DataFrame,
+    weight_sets: np.ndarray,
+    top_n: Optional[int] = 20
+) -> pd.DataFrame:
+    """
+    Rank weight sets of MONTHLY_ALLOCATION_RULE by out-of-sample Sharpe.
+
+    Uses the allocations, returns and 50/50 split of backtest_monthly_strategy
+    (first 12 months held at 50%). Allocations for every set come from one
+    evaluate_batch call; "set" 0 is the rule's default weights when
+    weight_sets comes from rule_weight_sets().
+
+    Args:
+        monthly: output of create_monthly_data
+        weight_sets: (n_sets x MONTHLY_ALLOCATION_RULE.n_parameters)
+        top_n: rows to return (None = all)
+    """
+    rule = MONTHLY_ALLOCATION_RULE
+    weight_sets = np.atleast_2d(np.asarray(weight_sets, dtype=float))
+    start = time.perf_counter()
+
+    allocations = rule.evaluate_batch(monthly_rule_inputs(monthly), weight_sets) / 100
+    allocations[:, :12] = 0.5
+
+    # Rows backtest_monthly_strategy keeps after dropna (row 0 has no held allocation)
+    monthly_return = monthly["Close"].pct_change().to_numpy()
+    valid = monthly.notna().all(axis=1).to_numpy() & ~np.isnan(monthly_return)
+    valid[0] = False
+    returns = monthly_return[valid]
+    split_idx = int(len(returns) * 0.5)
+
+    names = rule.parameter_names()
+    results = []
+    for i, weights in enumerate(weight_sets):
+        alloc_prev = np.roll(allocations[i], 1)[valid]
+        in_sample = _metrics(alloc_prev[:split_idx], returns[:split_idx], periods_per_year=12)
+        out_sample = _metrics(alloc_prev[split_idx:], returns[split_idx:], periods_per_year=12)
+        result = {"set": i, **dict(zip(names, weights.tolist()))}
+        result.update({f"is_{k}": v for k, v in in_sample.items()})
+        result.update({f"oos_{k}": v for k, v in out_sample.items()})
+        result["oos_avg_allocation_pct"] = round(float(allocations[i][valid][split_idx:].mean()) * 100, 2)
+        results.append(result)
+
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(results)} weight sets in {elapsed:.1f}s")
+
+    ranked = pd.DataFrame(results).sort_values(
+        ["oos_sharpe_ratio", "oos_total_return_pct"], ascending=False
+    ).reset_index(drop=True)
+    return ranked if top_n is None else ranked.head(top_n)
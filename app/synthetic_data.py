@@ -0,0 +1,224 @@
+"""
+Synthetic market data for offline runs and scale testing.
+
+Frames match fetch_stock_data exactly: columns Date, Open, High, Low, Close,
+Volume, Dividends, Stock Splits, one row per business day, tz-naive Date.
+
+Return models:
+    gbm      geometric Brownian motion (constant drift and volatility)
+    regime   two-state Markov switching between a bull and a bear regime
+    garch    GARCH(1,1) volatility clustering with fat-tailed shocks
+
+The same (ticker, seed, model, length, end date) always gives the same frame.
+Real SET history is ~40 years; scale tests can ask for 10-100x longer series
+(PEA_SYNTHETIC_YEARS) or many tickers (generate_universe). Dates use
+microsecond resolution, so series may start long before 1678.
+"""
+
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+TRADING_DAYS = 252
+MODELS = ("gbm", "regime", "garch")
+
+# Annualized defaults, roughly SET-like
+DEFAULT_DRIFT = 0.07
+DEFAULT_VOLATILITY = 0.18
+MAX_GROWTH_YEARS = 200
+
+# regime: (annual drift, annual vol) per state and daily switch probabilities
+REGIMES = {"bull": (0.15, 0.14), "bear": (-0.20, 0.30)}
+BULL_TO_BEAR = 1 / 500    # bull markets last ~2 years on average
+BEAR_TO_BULL = 1 / 150    # bear markets ~7 months
+
+# garch: sigma2[t] = omega + alpha * eps[t-1]^2 + beta * sigma2[t-1]
+GARCH_ALPHA = 0.08
+GARCH_BETA = 0.90
+GARCH_DF = 5              # Student-t degrees of freedom of the shocks
+
+
+def ticker_seed(ticker: str, seed: int = 0) -> int:
+    """Stable per-ticker seed (independent of PYTHONHASHSEED)."""
+    return (zlib.crc32(ticker.encode("utf-8")) + seed * 1_000_003) % (2 ** 32)
+
+
+def generate_returns(
+    n_days: int,
+    model: str = "regime",
+    seed: Optional[int] = 0,
+    drift: float = DEFAULT_DRIFT,
+    volatility: float = DEFAULT_VOLATILITY
+) -> np.ndarray:
+    """Daily log returns from one of MODELS."""
+    if model not in MODELS:
+        raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+    rng = np.random.default_rng(seed)
+
+    if model == "gbm":
+        mu = drift / TRADING_DAYS
+        sigma = volatility / np.sqrt(TRADING_DAYS)
+        return rng.normal(mu - 0.5 * sigma ** 2, sigma, n_days)
+
+    if model == "regime":
+        # Regime path from uniform draws, then per-state drift / vol
+        switch = rng.random(n_days)
+        state = np.empty(n_days, dtype=np.int8)   # 0 = bull, 1 = bear
+        current = 0
+        for t in range(n_days):
+            if current == 0 and switch[t] < BULL_TO_BEAR:
+                current = 1
+            elif current == 1 and switch[t] < BEAR_TO_BULL:
+                current = 0
+            state[t] = current
+        params = np.array([REGIMES["bull"], REGIMES["bear"]])
+        # Shift both regimes so the long-run drift equals `drift`
+        bull_share = BEAR_TO_BULL / (BULL_TO_BEAR + BEAR_TO_BULL)
+        long_run = bull_share * params[0, 0] + (1 - bull_share) * params[1, 0]
+        mu = (params[state, 0] + drift - long_run) / TRADING_DAYS
+        sigma = params[state, 1] / np.sqrt(TRADING_DAYS)
+        return mu - 0.5 * sigma ** 2 + sigma * rng.standard_normal(n_days)
+
+    # garch: unit-variance Student-t shocks, long-run variance = volatility^2
+    long_run = volatility ** 2 / TRADING_DAYS
+    omega = long_run * (1 - GARCH_ALPHA - GARCH_BETA)
+    shocks = (rng.standard_t(GARCH_DF, n_days) * np.sqrt((GARCH_DF - 2) / GARCH_DF)).tolist()
+    out = np.empty(n_days)
+    variance, prev_eps = long_run, 0.0
+    mu = drift / TRADING_DAYS
+    for t in range(n_days):
+        variance = omega + GARCH_ALPHA * prev_eps * prev_eps + GARCH_BETA * variance
+        prev_eps = np.sqrt(variance) * shocks[t]
+        out[t] = mu - 0.5 * variance + prev_eps
+    return out
+
+
+def business_days(
+    n_days: int,
+    start: Optional[Union[str, pd.Timestamp]] = None,
+    end: Optional[Union[str, pd.Timestamp]] = None
+) -> pd.DatetimeIndex:
+    """
+    n_days Mon-Fri dates from start, or ending on/before end.
+    Same result as pd.bdate_range, without its per-date offset arithmetic.
+    """
+    span = n_days * 7 // 5 + 7  # calendar days that surely hold n_days weekdays
+    if end is not None:
+        last = np.datetime64(pd.Timestamp(end).normalize().date(), "D")
+        days = np.arange(last - span + 1, last + 1)
+        days = days[np.is_busday(days)][-n_days:]
+    else:
+        first = np.datetime64(pd.Timestamp(start).normalize().date(), "D")
+        days = np.arange(first, first + span)
+        days = days[np.is_busday(days)][:n_days]
+    return pd.DatetimeIndex(days.astype("datetime64[us]"))
+
+
+def generate_ohlcv(
+    n_days: int,
+    model: str = "regime",
+    seed: Optional[int] = 0,
+    start_price: float = 1000.0,
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    start: Union[str, pd.Timestamp] = "1990-01-01",
+    drift: float = DEFAULT_DRIFT,
+    volatility: float = DEFAULT_VOLATILITY
+) -> pd.DataFrame:
+    """
+    One synthetic daily OHLCV history in fetch_stock_data format.
+
+    Args:
+        n_days: number of business days
+        model: "gbm", "regime" or "garch"
+        end: last date (business days counted back from it); otherwise
+             the series starts at `start`
+    """
+    returns = generate_returns(n_days, model, seed, drift, volatility)
+    rng = np.random.default_rng(None if seed is None else seed + 1)
+
+    dates = business_days(n_days, start=None if end is not None else start, end=end)
+
+    close = start_price * np.exp(np.cumsum(returns))
+    prev_close = np.concatenate(([start_price], close[:-1]))
+
+    # Overnight gap, then an intraday range that widens with the day's move
+    day_sigma = np.abs(returns) + volatility / np.sqrt(TRADING_DAYS) * 0.5
+    open_ = prev_close * np.exp(rng.normal(0, 0.25, n_days) * day_sigma)
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.5, n_days)) * day_sigma)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.5, n_days)) * day_sigma)
+
+    # Volume: lognormal, busier on large moves
+    move = np.abs(returns) / (volatility / np.sqrt(TRADING_DAYS))
+    volume = np.round(np.exp(rng.normal(15, 0.3, n_days)) * (1 + 0.5 * move))
+
+    return pd.DataFrame({
+        "Date": dates,
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Volume": volume.astype(np.int64),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    })
+
+
+@lru_cache(maxsize=32)
+def _cached_history(ticker: str, n_days: int, model: str, seed: int, end: str, years: int) -> pd.DataFrame:
+    rng = np.random.default_rng(ticker_seed(ticker, seed))
+    start_price = float(rng.uniform(50, 2000))
+    # Keep total growth of very long series within ~MAX_GROWTH_YEARS of drift,
+    # so prices stay in float32 range for the models
+    drift = DEFAULT_DRIFT * min(1.0, MAX_GROWTH_YEARS / years)
+    return generate_ohlcv(n_days, model, ticker_seed(ticker, seed), start_price=start_price, end=end, drift=drift)
+
+
+def period_to_days(period: str, max_days: int) -> int:
+    """yfinance period ("max", "5y", "6mo", "250d", ...) in business days."""
+    if period == "max":
+        return max_days
+    for suffix, days in (("mo", 21), ("y", TRADING_DAYS), ("wk", 5), ("d", 1)):
+        if period.endswith(suffix):
+            count = int(period[:-len(suffix)])
+            # "Nd" is N trading sessions, like yfinance
+            return max(1, min(max_days, count * days))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def synthetic_stock_data(
+    ticker: str,
+    period: str = "max",
+    years: int = 40,
+    model: str = "regime",
+    seed: int = 0,
+    end: Optional[Union[str, pd.Timestamp]] = None
+) -> pd.DataFrame:
+    """
+    Offline replacement for fetch_stock_data. Shorter periods are the tail of
+    the same "max" history, as with real data.
+    """
+    end = pd.Timestamp.today() if end is None else pd.Timestamp(end)
+    max_days = years * TRADING_DAYS
+    full = _cached_history(ticker, max_days, model, seed, end.strftime("%Y-%m-%d"), years)
+    n_days = period_to_days(period, max_days)
+    return full.iloc[-n_days:].reset_index(drop=True).copy()
+
+
+def generate_universe(
+    tickers: Union[int, Iterable[str]],
+    years: int = 40,
+    model: str = "regime",
+    seed: int = 0,
+    end: Optional[Union[str, pd.Timestamp]] = None
+) -> Dict[str, pd.DataFrame]:
+    """Independent histories for many tickers (an int gives SYN0000.BK, ...)."""
+    if isinstance(tickers, int):
+        tickers = [f"SYN{i:04d}.BK" for i in range(tickers)]
+    return {
+        ticker: synthetic_stock_data(ticker, "max", years, model, seed, end)
+        for ticker in tickers
+    }
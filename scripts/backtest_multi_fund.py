@@ -0,0 +1,47 @@
+"""
+Backtest 4-Fund Allocation
+ทดสอบย้อนหลังสัดส่วน PEA-F/E/G/P ทั้ง 3 โหมดความเสี่ยง (มี/ไม่มี smoothing)
+
+Usage:
+    python scripts/backtest_multi_fund.py
+    python scripts/backtest_multi_fund.py --alpha 0.5 --no-rounding
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.multi_fund_predictor import MultiFundPredictor, FUNDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historical backtest of the 4-fund allocation")
+    parser.add_argument("--alpha", type=float, default=None, help="smoothing factor (default: settings.ALLOCATION_SMOOTHING)")
+    parser.add_argument("--no-rounding", action="store_true", help="plain EMA without integer rounding")
+    args = parser.parse_args()
+
+    predictor = MultiFundPredictor()
+    result = predictor.backtest_allocation(alpha=args.alpha, round_allocations=not args.no_rounding)
+
+    period = result["period"]
+    print("=" * 60)
+    print(f"4-Fund Backtest {period['start']} → {period['end']} ({period['months']} months)")
+    print(f"Smoothing: {result['smoothing']}")
+    print("=" * 60)
+
+    for profile, variants in result["profiles"].items():
+        print(f"\n{profile}:")
+        for variant, m in variants.items():
+            alloc = " ".join(f"{f}={m['avg_allocation'][f]:.0f}%" for f in FUNDS)
+            print(
+                f"  {variant:10s} return={m['total_return_pct']:8.2f}% "
+                f"annual={m['annual_return_pct']:6.2f}% sharpe={m['sharpe_ratio']:5.2f} "
+                f"maxDD={m['max_drawdown_pct']:7.2f}% turnover={m['avg_monthly_turnover_pct']:5.2f}%/m"
+            )
+            print(f"  {'':10s} avg {alloc}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark the analytics hot paths
+จับเวลาและหน่วยความจำสูงสุด (peak) ของฟังก์ชันหลัก บนข้อมูลสังเคราะห์ 5/30/100 ปี
+แล้วเทียบกับ baseline ที่บันทึกไว้ (exit 1 ถ้าช้าลง/ใช้หน่วยความจำเกิน tolerance)
+baseline ขึ้นกับเครื่อง: ให้ --save-baseline ใหม่เมื่อเปลี่ยนเครื่องที่ใช้วัด
+
+Usage:
+    python scripts/benchmark_hot_paths.py
+    python scripts/benchmark_hot_paths.py --sizes 5,30 --repeats 3
+    python scripts/benchmark_hot_paths.py --save-baseline
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.backtest import run_backtest
+from app.config import FEATURE_COLUMNS
+from app.feature_engineering import add_technical_indicators, create_target
+from app.instrumentation import compare_to_baseline
+from app.monthly_ml import MonthlyMLPredictor, create_monthly_data_for_ml
+from app.monthly_strategy import create_monthly_data, backtest_monthly_strategy
+from app.synthetic_data import generate_ohlcv
+
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+
+
+def build_cases(years: int, model_dir: Path) -> List[Tuple[str, Callable[[], object]]]:
+    """Fixtures and trained models are prepared here, outside the timings."""
+    from xgboost import XGBClassifier
+
+    daily = generate_ohlcv(252 * years, model="gbm", seed=0, start="1925-01-01")
+    indicators = add_technical_indicators(daily)
+    targeted = create_target(indicators).dropna(subset=FEATURE_COLUMNS + ["Target"])
+
+    daily_model = XGBClassifier(n_estimators=50, max_depth=3, random_state=42, verbosity=0)
+    daily_model.fit(targeted[FEATURE_COLUMNS], targeted["Target"])
+
+    monthly_ml = create_monthly_data_for_ml(daily)
+    predictor = MonthlyMLPredictor(model_path=str(model_dir / "models" / f"monthly_ml_{years}y.joblib"))
+    predictor.train(monthly_ml)
+
+    monthly = create_monthly_data(daily)
+
+    return [
+        ("add_technical_indicators", lambda: add_technical_indicators(daily)),
+        ("create_target", lambda: create_target(indicators)),
+        ("MonthlyMLPredictor.create_features", lambda: predictor.create_features(monthly_ml)),
+        ("MonthlyMLPredictor.predict", lambda: predictor.predict(monthly_ml)),
+        ("MonthlyMLPredictor.backtest", lambda: predictor.backtest(monthly_ml)),
+        ("backtest_monthly_strategy", lambda: backtest_monthly_strategy(monthly)),
+        ("run_backtest", lambda: run_backtest(targeted, daily_model)),
+    ]
+
+
+def _timed(func: Callable[[], object]) -> float:
+    # Like timeit: no GC pauses inside the timed call
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+    finally:
+        gc.enable()
+
+
+def _peak_kb(func: Callable[[], object]) -> float:
+    # Separate run: tracemalloc slows allocation-heavy code
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def measure(cases: List[Tuple[str, Callable[[], object]]], repeats: int) -> Dict[str, Dict[str, float]]:
+    """
+    Median / min wall time (ms) and peak traced memory (KB) per case.
+    Cases are timed in interleaved rounds so a slow phase of the machine
+    hits every case once instead of all repeats of one case.
+    """
+    for _, func in cases:
+        func()  # warm-up
+    times: Dict[str, List[float]] = {name: [] for name, _ in cases}
+    for _ in range(repeats):
+        for name, func in cases:
+            times[name].append(_timed(func))
+    return {
+        name: {
+            "median_ms": round(statistics.median(times[name]), 3),
+            "min_ms": round(min(times[name]), 3),
+            "peak_kb": round(_peak_kb(func), 1),
+        }
+        for name, func in cases
+    }
+
+
+def compare(results: Dict, baseline: Dict, time_tolerance: float, memory_tolerance: float, min_delta_ms: float) -> List[str]:
+    """Regressions per fixture size (time uses min_ms, the least noisy)."""
+    regressions = []
+    for size, cases in results.items():
+        regressions += [
+            f"{size} {line}"
+            for line in compare_to_baseline(
+                cases, baseline.get(size, {}), "min_ms", time_tolerance, memory_tolerance, min_delta_ms
+            )
+        ]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and peak memory of the analytics hot paths")
+    parser.add_argument("--sizes", default="5,30,100", help="fixture sizes in years of daily data")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--only", default=None, help="run only cases whose name contains this text")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.50, help="allowed slowdown (0.50 = +50%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns below this")
+    parser.add_argument("--memory-tolerance", type=float, default=0.20, help="allowed peak memory growth")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    print("=" * 72)
+    print(f"Hot path benchmark (repeats={args.repeats}, python {platform.python_version()})")
+    print("=" * 72)
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as model_dir:
+        # MonthlyMLPredictor saves its scaler under ./models: keep it out of the repo
+        os.chdir(model_dir)
+        try:
+            for years in sizes:
+                size = f"{years}y"
+                print(f"\n{size} ({252 * years} daily bars)")
+                with contextlib.redirect_stdout(io.StringIO()):  # training logs
+                    cases = build_cases(years, Path(model_dir))
+                cases = [(name, func) for name, func in cases if not args.only or args.only in name]
+                results[size] = measure(cases, args.repeats)
+                for name, stats in results[size].items():
+                    print(f"  {name:36s} {stats['median_ms']:9.2f} ms (min {stats['min_ms']:.2f})  peak {stats['peak_kb']:9.0f} KB")
+        finally:
+            os.chdir(cwd)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline} (run with --save-baseline)")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance, args.min_delta_ms)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
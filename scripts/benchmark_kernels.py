@@ -0,0 +1,123 @@
+"""
+Benchmark and parity check for app/kernels.py
+เทียบผลลัพธ์และความเร็วระหว่าง Python loop (แบบเดิม), NumPy และ Numba (ถ้าติดตั้ง)
+
+Usage:
+    python scripts/benchmark_kernels.py
+    python scripts/benchmark_kernels.py --size 100000 --repeats 20
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import kernels
+
+
+# Reference implementations: the original Python loops
+def compound_loop(returns, initial):
+    out, capital = [], initial
+    for r in returns:
+        capital = capital * (1 + r)
+        out.append(capital)
+    return np.array(out)
+
+
+def ema_loop(values, alpha, initial):
+    out, prev = [], initial
+    for v in values:
+        prev = alpha * prev + (1 - alpha) * v
+        out.append(prev)
+    return np.array(out)
+
+
+def drawdown_loop(equity):
+    out, peak = [], equity[0]
+    for v in equity:
+        peak = max(peak, v)
+        out.append((v - peak) / peak)
+    return np.array(out)
+
+
+def forward_max_drop_loop(close, lookahead):
+    out = []
+    for i in range(len(close)):
+        if i + lookahead < len(close):
+            min_future = np.nanmin(close[i + 1:i + lookahead + 1])
+            out.append((min_future - close[i]) / close[i] * 100)
+        else:
+            out.append(np.nan)
+    return np.array(out)
+
+
+def timed(func, repeats):
+    func()  # warm-up (JIT compile)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kernel parity and timing")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0005, 0.012, args.size)
+    close = 100 * np.cumprod(1 + returns)
+    equity = kernels.compound(returns)
+    alloc = rng.uniform(0, 100, (args.size, 4))
+
+    backends = ["numpy"] + (["numba"] if kernels.HAS_NUMBA else [])
+    cases = {
+        "compound": (
+            lambda b: kernels.compound(returns, 1000.0, backend=b),
+            lambda: compound_loop(returns, 1000.0),
+        ),
+        "ema_smooth": (
+            lambda b: kernels.ema_smooth(alloc, 0.7, initial=alloc[0], backend=b),
+            lambda: np.column_stack([ema_loop(alloc[:, j], 0.7, alloc[0, j]) for j in range(alloc.shape[1])]),
+        ),
+        "running_drawdown": (
+            lambda b: kernels.running_drawdown(equity, backend=b),
+            lambda: drawdown_loop(equity),
+        ),
+        "forward_max_drop": (
+            lambda b: kernels.forward_max_drop(close, 5, backend=b),
+            lambda: forward_max_drop_loop(close, 5),
+        ),
+    }
+
+    print("=" * 60)
+    print(f"Kernel benchmark (n={args.size}, numba={'yes' if kernels.HAS_NUMBA else 'no'})")
+    print("=" * 60)
+
+    failed = False
+    for name, (kernel, reference) in cases.items():
+        expected = reference()
+        timings = {"loop": timed(reference, max(1, args.repeats // 5))}
+        for backend in backends:
+            result = kernel(backend)
+            same = np.array_equal(result, expected, equal_nan=True)
+            close_enough = np.allclose(result, expected, rtol=1e-12, atol=0, equal_nan=True)
+            status = "exact" if same else ("close" if close_enough else "MISMATCH")
+            failed |= not close_enough
+            timings[backend] = timed(lambda: kernel(backend), args.repeats)
+            print(f"{name:18s} {backend:6s} parity={status}")
+        print("   " + "  ".join(f"{k}={v:.3f}ms" for k, v in timings.items()))
+
+    if failed:
+        print("\nParity check FAILED")
+        sys.exit(1)
+    print("\nAll kernels match the reference loops")
+
+
+if __name__ == "__main__":
+    main()
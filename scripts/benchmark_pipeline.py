@@ -0,0 +1,124 @@
+"""
+Benchmark the full daily_update pipeline
+รัน run_daily_update ทั้ง flow (fetch → resample → predict → trend → risk →
+multi-fund → backtest → เขียน JSON) บนข้อมูลสังเคราะห์ในโฟลเดอร์ชั่วคราว
+แล้วแสดงเวลา/หน่วยความจำของแต่ละ stage และเทียบกับ baseline (exit 1 ถ้าช้าลงเกิน threshold)
+
+The first run trains the model and builds the backtest store (reported
+separately); the timed runs are the steady state of the scheduled job.
+
+Usage:
+    python scripts/benchmark_pipeline.py
+    python scripts/benchmark_pipeline.py --repeats 10 --tolerance 0.3
+    python scripts/benchmark_pipeline.py --save-baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).parent))
+
+DEFAULT_BASELINE = Path(__file__).parent / "pipeline_baseline.json"
+
+
+def run_once(run_daily_update, output_file: Path, track_memory: bool = False):
+    from app.instrumentation import StageTimer
+
+    with contextlib.redirect_stdout(io.StringIO()) as log, StageTimer(track_memory=track_memory) as timer:
+        # Stage cache off: every run must compute every stage to be comparable
+        result = run_daily_update(output_file=output_file, timer=timer, use_cache=False)
+    if result is None:
+        print(log.getvalue())
+        raise SystemExit("run_daily_update failed (log above)")
+    return timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage timing of run_daily_update on local fixture data")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs after the warm-up run")
+    parser.add_argument("--years", type=int, default=40, help="years of synthetic daily history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.50, help="allowed slowdown per stage (0.50 = +50%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns below this")
+    parser.add_argument("--memory-tolerance", type=float, default=0.30, help="allowed peak memory growth per stage")
+    args = parser.parse_args()
+
+    # Offline fixture data; must be set before app.config is imported
+    os.environ["PEA_DATA_SOURCE"] = "synthetic"
+    os.environ["PEA_SYNTHETIC_YEARS"] = str(args.years)
+    os.environ["PEA_SYNTHETIC_SEED"] = str(args.seed)
+    os.environ["PEA_DATA_CACHE_TTL"] = "0"
+
+    from app.instrumentation import compare_to_baseline
+    from daily_update import run_daily_update
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # models/ (model, allocation history, backtest store) is relative to cwd
+        os.chdir(workdir)
+        try:
+            output_file = Path(workdir) / "prediction.json"
+            cold = run_once(run_daily_update, output_file)
+            runs = [run_once(run_daily_update, output_file) for _ in range(args.repeats)]
+            memory = run_once(run_daily_update, output_file, track_memory=True)
+        finally:
+            os.chdir(cwd)
+
+    stages = {}
+    for name in memory.stages:
+        times = [run.stages[name]["ms"] for run in runs if name in run.stages]
+        stages[name] = {
+            "min_ms": round(min(times), 3),
+            "median_ms": round(sorted(times)[len(times) // 2], 3),
+            "peak_kb": round(memory.stages[name]["peak_kb"], 1),
+            "net_kb": round(memory.stages[name]["net_kb"], 1),
+        }
+    total_ms = min(run.total_ms for run in runs)
+
+    print("=" * 75)
+    print(f"daily_update pipeline ({args.years}y synthetic, {args.repeats} runs)")
+    print("=" * 75)
+    print(f"{'stage':20s} {'min ms':>10s} {'median ms':>10s} {'peak KB':>12s} {'net KB':>10s}")
+    for name, stats in stages.items():
+        print(f"{name:20s} {stats['min_ms']:10.2f} {stats['median_ms']:10.2f} "
+              f"{stats['peak_kb']:12.0f} {stats['net_kb']:10.0f}")
+    print(f"{'total':20s} {total_ms:10.2f}")
+    print(f"\nCold run (trains the model): {cold.total_ms:.0f} ms")
+
+    results = {"stages": stages, "total_ms": round(total_ms, 3)}
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline} (run with --save-baseline)")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(
+        stages, baseline.get("stages", {}), "min_ms",
+        args.tolerance, args.memory_tolerance, args.min_delta_ms
+    )
+    if regressions:
+        print("\nStage regressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo stage regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
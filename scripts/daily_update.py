@@ -7,13 +7,23 @@ Daily Update Script
 4. สร้าง backtest results
 5. บันทึกเป็น JSON
 
+ขั้นตอนถูกเขียนเป็น DAG (build_pipeline): ส่วนที่ไม่ขึ้นต่อกันรันพร้อมกัน และ
+ผลของ stage ที่ input ไม่เปลี่ยนจะถูกใช้ซ้ำจาก models/pipeline_cache
+
 Usage:
     python scripts/daily_update.py
+    python scripts/daily_update.py --track-memory --report run_report.json
+    python scripts/daily_update.py --memory-budget-mb 512   # exit 1 if a stage exceeds it
+    python scripts/daily_update.py --no-ledger               # skip the run ledger (models/run_ledger.sqlite)
+    python scripts/daily_update.py --workers 1 --no-stage-cache   # sequential, recompute every stage
+    PEA_DEBUG_CALLS=1 python scripts/daily_update.py   # report redundant calls
 """
 
+import argparse
 import json
 import sys
 import io
+import time
 from datetime import datetime
 from pathlib import Path
 import numpy as np
@@ -29,10 +39,16 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.data_fetcher import fetch_stock_data
 from app.monthly_ml import MonthlyMLPredictor, create_monthly_data_for_ml
+from app.backtest_store import IncrementalBacktest
 from app.improved_predictor import ImprovedPredictor, get_improved_prediction
 from app.multi_fund_predictor import MultiFundPredictor
 from app.risk_management import apply_risk_management
 from app.config import settings
+from app.instrumentation import StageTimer, check_memory_budget, peak_rss_mb
+from app.run_ledger import RunLedger
+from app.pipeline import Pipeline, Stage, StageCache, source_fingerprint
+from app import data_fetcher, metrics
+from app.call_audit import call_audit
 
 # Output paths
 OUTPUT_DIR = Path(__file__).parent.parent / "frontend" / "public" / "data"
@@ -95,47 +111,156 @@ def calculate_allocation(prediction: int, confidence: float) -> int:
         return min(50, max(0, allocation))
 
 
-def run_daily_update():
-    """Run daily prediction update using ML Ensemble + Multi-Fund model"""
+# ---------------------------------------------------------------- stages
+# Each stage declares its inputs and outputs (see build_pipeline). The
+# fund-data branch does not depend on the SET ML branch, so both run
+# concurrently; cacheable stages are skipped when their inputs are unchanged.
+
+def stage_fetch():
+    print("\n[fetch] Fetching SET Index data for ML...")
+    return fetch_stock_data(ticker=settings.TICKER_SET, period="5y")
+
+
+def stage_monthly_resample(df):
+    return create_monthly_data_for_ml(df)
+
+
+def stage_load_model():
+    print("\n[load_model] Initializing Improved ML Predictor...")
+    return ImprovedPredictor()
+
+
+def stage_train(predictor, monthly_ml):
+    # Train if model doesn't exist
+    if not predictor.is_trained():
+        print("\n   Training ML model (first time)...")
+        train_result = predictor.train(monthly_ml)
+        print(f"   Train accuracy: {train_result['train_accuracy']:.2%}")
+        print(f"   Test accuracy: {train_result['test_accuracy']:.2%}")
+        print(f"   Precision: {train_result['precision']:.2%}")
+        print(f"   Recall: {train_result['recall']:.2%}")
+        print(f"   F1 Score: {train_result['f1_score']:.2%}")
+    else:
+        print(f"   Model loaded (trained: {predictor.last_trained})")
+    return predictor
+
+
+def stage_predict(model, monthly_ml):
+    # IMPROVED prediction with trend adjustment
+    return model.predict_with_trend_adjustment(monthly_ml)
+
+
+def stage_features(model, monthly_ml):
+    return model.get_current_features(monthly_ml), model.get_top_features(5)
+
+
+def stage_trend(model, monthly_ml):
+    return model.get_trend_analysis(monthly_ml)
+
+
+def stage_risk(ml_result, ml_features, trend_analysis):
+    ml_prediction, ml_confidence, _ = ml_result
+    return apply_risk_management(ml_prediction, ml_confidence, ml_features, trend_analysis)
+
+
+def stage_fund_data():
+    print("\n[fund_data] Fetching market data for 4 funds...")
+    funds = MultiFundPredictor()
+    return funds.fetch_market_data(), funds.last_allocation
+
+
+def stage_multi_fund(market_data, last_allocation):
+    # Smoothing starts from last_allocation, so it is part of the cache key
+    funds = MultiFundPredictor()
+    funds.last_allocation = dict(last_allocation)
+    return funds.get_all_risk_profiles(market_data)
+
+
+def stage_backtest(model, monthly_ml):
+    # Stored per model version; only newly closed months are predicted
+    print("\n[backtest] Running ML backtest...")
+    return IncrementalBacktest(model).run(monthly_ml)
+
+
+def build_pipeline() -> Pipeline:
+    """The daily update as a DAG (fetches, model files and the backtest store are never cached)."""
+    return Pipeline([
+        Stage("fetch", stage_fetch, outputs=("df",), cache=False),
+        Stage("monthly_resample", stage_monthly_resample, inputs=("df",), outputs=("monthly_ml",)),
+        Stage("load_model", stage_load_model, outputs=("predictor",), cache=False),
+        Stage("train", stage_train, inputs=("predictor", "monthly_ml"), outputs=("model",), cache=False),
+        Stage("predict", stage_predict, inputs=("model", "monthly_ml"), outputs=("ml_result",)),
+        Stage("features", stage_features, inputs=("model", "monthly_ml"), outputs=("ml_features", "top_features")),
+        Stage("trend", stage_trend, inputs=("model", "monthly_ml"), outputs=("trend_analysis",)),
+        Stage("risk", stage_risk, inputs=("ml_result", "ml_features", "trend_analysis"), outputs=("risk_result",)),
+        Stage("fund_data", stage_fund_data, outputs=("market_data", "last_allocation"), cache=False),
+        Stage("multi_fund", stage_multi_fund, inputs=("market_data", "last_allocation"), outputs=("all_profiles",)),
+        Stage("backtest", stage_backtest, inputs=("model", "monthly_ml"), outputs=("backtest_result",), cache=False),
+    ])
+
+
+def code_version() -> str:
+    """Source of app/ and this script plus the settings: any change invalidates the stage cache."""
+    root = Path(__file__).parent.parent
+    config = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    return source_fingerprint(
+        sorted((root / "app").glob("*.py")) + [Path(__file__)],
+        extra=json.dumps(config, sort_keys=True, default=str)
+    )
+
+
+def run_daily_update(
+    output_file: Path = OUTPUT_FILE,
+    timer: StageTimer = None,
+    run_info: dict = None,
+    workers: int = None,
+    use_cache: bool = True
+):
+    """
+    Run daily prediction update using ML Ensemble + Multi-Fund model
+    
+    Args:
+        output_file: where prediction.json is written
+        timer: optional StageTimer that records each stage (benchmark_pipeline.py)
+        run_info: optional dict filled with run facts for the run ledger
+                  (rows_fetched, months, model_version, backtest cache use, stages, error)
+        workers: concurrent stages (default settings.PIPELINE_WORKERS, 1 = sequential)
+        use_cache: reuse stage outputs whose inputs are unchanged (settings.PIPELINE_CACHE_DIR)
+    """
+    timer = timer or StageTimer()
+    run_info = {} if run_info is None else run_info
+    workers = settings.PIPELINE_WORKERS if workers is None else workers
+    cache = None
+    if use_cache and settings.PIPELINE_CACHE_DIR:
+        cache = StageCache(settings.PIPELINE_CACHE_DIR, salt=code_version())
     print("=" * 50)
     print(f"Daily Update (Multi-Fund + ML) - {get_thai_time()}")
     print("=" * 50)
     
     # Ensure output directory exists
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
     
+    pipeline = build_pipeline()
     try:
-        # Fetch data for ML (SET Index)
-        print("\n[1/7] Fetching SET Index data for ML...")
-        df = fetch_stock_data(ticker=settings.TICKER_SET, period="5y")
-        print(f"   Got {len(df)} days of data")
+        try:
+            values = pipeline.run(timer=timer, workers=workers, cache=cache)
+        finally:
+            run_info["stages"] = dict(pipeline.report)
         
-        # Create monthly data for ML
-        print("\n[2/6] Creating monthly data...")
-        monthly_ml = create_monthly_data_for_ml(df)
-        print(f"   Got {len(monthly_ml)} months of data")
-        
-        # Initialize ML predictor
-        print("\n[3/7] Initializing Improved ML Predictor...")
-        predictor = ImprovedPredictor()
-        
-        # Train if model doesn't exist
-        if not predictor.is_trained():
-            print("\n   Training ML model (first time)...")
-            train_result = predictor.train(monthly_ml)
-            print(f"   Train accuracy: {train_result['train_accuracy']:.2%}")
-            print(f"   Test accuracy: {train_result['test_accuracy']:.2%}")
-            print(f"   Precision: {train_result['precision']:.2%}")
-            print(f"   Recall: {train_result['recall']:.2%}")
-            print(f"   F1 Score: {train_result['f1_score']:.2%}")
-        else:
-            print(f"   Model loaded (trained: {predictor.last_trained})")
+        df, monthly_ml, predictor = values["df"], values["monthly_ml"], values["model"]
+        ml_prediction, ml_confidence, ml_details = values["ml_result"]
+        ml_features, top_features = values["ml_features"], values["top_features"]
+        trend_analysis, risk_result = values["trend_analysis"], values["risk_result"]
+        all_profiles, backtest_result = values["all_profiles"], values["backtest_result"]
         
-        # Get IMPROVED prediction with trend adjustment
-        print("\n[4/7] Getting improved ML prediction...")
-        ml_prediction, ml_confidence, ml_details = predictor.predict_with_trend_adjustment(monthly_ml)
+        cached = [name for name, status in pipeline.report.items() if status == "cached"]
+        print(f"\nStages reused from cache: {', '.join(cached) if cached else 'none'}")
+        print(f"   Got {len(df)} days of data, {len(monthly_ml)} months")
+        run_info["rows_fetched"] = len(df)
+        run_info["months"] = len(monthly_ml)
         
         # Show adjustment info
+        print("\nImproved ML prediction:")
         if "adjustment" in ml_details:
             adj = ml_details["adjustment"]
             print(f"   Base: {adj['base_prediction']} ({adj['base_confidence']:.1%})")
@@ -148,18 +273,7 @@ def run_daily_update():
         allocation = calculate_allocation(ml_prediction, ml_confidence)
         weather, action = get_weather_and_action(ml_prediction, ml_confidence, allocation)
         
-        # Get ML features for display
-        print("\n[5/7] Getting ML features...")
-        ml_features = predictor.get_current_features(monthly_ml)
-        top_features = predictor.get_top_features(5)
-        
-        # Get trend analysis
-        print("   Analyzing trend...")
-        trend_analysis = predictor.get_trend_analysis(monthly_ml)
-        
-        # Apply Risk Management
-        print("   Applying risk management...")
-        risk_result = apply_risk_management(ml_prediction, ml_confidence, ml_features, trend_analysis)
+        # Risk Management
         allocation = risk_result["allocation"]
         risk_reason = risk_result["reason"]
         
@@ -169,22 +283,20 @@ def run_daily_update():
         # Get improved recommendation
         recommendation = predictor.get_recommendation_text(ml_prediction, ml_confidence, trend_analysis)
         
-        # Multi-Fund Prediction
-        print("\n[6/7] Predicting 4-fund allocation...")
-        multi_fund = MultiFundPredictor()
-        all_profiles = multi_fund.get_all_risk_profiles()
-        
         # Use moderate profile as default
         default_allocation = all_profiles["moderate"]["allocation"]
         market_data_4funds = all_profiles["moderate"]["market_data"]
         
+        print("\n4-fund allocation:")
         print(f"   Conservative: {all_profiles['conservative']['allocation']}")
         print(f"   Moderate: {all_profiles['moderate']['allocation']}")
         print(f"   Aggressive: {all_profiles['aggressive']['allocation']}")
         
-        # Run ML backtest
-        print("\n[7/7] Running ML backtest...")
-        backtest_result = predictor.backtest(monthly_ml)
+        incremental = backtest_result["incremental"]
+        run_info["model_version"] = incremental["model_version"]
+        run_info["backtest"] = incremental
+        print(f"   Backtest {incremental['mode']}: {incremental['new_months']} new month(s), "
+              f"{incremental['stored_months']} stored since {incremental['start_date']}")
         
         # Prepare output
         latest_date = monthly_ml["Date"].iloc[-1].strftime("%Y-%m")
@@ -236,10 +348,11 @@ def run_daily_update():
         }
         
         # Save to JSON
-        print(f"\nSaving to {OUTPUT_FILE}...")
-        output_data = convert_to_serializable(output_data)
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        print(f"\nSaving to {output_file}...")
+        with timer.stage("write_json"):
+            output_data = convert_to_serializable(output_data)
+            with open(output_file, "w", encoding="utf-8") as f:
+                json.dump(output_data, f, ensure_ascii=False, indent=2)
         
         print("\n" + "=" * 50)
         print("SUCCESS: Daily update completed!")
@@ -250,11 +363,13 @@ def run_daily_update():
         print(f"   Weather: {weather}")
         print(f"   Updated at: {get_thai_time()}")
         print("=" * 50)
+        print(timer.table())
         
         return output_data
         
     except Exception as e:
         print(f"\nERROR: {e}")
+        run_info["error"] = f"{type(e).__name__}: {e}"
         import traceback
         traceback.print_exc()
         
@@ -270,11 +385,121 @@ def run_daily_update():
                 "ticker": settings.TICKER,
             }
         }
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        with open(output_file, "w", encoding="utf-8") as f:
             json.dump(error_data, f, ensure_ascii=False, indent=2)
         
         return None
 
 
+def cache_counts(run_info: dict, before: dict) -> dict:
+    """{cache: {"hits", "misses"}} for this run: pipeline stages, backtest store months, /metrics counters."""
+    caches = {}
+    stages = run_info.get("stages")
+    if stages:
+        cacheable = [stage.name for stage in build_pipeline().stages.values() if stage.cache]
+        caches["pipeline_stages"] = {
+            "hits": sum(1 for name in cacheable if stages.get(name) == "cached"),
+            "misses": sum(1 for name in cacheable if stages.get(name) == "ran"),
+        }
+    backtest = run_info.get("backtest")
+    if backtest:
+        caches["backtest_store"] = {
+            "hits": backtest["stored_months"] - backtest["new_months"],
+            "misses": backtest["new_months"],
+        }
+    for (cache, result), count in metrics.CACHE_EVENTS.values.items():
+        delta = int(count - before.get((cache, result), 0))
+        if delta:
+            caches.setdefault(cache, {"hits": 0, "misses": 0})["hits" if result == "hit" else "misses"] += delta
+    return caches
+
+
+def write_ledger(path: str, started_at: str, duration_ms: float, timer: StageTimer, run_info: dict,
+                 caches: dict, success: bool, rss, extra: dict) -> None:
+    """Append this run to the SQLite run ledger (a ledger error never fails the update)."""
+    try:
+        run_id = RunLedger(path).record_run({
+            "started_at": started_at,
+            "finished_at": data_fetcher.get_thai_time().isoformat(timespec="seconds"),
+            "duration_ms": round(duration_ms, 3),
+            "outcome": "success" if success else "error",
+            "error": run_info.get("error"),
+            "model_version": run_info.get("model_version"),
+            "rows_fetched": run_info.get("rows_fetched"),
+            "months": run_info.get("months"),
+            "cache_hits": sum(c["hits"] for c in caches.values()),
+            "cache_misses": sum(c["misses"] for c in caches.values()),
+            "peak_rss_mb": None if rss is None else round(rss, 1),
+            "details": {
+                "data_source": settings.DATA_SOURCE,
+                "caches": caches,
+                "backtest": run_info.get("backtest"),
+                "stages": run_info.get("stages"),
+                **extra,
+            },
+        }, timer.as_dict(), run_info.get("stages"))
+        print(f"Run #{run_id} recorded in {path}")
+    except Exception as e:
+        print(f"Warning: could not write run ledger {path}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily prediction update")
+    parser.add_argument("--track-memory", action="store_true",
+                        help="tracemalloc peak / net allocation per stage (slower)")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="fail (exit 1) if any stage's traced peak exceeds this; implies --track-memory")
+    parser.add_argument("--report", type=Path, default=None, help="write stage timings / memory as JSON")
+    parser.add_argument("--ledger", default=settings.RUN_LEDGER_PATH, help="SQLite run ledger path")
+    parser.add_argument("--no-ledger", action="store_true", help="do not record this run in the ledger")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"concurrent stages (default {settings.PIPELINE_WORKERS}; 1 = sequential)")
+    parser.add_argument("--no-stage-cache", action="store_true", help="recompute every stage")
+    args = parser.parse_args()
+    
+    track_memory = args.track_memory or args.memory_budget_mb is not None
+    started_at = data_fetcher.get_thai_time().isoformat(timespec="seconds")
+    cache_before = dict(metrics.CACHE_EVENTS.values)
+    run_info = {}
+    start = time.perf_counter()
+    # PEA_DEBUG_CALLS=1 prints repeated calls on identical input at the end
+    with call_audit("daily_update"), StageTimer(track_memory=track_memory) as timer:
+        result = run_daily_update(
+            timer=timer, run_info=run_info, workers=args.workers, use_cache=not args.no_stage_cache
+        )
+    duration_ms = (time.perf_counter() - start) * 1000
+    
+    violations = check_memory_budget(timer.stages, args.memory_budget_mb) if args.memory_budget_mb else []
+    rss = peak_rss_mb()
+    if track_memory:
+        print(f"Peak traced (largest stage): {timer.peak_kb / 1024:.1f} MB"
+              + (f" | peak RSS: {rss:.0f} MB" if rss is not None else ""))
+    for line in violations:
+        print(f"MEMORY BUDGET EXCEEDED - {line}")
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "updated_at": get_thai_time(),
+                "success": result is not None,
+                "total_ms": round(timer.total_ms, 3),
+                "peak_rss_mb": None if rss is None else round(rss, 1),
+                "track_memory": track_memory,
+                "memory_budget_mb": args.memory_budget_mb,
+                "memory_budget_violations": violations,
+                "stages": timer.as_dict(),
+            }, f, ensure_ascii=False, indent=2)
+    
+    if not args.no_ledger:
+        write_ledger(
+            args.ledger, started_at, duration_ms, timer, run_info, cache_counts(run_info, cache_before),
+            result is not None, rss,
+            {"track_memory": track_memory, "memory_budget_violations": violations}
+        )
+    
+    if violations:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    run_daily_update()
+    main()
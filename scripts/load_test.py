@@ -0,0 +1,262 @@
+"""
+Load test for the FastAPI endpoints
+ยิง request พร้อมกันหลาย connection (asyncio) ไปยัง /predict, /predict/monthly,
+/backtest, /indicators, /health ตามสัดส่วนที่กำหนด แล้วรายงาน throughput และ p50/p95/p99
+
+By default it starts one uvicorn worker on the offline synthetic data source
+in a temp working dir, trains the model through POST /train, then runs the
+load. Use --url to target a server that is already running instead.
+
+Usage:
+    python scripts/load_test.py
+    python scripts/load_test.py --concurrency 32 --duration 30
+    python scripts/load_test.py --mix predict=6,indicators=3,health=1
+    python scripts/load_test.py --url http://127.0.0.1:8000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+
+ENDPOINTS = {
+    "predict": "/predict",
+    "predict_fast": "/predict?fast=true",
+    "predict_monthly": "/predict/monthly",
+    "backtest": "/backtest",
+    "indicators": "/indicators",
+    "health": "/health",
+}
+DEFAULT_MIX = "predict=4,predict_monthly=1,backtest=1,indicators=3,health=1"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}', expected one of {list(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# ------------------------------------------------------------------ client
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client (GET only, Content-Length bodies)."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, method: str = "GET") -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: 0\r\n\r\n".encode("ascii")
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            key = key.strip().lower()
+            if key == "content-length":
+                length = int(value)
+            elif key == "connection" and value.strip().lower() == "close":
+                close = True
+        body = await self.reader.readexactly(length) if length else b""
+        if close:
+            await self.close()
+        return status, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+
+async def worker(host, port, names, weights, deadline, budget, rng, samples):
+    conn = Connection(host, port)
+    try:
+        while time.perf_counter() < deadline and budget[0] > 0:
+            budget[0] -= 1
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, _ = await conn.request(ENDPOINTS[name])
+                ok = 200 <= status < 300
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+                await conn.close()
+                ok = False
+            samples.append((name, (time.perf_counter() - start) * 1000, ok))
+    finally:
+        await conn.close()
+
+
+async def run_load(host, port, weights, concurrency, duration, total_requests, seed):
+    names, values = list(weights), list(weights.values())
+    samples: List[Tuple[str, float, bool]] = []
+    budget = [total_requests if total_requests else float("inf")]
+    deadline = time.perf_counter() + (duration if not total_requests else 1e9)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(host, port, names, values, deadline, budget, random.Random(seed + i), samples)
+        for i in range(concurrency)
+    ])
+    return samples, time.perf_counter() - start
+
+
+def report(samples, elapsed: float) -> Dict[str, Dict[str, float]]:
+    rows = {}
+    by_name: Dict[str, List[Tuple[float, bool]]] = {}
+    for name, ms, ok in samples:
+        by_name.setdefault(name, []).append((ms, ok))
+    by_name["ALL"] = [(ms, ok) for _, ms, ok in samples]
+    for name, values in by_name.items():
+        latencies = np.array([ms for ms, _ in values])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0, 0, 0)
+        rows[name] = {
+            "requests": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(latencies.max()), 2) if len(latencies) else 0.0,
+        }
+    return rows
+
+
+# ------------------------------------------------------------------ server
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http(url: str, method: str = "GET", timeout: float = 600) -> Tuple[int, bytes]:
+    request = urllib.request.Request(url, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def start_server(port: int, workdir: str, years: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": str(ROOT) + os.pathsep + env.get("PYTHONPATH", ""),
+        "PEA_DATA_SOURCE": "synthetic",
+        "PEA_SYNTHETIC_YEARS": str(years),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=workdir, env=env
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if process.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        try:
+            if http(base + "/health", timeout=1)[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("uvicorn did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async load test of the API endpoints")
+    parser.add_argument("--url", default=None, help="existing server (default: start one on synthetic data)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of load")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests instead of --duration")
+    parser.add_argument("--warmup", type=int, default=1, help="sequential warm-up requests per endpoint")
+    parser.add_argument("--years", type=int, default=40, help="synthetic history for the started server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, default=None, help="also write the report here")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    process, workdir = None, None
+    try:
+        if args.url:
+            base = args.url.rstrip("/")
+        else:
+            workdir = tempfile.TemporaryDirectory()
+            port = free_port()
+            print(f"Starting uvicorn on :{port} (synthetic data, cwd={workdir.name})...")
+            process = start_server(port, workdir.name, args.years)
+            base = f"http://127.0.0.1:{port}"
+            print("Training model (POST /train)...")
+            status, body = http(base + "/train", method="POST")
+            if status != 200:
+                raise SystemExit(f"/train failed: {status} {body[:200]!r}")
+
+        for name in weights:
+            for _ in range(args.warmup):
+                http(base + ENDPOINTS[name])
+
+        target = urlsplit(base)
+        print(f"Load: {args.concurrency} connections, "
+              f"{f'{args.requests} requests' if args.requests else f'{args.duration:.0f}s'}, mix {args.mix}")
+        samples, elapsed = asyncio.run(run_load(
+            target.hostname, target.port or 80, weights,
+            args.concurrency, args.duration, args.requests, args.seed
+        ))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        if workdir is not None:
+            workdir.cleanup()
+
+    rows = report(samples, elapsed)
+    print("=" * 84)
+    print(f"{'endpoint':16s} {'requests':>9s} {'errors':>7s} {'req/s':>8s} "
+          f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for name, row in rows.items():
+        print(f"{name:16s} {row['requests']:9d} {row['errors']:7d} {row['rps']:8.1f} "
+              f"{row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['max_ms']:9.1f}")
+    print(f"\nElapsed {elapsed:.1f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mix": weights, "concurrency": args.concurrency, "elapsed_s": elapsed, "endpoints": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Optimize strategy_best_combo parameters
+ค้นหาพารามิเตอร์ที่ดีที่สุด (grid / random search) เรียงตาม Sharpe ช่วง out-of-sample
+
+Usage:
+    python scripts/optimize_strategy.py                      # default grid
+    python scripts/optimize_strategy.py --random 5000        # random search
+    python scripts/optimize_strategy.py --workers 8 --top 30 --output results.csv
+    python scripts/optimize_strategy.py --rule-weights 2000  # MONTHLY_ALLOCATION_RULE weights
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.data_fetcher import fetch_stock_data
+from app.feature_engineering import add_technical_indicators
+from app.monthly_strategy import MONTHLY_ALLOCATION_RULE, create_monthly_data
+from app.strategy import BEST_COMBO_DEFAULTS
+from app.strategy_optimizer import (
+    grid_parameters, random_parameters, optimize, rule_weight_sets, optimize_rule_weights
+)
+from app.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter search for strategy_best_combo")
+    parser.add_argument("--ticker", default=settings.TICKER_SET)
+    parser.add_argument("--period", default="max")
+    parser.add_argument("--random", type=int, default=0, help="number of random samples (0 = grid search)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default=None, help="write all ranked results to CSV")
+    parser.add_argument("--rule-weights", type=int, default=0,
+                        help="instead: random search over MONTHLY_ALLOCATION_RULE weights (number of samples)")
+    parser.add_argument("--spread", type=float, default=0.5, help="--rule-weights: +/- fraction around the defaults")
+    args = parser.parse_args()
+
+    if args.rule_weights > 0:
+        optimize_monthly_rule(args)
+        return
+
+    print("=" * 60)
+    print("Optimizing strategy_best_combo")
+    print("=" * 60)
+
+    print("\n[1/3] Fetching data...")
+    df = fetch_stock_data(ticker=args.ticker, period=args.period)
+    df = add_technical_indicators(df)
+    print(f"   Got {len(df)} days of data")
+
+    print("\n[2/3] Building parameter sets...")
+    if args.random > 0:
+        parameter_sets = random_parameters(args.random, seed=args.seed)
+        print(f"   Random search: {len(parameter_sets)} samples (seed={args.seed})")
+    else:
+        parameter_sets = grid_parameters()
+        print(f"   Grid search: {len(parameter_sets)} combinations")
+
+    print("\n[3/3] Evaluating...")
+    ranked = optimize(df, parameter_sets, workers=args.workers, top_n=None)
+
+    if args.output:
+        ranked.to_csv(args.output, index=False)
+        print(f"   Saved {len(ranked)} rows to {args.output}")
+
+    columns = list(BEST_COMBO_DEFAULTS) + [
+        "is_sharpe_ratio", "oos_sharpe_ratio", "oos_total_return_pct", "oos_max_drawdown_pct"
+    ]
+    print("\n" + "=" * 60)
+    print(f"Top {args.top} by out-of-sample Sharpe:")
+    print("=" * 60)
+    print(ranked[columns].head(args.top).to_string(index=False))
+
+
+def optimize_monthly_rule(args):
+    """Weight search for MONTHLY_ALLOCATION_RULE (one batched rule evaluation)."""
+    print("=" * 60)
+    print("Optimizing MONTHLY_ALLOCATION_RULE weights")
+    print("=" * 60)
+
+    print("\n[1/3] Fetching data...")
+    df = fetch_stock_data(ticker=args.ticker, period=args.period)
+    monthly = create_monthly_data(df)
+    print(f"   Got {len(monthly)} months of data")
+
+    print("\n[2/3] Building weight sets...")
+    weight_sets = rule_weight_sets(n_samples=args.rule_weights, spread=args.spread, seed=args.seed)
+    print(f"   {len(weight_sets)} sets (defaults + {args.rule_weights} samples, spread={args.spread}, seed={args.seed})")
+
+    print("\n[3/3] Evaluating...")
+    ranked = optimize_rule_weights(monthly, weight_sets, top_n=None)
+
+    if args.output:
+        ranked.to_csv(args.output, index=False)
+        print(f"   Saved {len(ranked)} rows to {args.output}")
+
+    defaults = ranked[ranked["set"] == 0].iloc[0]
+    print(f"\nDefault weights: OOS Sharpe {defaults['oos_sharpe_ratio']}, "
+          f"return {defaults['oos_total_return_pct']}% (rank {int(defaults.name) + 1}/{len(ranked)})")
+
+    columns = ["set"] + MONTHLY_ALLOCATION_RULE.parameter_names() + [
+        "is_sharpe_ratio", "oos_sharpe_ratio", "oos_total_return_pct", "oos_max_drawdown_pct"
+    ]
+    print("\n" + "=" * 60)
+    print(f"Top {args.top} by out-of-sample Sharpe:")
+    print("=" * 60)
+    print(ranked[columns].head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
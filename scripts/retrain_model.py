@@ -54,6 +54,15 @@ def retrain_model():
     for i, (name, importance) in enumerate(train_result['top_features'], 1):
         print(f"{i:2d}. {name:20s} {importance:.4f}")
     
+    # Distill fast single model (used by /predict?fast=true)
+    print("\n" + "=" * 60)
+    print("Distilled Fast Model:")
+    print("=" * 60)
+    report = predictor.distill(monthly)
+    print(f"Agreement:      {report['agreement_rate']:.2%} (test {report['test_agreement_rate']:.2%})")
+    print(f"Proba MAE:      {report['mean_abs_proba_error']:.4f} (test {report['test_mean_abs_proba_error']:.4f})")
+    print(f"Latency:        {report['ensemble_latency_ms']:.2f} ms -> {report['fast_latency_ms']:.2f} ms ({report['latency_ratio']}x)")
+    
     print("\n" + "=" * 60)
     print("Model saved successfully!")
     print("Run 'python scripts/daily_update.py' to generate new predictions")
@@ -0,0 +1,115 @@
+"""
+Query the daily_update run ledger
+ดูประวัติการรัน daily_update ที่บันทึกไว้ใน SQLite (models/run_ledger.sqlite):
+รายการรันล่าสุด, แนวโน้มเวลาของแต่ละ stage และ stage ที่ช้าลง
+
+Usage:
+    python scripts/run_ledger.py runs --last 10
+    python scripts/run_ledger.py stages --last 30          # older vs newer half per stage
+    python scripts/run_ledger.py trend fetch --last 30     # one stage, run by run
+    python scripts/run_ledger.py stages --fail-above 25    # exit 1 if a stage got >25% slower
+
+Stages served from the pipeline stage cache are not counted in trends.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.run_ledger import RunLedger
+
+
+def show_runs(ledger: RunLedger, last: int) -> None:
+    runs = ledger.recent_runs(last)
+    if not runs:
+        print("No runs recorded")
+        return
+    print(f"{'id':>5s} {'started':19s} {'outcome':8s} {'sec':>7s} {'rows':>6s} {'months':>6s} "
+          f"{'cache hit':>9s} {'model':10s} error")
+    for run in runs:
+        lookups = (run["cache_hits"] or 0) + (run["cache_misses"] or 0)
+        hit_rate = f"{run['cache_hits'] / lookups:9.0%}" if lookups else f"{'-':>9s}"
+        print(f"{run['id']:5d} {run['started_at'][:19]:19s} {run['outcome']:8s} "
+              f"{run['duration_ms'] / 1000:7.1f} {run['rows_fetched'] or 0:6d} {run['months'] or 0:6d} "
+              f"{hit_rate} {(run['model_version'] or '-')[:10]:10s} {run['error'] or ''}")
+
+
+def show_stages(ledger: RunLedger, last: int, threshold: float) -> list:
+    trends = ledger.stage_trends(last)
+    if not trends:
+        print("No runs recorded")
+        return []
+    print(f"Stage medians over the last {last} runs (older half → newer half)")
+    print(f"{'stage':20s} {'runs':>5s} {'older ms':>10s} {'newer ms':>10s} {'change':>8s} {'last ms':>10s}")
+    slower = []
+    for stage, t in trends.items():
+        older = f"{t['older_median_ms']:10.1f}" if t["older_median_ms"] is not None else f"{'-':>10s}"
+        change = f"{t['change_pct']:+7.0f}%" if t["change_pct"] is not None else f"{'-':>8s}"
+        flag = ""
+        if t["change_pct"] is not None and t["change_pct"] > threshold:
+            flag = "  SLOWER"
+            slower.append(stage)
+        print(f"{stage:20s} {t['runs']:5d} {older} {t['newer_median_ms']:10.1f} {change} {t['last_ms']:10.1f}{flag}")
+    return slower
+
+
+def show_trend(ledger: RunLedger, stage: str, last: int) -> None:
+    history = ledger.stage_history(stage, last)
+    if not history:
+        known = ", ".join(ledger.stage_names()) or "none"
+        print(f"No computed (non-cached) runs of stage '{stage}' (stages: {known})")
+        return
+    longest = max(row["ms"] for row in history) or 1.0
+    print(f"{stage}: last {len(history)} runs")
+    for row in history:
+        bar = "#" * max(1, round(row["ms"] / longest * 40))
+        print(f"{row['run_id']:5d} {row['started_at'][:16]:16s} {row['ms']:10.1f} ms  {bar}")
+
+    # Least-squares slope: ms change per run
+    n = len(history)
+    if n >= 2:
+        mean_x = (n - 1) / 2
+        mean_y = sum(row["ms"] for row in history) / n
+        covariance = sum((i - mean_x) * (row["ms"] - mean_y) for i, row in enumerate(history))
+        variance = sum((i - mean_x) ** 2 for i in range(n))
+        print(f"\nTrend: {covariance / variance:+.2f} ms per run (mean {mean_y:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the daily_update run ledger")
+    parser.add_argument("--ledger", default=settings.RUN_LEDGER_PATH, help="SQLite ledger path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    runs = sub.add_parser("runs", help="latest runs")
+    runs.add_argument("--last", type=int, default=10)
+
+    stages = sub.add_parser("stages", help="per-stage median change, older vs newer half")
+    stages.add_argument("--last", type=int, default=30)
+    stages.add_argument("--threshold", type=float, default=20.0, help="flag stages slower by more than this %%")
+    stages.add_argument("--fail-above", type=float, default=None, help="exit 1 if a stage is slower by more than this %%")
+
+    trend = sub.add_parser("trend", help="one stage run by run")
+    trend.add_argument("stage")
+    trend.add_argument("--last", type=int, default=30)
+
+    args = parser.parse_args()
+    if not Path(args.ledger).exists():
+        print(f"No ledger at {args.ledger} (run scripts/daily_update.py first)")
+        return
+
+    ledger = RunLedger(args.ledger)
+    if args.command == "runs":
+        show_runs(ledger, args.last)
+    elif args.command == "trend":
+        show_trend(ledger, args.stage, args.last)
+    else:
+        threshold = args.threshold if args.fail_above is None else args.fail_above
+        if show_stages(ledger, args.last, threshold) and args.fail_above is not None:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()